@@ -1,64 +1,171 @@
 # -*- coding: utf-8 -*-
-"""Runs a benchmark study on the form files found in the
-current directory. It relies on the regression test script for
-timings."""
-
-# Copyright (C) 2010 Anders Logg
-#
-# This file is part of FFC.
+# Copyright (C) 2010-2019 Anders Logg and FEniCS Project
 #
-# FFC is free software: you can redistribute it and/or modify
-# it under the terms of the GNU Lesser General Public License as published by
-# the Free Software Foundation, either version 3 of the License, or
-# (at your option) any later version.
+# This file is part of FFC (https://www.fenicsproject.org)
 #
-# FFC is distributed in the hope that it will be useful,
-# but WITHOUT ANY WARRANTY; without even the implied warranty of
-# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
-# GNU Lesser General Public License for more details.
-#
-# You should have received a copy of the GNU Lesser General Public License
-# along with FFC. If not, see <http://www.gnu.org/licenses/>.
+# SPDX-License-Identifier:    LGPL-3.0-or-later
+"""Benchmark of compiler throughput.
+
+Compiles each form file (by default demo/*.ufl) with the optimizations
+of the uflacs representation turned on and off, and records the time
+of each compiler stage and the peak memory use. Each compilation runs
+in a fresh Python process, so caches of earlier compilations do not
+affect the results.
 
+    python bench.py -o results.json
+    python bench.py --baseline results.json --tolerance 0.2
+    python bench.py Poisson_2D_*.ufl
+
+With --baseline, timings are compared against an earlier results file
+and the exit code is nonzero if any form got slower than allowed.
+"""
+
+import argparse
+import json
 import os
-import glob
+import pathlib
+import platform
+import resource
+import subprocess
 import sys
+import time
+
 from utils import print_table
 
-# Test options
-test_options = ["-r tensor",
-                #"-r tensor -O",
-                "-r quadrature",
-                "-r quadrature -O",
-                "-r uflacs"]
-
-# Get list of test cases
-test_cases = sorted([f.split(".")[0] for f in glob.glob("*.ufl")])
-
-# Open logfile
-logfile = open("bench.log", "w")
-
-# Iterate over options
-os.chdir("../test/regression")
-table = {}
-for (j, test_option) in enumerate(test_options):
-
-    # Run benchmark
-    print("\nUsing options %s\n" % test_option)
-    os.system(sys.executable + " test.py --bench %s" % test_option)
-
-    # Collect results
-    for (i, test_case) in enumerate(test_cases):
-        output = open("output/%s.out" % test_case).read()
-        lines = [line for line in output.split("\n") if "bench" in line]
-        if not len(lines) == 1:
-            raise RuntimeError("Unable to extract benchmark data for test case %s" % test_case)
-        timing = float(lines[0].split(":")[-1])
-        table[(i, j)] = (test_case, test_option, timing)
-        logfile.write("%s, %s, %g\n" % (test_case, test_option, timing))
-
-# Close logfile
-logfile.close()
-
-# Print results
-print_table(table, "FFC bench")
+# Parameters of each benchmark configuration
+configurations = {
+    "optimize": {},
+    "no-optimize": {
+        "enable_preintegration": False,
+        "enable_premultiplication": False,
+        "enable_sum_factorization": False,
+        "enable_block_transpose_reuse": False,
+        "enable_table_zero_compression": False,
+        "alignas": 0,
+        "tensor_init_mode": "upfront",
+    },
+}
+
+demo_dir = pathlib.Path(__file__).resolve().parent.parent.joinpath("demo")
+
+
+def run_case(filename, config):
+    """Compile the forms or elements in a form file and return the
+    timings of each stage and the peak memory use."""
+    import ufl
+    from ffc import profiling
+    from ffc.compiler import compile_ufl_objects
+
+    ufd = ufl.algorithms.load_ufl_file(str(filename))
+    objects = ufd.forms if len(ufd.forms) > 0 else ufd.elements
+    prefix = pathlib.Path(filename).stem
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    with profiling.profile(prefix) as prof:
+        compile_ufl_objects(objects, ufd.object_names, prefix=prefix, parameters=configurations[config])
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    return {"time": prof.root.time,
+            "stages": {name: node.time for name, node in prof.root.children.items()},
+            "profile": prof.as_dict(),
+            "peak_rss_kb": rss_after,
+            "compile_rss_kb": rss_after - rss_before}
+
+
+def run_case_subprocess(filename, config):
+    """Run a benchmark case in a new Python process."""
+    cmd = [sys.executable, __file__, "--run-case", str(filename), config]
+    proc = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                          universal_newlines=True)
+    if proc.returncode != 0:
+        lines = proc.stderr.strip().splitlines()
+        return {"error": lines[-1] if lines else "exit code {}".format(proc.returncode)}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def run_benchmarks(files, configs, repeat):
+    results = []
+    for filename in files:
+        for config in configs:
+            print("Compiling {} ({})".format(filename.name, config), flush=True)
+            runs = [run_case_subprocess(filename, config) for i in range(repeat)]
+            runs = [r for r in runs if "error" not in r] or runs[:1]
+
+            # Keep the fastest run, the others were disturbed by noise
+            result = min(runs, key=lambda r: r.get("time", 0.0))
+            result.update({"form": filename.stem, "config": config})
+            results.append(result)
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Return results that are more than 'tolerance' (relative) slower
+    than the matching baseline result."""
+    reference = {(r["form"], r["config"]): r for r in baseline["results"] if "time" in r}
+    regressions = []
+    for r in results:
+        b = reference.get((r["form"], r["config"]))
+        if b is None or "time" not in r:
+            continue
+        ratio = r["time"] / b["time"]
+        if ratio > 1.0 + tolerance:
+            regressions.append((r["form"], r["config"], ratio))
+    return regressions
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Benchmark FFC compile times.")
+    parser.add_argument("files", nargs="*", help="form files to compile (default: demo/*.ufl)")
+    parser.add_argument("-c", "--config", action="append", choices=sorted(configurations),
+                        help="configuration to run (default: all)")
+    parser.add_argument("-n", "--repeat", type=int, default=1, help="number of runs of each case")
+    parser.add_argument("-o", "--output", type=str, default="bench.json", help="results file")
+    parser.add_argument("--baseline", type=str, help="results file to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="allowed relative slowdown compared to the baseline")
+    parser.add_argument("--run-case", nargs=2, metavar=("file", "config"), help=argparse.SUPPRESS)
+    xargs = parser.parse_args(args)
+
+    if xargs.run_case:
+        filename, config = xargs.run_case
+        print(json.dumps(run_case(filename, config)))
+        return 0
+
+    files = [pathlib.Path(f) for f in xargs.files] or sorted(demo_dir.glob("*.ufl"))
+    configs = xargs.config or sorted(configurations)
+
+    import ffc
+    t0 = time.time()
+    results = run_benchmarks(files, configs, xargs.repeat)
+    output = {"ffc_version": ffc.__version__,
+              "python_version": platform.python_version(),
+              "platform": platform.platform(),
+              "date": time.strftime("%Y-%m-%d %H:%M:%S"),
+              "wall_time": time.time() - t0,
+              "results": results}
+    with open(xargs.output, "w") as f:
+        json.dump(output, f, indent=1)
+
+    # Print table of total compile times
+    table = {}
+    for i, filename in enumerate(files):
+        for j, config in enumerate(configs):
+            r = results[i * len(configs) + j]
+            table[(i, j)] = (r["form"], config, r.get("time", "error"))
+    print_table(table, "FFC bench")
+    print("Wrote results to {}".format(os.path.abspath(xargs.output)))
+
+    if xargs.baseline:
+        with open(xargs.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, xargs.tolerance)
+        for form, config, ratio in regressions:
+            print("Regression: {} ({}) is {:.2f} times slower than baseline".format(form, config, ratio))
+        if regressions:
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
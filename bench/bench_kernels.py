@@ -0,0 +1,266 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 FEniCS Project
+#
+# This file is part of FFC (https://www.fenicsproject.org)
+#
+# SPDX-License-Identifier:    LGPL-3.0-or-later
+"""Benchmark of the generated tabulate_tensor kernels.
+
+JIT compiles a set of forms for several cells and degrees, once for
+each set of uflacs parameters, and calls the cell integral kernel of
+each form over a batch of random cells from a C loop, so the Python
+overhead of cffi calls does not enter the timings. Reports cells per
+second and an estimate of the floating point operations per cell,
+counted on the generated code.
+
+    python bench_kernels.py -o kernels.json
+    python bench_kernels.py -f Poisson -d 1 -d 2 -p optimize -p no-optimize
+"""
+
+import argparse
+import json
+import pathlib
+import platform
+import sys
+import tempfile
+import time
+
+import cffi
+import numpy
+
+import ufl
+import ffc
+import ffc.codegeneration.jit
+from ffc.analysis import analyze_ufl_objects
+from ffc.codegeneration.backend import FFCBackend
+from ffc.codegeneration.C import cnodes
+from ffc.codegeneration.uflacsgenerator import IntegralGenerator
+from ffc.fiatinterface import reference_cell_vertices
+from ffc.ir.representation import compute_ir
+from ffc.parameters import validate_parameters
+
+from bench import configurations
+from utils import print_table
+
+# Sets of uflacs parameters to compare
+parameter_sets = dict(configurations)
+parameter_sets.update({
+    "no-sum-factorization": {"enable_sum_factorization": False},
+    "no-preintegration": {"enable_preintegration": False},
+    "premultiplication": {"enable_premultiplication": True},
+})
+
+
+def poisson(cell, degree):
+    element = ufl.FiniteElement("Lagrange", cell, degree)
+    u, v = ufl.TrialFunction(element), ufl.TestFunction(element)
+    return ufl.inner(ufl.grad(u), ufl.grad(v)) * ufl.dx
+
+
+def elasticity(cell, degree):
+    element = ufl.VectorElement("Lagrange", cell, degree)
+    u, v = ufl.TrialFunction(element), ufl.TestFunction(element)
+    return ufl.inner(ufl.sym(ufl.grad(u)), ufl.sym(ufl.grad(v))) * ufl.dx
+
+
+def hyperelasticity(cell, degree):
+    element = ufl.VectorElement("Lagrange", cell, degree)
+    v, du = ufl.TestFunction(element), ufl.TrialFunction(element)
+    u = ufl.Coefficient(element)
+    mu, lmbda = ufl.Constant(cell), ufl.Constant(cell)
+    Id = ufl.Identity(cell.geometric_dimension())
+    F = ufl.variable(Id + ufl.grad(u))
+    C = F.T * F
+    E = (C - Id) / 2
+    psi = lmbda / 2 * ufl.tr(E)**2 + mu * ufl.tr(E * E)
+    L = ufl.inner(ufl.diff(psi, F), ufl.grad(v)) * ufl.dx
+    return ufl.derivative(L, u, du)
+
+
+def navier_stokes(cell, degree):
+    element = ufl.VectorElement("Lagrange", cell, degree)
+    u, v = ufl.TrialFunction(element), ufl.TestFunction(element)
+    w = ufl.Coefficient(element)
+    return ufl.inner(ufl.grad(u) * w, v) * ufl.dx
+
+
+forms = {
+    "Poisson": poisson,
+    "Elasticity": elasticity,
+    "HyperElasticity": hyperelasticity,
+    "NavierStokes": navier_stokes,
+}
+
+# Calls a cell integral kernel for each cell of a batch, reusing the
+# element tensor as an assembler would
+KERNEL_LOOP = """
+typedef void (*cell_kernel_t)(double* restrict A, const double* w,
+                              const double* restrict coordinate_dofs,
+                              int cell_orientation);
+
+void run_cell_kernel(uintptr_t kernel, int num_cells, double* A,
+                     const double* w, int w_size,
+                     const double* coordinate_dofs, int coordinate_dofs_size)
+{
+  cell_kernel_t f = (cell_kernel_t) kernel;
+  for (int c = 0; c < num_cells; ++c)
+    f(A, w + c * w_size, coordinate_dofs + c * coordinate_dofs_size, 0);
+}
+"""
+
+
+def compile_kernel_loop(cache_dir):
+    """Compile the module with the loop calling kernels over cells."""
+    ffibuilder = cffi.FFI()
+    ffibuilder.cdef("""void run_cell_kernel(uintptr_t kernel, int num_cells, double* A,
+                                            const double* w, int w_size,
+                                            const double* coordinate_dofs, int coordinate_dofs_size);""")
+    ffibuilder.set_source("_ffc_bench_kernel_loop", KERNEL_LOOP, extra_compile_args=["-O2", "-g0"])
+    path = ffibuilder.compile(tmpdir=cache_dir, verbose=False)
+    sys.path.insert(0, str(pathlib.Path(path).parent))
+    import _ffc_bench_kernel_loop
+    return _ffc_bench_kernel_loop
+
+
+def count_flops(node):
+    """Estimate the number of floating point operations of executing
+    a C AST, multiplying the operations in loops by their trip counts.
+    Array indexing and table declarations are not counted."""
+    if isinstance(node, (list, tuple)):
+        return sum(count_flops(n) for n in node)
+    if not isinstance(node, cnodes.CNode):
+        return 0
+    if isinstance(node, (cnodes.CExprTerminal, cnodes.ArrayAccess, cnodes.ArrayDecl)):
+        return 0
+    if isinstance(node, cnodes.ForRange):
+        body = count_flops(node.body)
+        if isinstance(node.begin, cnodes.LiteralInt) and isinstance(node.end, cnodes.LiteralInt):
+            return (node.end.value - node.begin.value) * body
+        return body
+
+    if isinstance(node, cnodes.NaryOp):
+        flops = len(node.args) - 1
+    elif isinstance(node, (cnodes.Add, cnodes.Sub, cnodes.Mul, cnodes.Div, cnodes.Neg, cnodes.Call,
+                           cnodes.AssignAdd, cnodes.AssignSub, cnodes.AssignMul, cnodes.AssignDiv)):
+        flops = 1
+    else:
+        flops = 0
+    for cls in type(node).__mro__:
+        for name in getattr(cls, "__slots__", ()):
+            if name not in ("index", "sizes", "pragma"):
+                flops += count_flops(getattr(node, name, None))
+    return flops
+
+
+def estimate_flops(form, parameters):
+    """Estimate the floating point operations per cell of the cell
+    integrals of a form."""
+    p = validate_parameters(parameters)
+    analysis = analyze_ufl_objects([form], p)
+    ir = compute_ir(analysis, {}, "JIT", p)
+    flops = 0
+    for itg_ir in ir.integrals:
+        if itg_ir.integral_type == "cell" and itg_ir.representation == "uflacs":
+            ig = IntegralGenerator(itg_ir, FFCBackend(itg_ir, p), itg_ir.integrals_metadata["precision"])
+            flops += count_flops(ig.generate())
+    return flops
+
+
+def random_cells(cell, num_cells, num_coordinate_dofs):
+    """Return coordinate dofs of randomly perturbed reference cells."""
+    vertices = numpy.array(reference_cell_vertices(cell.cellname()), dtype=numpy.float64).flatten()
+    assert vertices.size == num_coordinate_dofs
+    perturbation = 0.1 * numpy.random.random((num_cells, vertices.size))
+    return vertices + perturbation
+
+
+def run_case(loop, form, num_cells, parameters):
+    """Compile a form and time its cell integral over a batch of random
+    cells, returning cells per second."""
+    compiled_forms, module = ffc.codegeneration.jit.compile_forms([form], parameters=parameters)
+    compiled_form = compiled_forms[0][0]
+    integral = compiled_form.create_cell_integral(-1)
+
+    # Size of the element tensor, coefficients and coordinate dofs
+    dims = []
+    for i in range(compiled_form.rank + compiled_form.num_coefficients):
+        dims.append(compiled_form.create_finite_element(i).space_dimension)
+    A = numpy.zeros(int(numpy.prod(dims[:compiled_form.rank])), dtype=numpy.float64)
+    w_size = sum(dims[compiled_form.rank:])
+    coordinate_dofs_size = compiled_form.create_coordinate_finite_element().space_dimension
+
+    w = numpy.random.random(num_cells * w_size)
+    coordinate_dofs = random_cells(form.ufl_cell(), num_cells, coordinate_dofs_size)
+
+    kernel = int(module.ffi.cast("uintptr_t", integral.tabulate_tensor))
+    ffi = loop.ffi
+    t0 = time.perf_counter()
+    loop.lib.run_cell_kernel(kernel, num_cells, ffi.cast("double *", ffi.from_buffer(A)),
+                             ffi.cast("double *", ffi.from_buffer(w)), w_size,
+                             ffi.cast("double *", ffi.from_buffer(coordinate_dofs)), coordinate_dofs_size)
+    elapsed = time.perf_counter() - t0
+    return num_cells / elapsed
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Benchmark FFC generated kernels.")
+    parser.add_argument("-f", "--form", action="append", choices=sorted(forms),
+                        help="form to run (default: all)")
+    parser.add_argument("-c", "--cell", action="append",
+                        help="cell to run (default: tetrahedron and hexahedron)")
+    parser.add_argument("-d", "--degree", action="append", type=int, help="degree to run (default: 1, 2)")
+    parser.add_argument("-p", "--parameters", action="append", choices=sorted(parameter_sets),
+                        help="uflacs parameter set to run (default: all)")
+    parser.add_argument("-n", "--num-cells", type=int, default=100000, help="number of cells in a batch")
+    parser.add_argument("-r", "--repeat", type=int, default=3, help="number of batches of each case")
+    parser.add_argument("-o", "--output", type=str, default="bench_kernels.json", help="results file")
+    parser.add_argument("--cache-dir", type=str, help="JIT cache dir (default: a temporary dir)")
+    xargs = parser.parse_args(args)
+
+    form_names = xargs.form or sorted(forms)
+    cells = xargs.cell or ["tetrahedron", "hexahedron"]
+    degrees = xargs.degree or [1, 2]
+    parameter_names = xargs.parameters or sorted(parameter_sets)
+
+    tmpdir = tempfile.TemporaryDirectory()
+    cache_dir = xargs.cache_dir or tmpdir.name
+    loop = compile_kernel_loop(cache_dir)
+
+    results = []
+    table = {}
+    cases = [(f, c, d) for f in form_names for c in cells for d in degrees]
+    for i, (form_name, cellname, degree) in enumerate(cases):
+        form = forms[form_name](ufl.Cell(cellname), degree)
+        for j, pname in enumerate(parameter_names):
+            parameters = dict(parameter_sets[pname], cache_dir=cache_dir)
+            print("Running {} on {} (P{}, {})".format(form_name, cellname, degree, pname), flush=True)
+            try:
+                rate = max(run_case(loop, form, xargs.num_cells, parameters) for r in range(xargs.repeat))
+                flops = estimate_flops(form, parameters)
+            except Exception as e:
+                results.append({"form": form_name, "cell": cellname, "degree": degree,
+                                "parameters": pname, "error": "{}: {}".format(type(e).__name__, e)})
+                table[(i, j)] = ("{} {} P{}".format(form_name, cellname, degree), pname, "error")
+                continue
+            results.append({"form": form_name, "cell": cellname, "degree": degree,
+                            "parameters": pname, "cells_per_second": rate,
+                            "flops_per_cell": flops, "gflops": rate * flops * 1e-9})
+            table[(i, j)] = ("{} {} P{}".format(form_name, cellname, degree), pname, rate)
+
+    output = {"ffc_version": ffc.__version__,
+              "python_version": platform.python_version(),
+              "platform": platform.platform(),
+              "date": time.strftime("%Y-%m-%d %H:%M:%S"),
+              "num_cells": xargs.num_cells,
+              "parameter_sets": {p: parameter_sets[p] for p in parameter_names},
+              "results": results}
+    with open(xargs.output, "w") as f:
+        json.dump(output, f, indent=1)
+
+    print_table(table, "Cells per second")
+    print("Wrote results to {}".format(xargs.output))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -6,11 +6,23 @@
 # SPDX-License-Identifier:    LGPL-3.0-or-later
 """Some basics for generating C code."""
 
+import collections
 import hashlib
+import weakref
 
 import ffc
 import ufl
 
+# Cache of computed signatures of elements and meshes, keyed by the
+# identity of the UFL objects and the parameter values, ordered from
+# least to most recently used
+_signature_cache = collections.OrderedDict()
+_signature_cache_maxsize = 1024
+_signature_cache_stats = {"hits": 0, "misses": 0}
+
+signature_cache_info_t = collections.namedtuple("signature_cache_info",
+                                                ["hits", "misses", "maxsize", "currsize"])
+
 
 def make_name(prefix, basename, signature):
     pre = prefix.lower() + "_" if prefix else ""
@@ -33,8 +45,75 @@ def compute_signature(ufl_objects, tag, parameters, coordinate_mapping=False):
     The parameter `coordinate_mapping` is used to force compilation of finite element
     as a coordinate mapping element. There is no way to find this information
     just by looking at type of `ufl_object` passed.
+
+    Signatures are memoized for the same objects and parameters, see
+    `signature_cache_info`. The signature of a single form is stored
+    on the form itself.
     """
+    key = _signature_cache_key(ufl_objects, tag, parameters, coordinate_mapping)
+    if key is None:
+        _signature_cache_stats["misses"] += 1
+        return _compute_signature(ufl_objects, tag, parameters, coordinate_mapping)
+
+    if any(isinstance(ufl_object, ufl.Form) for ufl_object in ufl_objects):
+        # Forms support no weak references, so the signature of a
+        # single form is stored on the form itself, like its UFL
+        # signature, and lists with forms are not memoized
+        if len(ufl_objects) != 1:
+            _signature_cache_stats["misses"] += 1
+            return _compute_signature(ufl_objects, tag, parameters, coordinate_mapping)
+        cache = ufl_objects[0]._cache.setdefault("ffc_signature", {})
+        sig = cache.get(key[1:])
+        if sig is not None:
+            _signature_cache_stats["hits"] += 1
+            return sig
+        _signature_cache_stats["misses"] += 1
+        sig = _compute_signature(ufl_objects, tag, parameters, coordinate_mapping)
+        cache[key[1:]] = sig
+        return sig
+
+    entry = _signature_cache.get(key)
+    if entry is not None:
+        refs, sig = entry
+        # Check that the objects are still alive (ids may be reused)
+        if all(ref() is ufl_object for ref, ufl_object in zip(refs, ufl_objects)):
+            _signature_cache_stats["hits"] += 1
+            _signature_cache.move_to_end(key)
+            return sig
+
+    _signature_cache_stats["misses"] += 1
+    sig = _compute_signature(ufl_objects, tag, parameters, coordinate_mapping)
+
+    _signature_cache[key] = ([weakref.ref(ufl_object) for ufl_object in ufl_objects], sig)
+    while len(_signature_cache) > _signature_cache_maxsize:
+        _signature_cache.popitem(last=False)
+
+    return sig
+
+
+def signature_cache_info():
+    """Return hits, misses, maximum and current size of the signature cache."""
+    return signature_cache_info_t(_signature_cache_stats["hits"], _signature_cache_stats["misses"],
+                                  _signature_cache_maxsize, len(_signature_cache))
+
+
+def signature_cache_clear():
+    """Clear the signature cache and its statistics."""
+    _signature_cache.clear()
+    _signature_cache_stats["hits"] = 0
+    _signature_cache_stats["misses"] = 0
+
+
+def _signature_cache_key(ufl_objects, tag, parameters, coordinate_mapping):
+    try:
+        return (tuple(id(ufl_object) for ufl_object in ufl_objects),
+                tuple(sorted(parameters.items())), tag, coordinate_mapping)
+    except TypeError:
+        # Unhashable or unorderable parameter values, don't cache
+        return None
+
 
+def _compute_signature(ufl_objects, tag, parameters, coordinate_mapping):
     object_signature = ""
     for ufl_object in ufl_objects:
         # Get signature from ufl object
@@ -11,8 +11,8 @@ import numbers
 import numpy
 
 from ffc.codegeneration.C.format_lines import Indented, format_indented_lines
-from ffc.codegeneration.C.format_value import (format_float, format_int,
-                                               format_value)
+from ffc.codegeneration.C.format_value import (format_float, format_float_array,
+                                               format_int, format_value)
 from ffc.codegeneration.C.precedence import PRECEDENCE
 
 logger = logging.getLogger(__name__)
@@ -1186,22 +1186,12 @@ def build_1d_initializer_list(values, formatter, padlen=0, precision=None):
         def formatter(x, p):
             return str(x)
 
-    tokens = ["{ "]
-    if numpy.product(values.shape) > 0:
-        sep = ", "
-        fvalues = [formatter(v, precision) for v in values]
-        for v in fvalues[:-1]:
-            tokens.append(v)
-            tokens.append(sep)
-        tokens.append(fvalues[-1])
-        if padlen:
-            # Add padding
-            zero = formatter(values.dtype.type(0), precision)
-            for i in range(leftover(len(values), padlen)):
-                tokens.append(sep)
-                tokens.append(zero)
-    tokens += " }"
-    return "".join(tokens)
+    fvalues = [formatter(v, precision) for v in values]
+    if fvalues and padlen:
+        # Add padding
+        zero = formatter(values.dtype.type(0), precision)
+        fvalues += [zero] * leftover(len(values), padlen)
+    return "{ " + ", ".join(fvalues) + " }"
 
 
 def build_initializer_lists(values, sizes, level, formatter, padlen=0, precision=None):
@@ -1318,14 +1308,19 @@ class ArrayDecl(CStatement):
             return decl + " = {lbr} 0 {rbr};".format(lbr="{" * nb, rbr="}" * nb)
         else:
             # Construct initializer lists for arbitrary multidimensional array values
-            if self.values.dtype.kind == "f":
-                formatter = format_float
+            values = self.values
+            if values.dtype.kind == "f":
+                # Format all values at once, padding with zeros
+                values = format_float_array(values, precision)
+
+                def formatter(x, p):
+                    return x if isinstance(x, str) else format_float(x, p)
             elif self.values.dtype.kind == "i":
                 formatter = format_int
             else:
                 formatter = format_value
             initializer_lists = build_initializer_lists(
-                self.values, self.sizes, 0, formatter, padlen=self.padlen, precision=precision)
+                values, self.sizes, 0, formatter, padlen=self.padlen, precision=precision)
             if len(initializer_lists) == 1:
                 return decl + " = " + initializer_lists[0] + ";"
             else:
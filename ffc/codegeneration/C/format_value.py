@@ -7,6 +7,8 @@
 import numbers
 import re
 
+import numpy
+
 _subs = (
     # Remove 0s after e+ or e-
     (re.compile(r"e[\+]0*(.)"), r"e\1"),
@@ -27,11 +29,29 @@ def format_float(x, precision=None):
             s = "{:.{prec}}".format(float(x), prec=precision)
     else:
         s = repr(float(x))
-    for r, v in _subs:
-        s = r.sub(v, s)
+    if "e" in s:
+        for r, v in _subs:
+            s = r.sub(v, s)
     return s
 
 
+def format_float_array(values, precision=None):
+    """Format an array of float values according to given precision.
+
+    Returns an array of strings with the same shape as values, with
+    each value formatted as by format_float. Each distinct value is
+    formatted only once, as tables of basis function values typically
+    repeat a few values such as 0, 1 and -1 many times.
+    """
+    values = numpy.ascontiguousarray(values, dtype=numpy.float64)
+
+    # Compare bit patterns to tell apart 0.0 and -0.0
+    unique, inverse = numpy.unique(values.view(numpy.int64), return_inverse=True)
+    formatted = numpy.array([format_float(x, precision) for x in unique.view(numpy.float64)],
+                            dtype=object)
+    return formatted[inverse].reshape(values.shape)
+
+
 def format_int(x, precision=None):
     return str(x)
 
@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 FEniCS Project
+#
+# This file is part of FFC (https://www.fenicsproject.org)
+#
+# SPDX-License-Identifier:    LGPL-3.0-or-later
+"""Cross cell vectorization of generated code.
+
+Transforms the statements computing the element tensor of one cell
+into statements computing the element tensors of a fixed number of
+cells (the width) at once. Each variable and array local to the cell
+code gets a trailing dimension with one entry per cell, and the per
+cell arguments are laid out in structure of arrays form, with entry
+k of cell c at [k*width + c]. Straight line code is wrapped in loops
+over the cells, which end up innermost in every loop nest and are
+marked for vectorization, so the compiler can map each iteration to
+a SIMD lane.
+"""
+
+import numpy
+
+from ffc.codegeneration.C import cnodes as L
+
+
+def vectorize_cells(code, lane, width, soa_arguments=(), lane_arguments=(), alignas=None):
+    """Return statements computing 'code' for 'width' cells at once.
+
+    'lane' is the name of the cell index of the generated loops,
+    'soa_arguments' are the names of the flat arrays of per cell
+    values, passed in structure of arrays layout, and 'lane_arguments'
+    are the names of per cell scalars, passed as arrays with one value
+    per cell.
+
+    Raises NotImplementedError if 'code' contains statements that can
+    not be vectorized across cells.
+    """
+    v = CellVectorizer(L.as_symbol(lane), width, soa_arguments, lane_arguments, alignas)
+    v.collect_locals(code)
+    return v.statements(code)
+
+
+def _is_static(decl):
+    return "static" in decl.typename.split()
+
+
+def _drop_const(typename):
+    return " ".join(t for t in typename.split() if t != "const")
+
+
+def _flatten(code):
+    if isinstance(code, (list, tuple)):
+        for s in code:
+            yield from _flatten(s)
+    elif isinstance(code, L.StatementList):
+        yield from _flatten(code.statements)
+    else:
+        yield code
+
+
+class CellVectorizer(object):
+    # Max number of statements in one loop over the cells
+    max_run_length = 32
+
+    def __init__(self, lane, width, soa_arguments, lane_arguments, alignas):
+        self.lane = lane
+        self.width = width
+        self.soa_arguments = set(soa_arguments)
+        self.lane_arguments = set(lane_arguments)
+        self.alignas = alignas
+
+        # Names of variables and arrays declared in the cell code
+        self.locals = set()
+
+    def collect_locals(self, code):
+        for s in _flatten(code):
+            if isinstance(s, L.VariableDecl):
+                self.locals.add(s.symbol.name)
+            elif isinstance(s, L.ArrayDecl) and not _is_static(s):
+                self.locals.add(s.symbol.name)
+            elif isinstance(s, L.ForRange):
+                self.collect_locals(s.body)
+            elif isinstance(s, L.Scope):
+                self.collect_locals(s.body)
+
+    def statements(self, code):
+        """Vectorize a list of statements, merging consecutive simple
+        statements into a single loop over the cells."""
+        parts = []
+        decls = []
+        run = []
+
+        def flush():
+            # Cells are independent, so declarations may be moved
+            # before the loop computing the preceding statements
+            parts.extend(decls)
+            if any(not isinstance(s, L.Comment) for s in run):
+                # Long loop bodies are split, compilers give up
+                # vectorizing loops with too many memory accesses
+                for i in range(0, len(run), self.max_run_length):
+                    body = run[i:i + self.max_run_length]
+                    parts.append(L.ForRange(self.lane, 0, self.width, body=body, vectorize=True))
+            else:
+                parts.extend(run)
+            del decls[:]
+            del run[:]
+
+        for s in _flatten(code):
+            if isinstance(s, L.Comment):
+                run.append(s)
+            elif isinstance(s, L.Statement):
+                run.append(L.Statement(self.expr(s.expr)))
+            elif isinstance(s, L.CExprOperator) and s.sideeffect:
+                run.append(L.Statement(self.expr(s)))
+            elif isinstance(s, L.VariableDecl):
+                decls.append(L.ArrayDecl(_drop_const(s.typename), s.symbol, self.width, alignas=self.alignas))
+                if s.value is not None:
+                    run.append(L.Assign(self.expr(s.symbol), self.expr(s.value)))
+            elif isinstance(s, L.ArrayDecl):
+                if _is_static(s):
+                    flush()
+                    parts.append(s)
+                else:
+                    decls.append(self.array_decl(s))
+            elif isinstance(s, L.ForRange):
+                flush()
+                parts.append(L.ForRange(s.index, s.begin, s.end, body=self.statements(s.body),
+                                        index_type=s.index_type))
+            elif isinstance(s, L.Scope):
+                flush()
+                parts.append(L.Scope(self.statements(s.body)))
+            else:
+                raise NotImplementedError("Cannot vectorize statement of type {}.".format(type(s).__name__))
+        flush()
+        return parts
+
+    def array_decl(self, decl):
+        """Add a trailing cell dimension to a local array declaration."""
+        values = decl.values
+        if isinstance(values, numpy.ndarray):
+            values = numpy.repeat(values[..., numpy.newaxis], self.width, axis=-1)
+        return L.ArrayDecl(decl.typename, decl.symbol, decl.sizes + (self.width, ), values,
+                           alignas=decl.alignas)
+
+    def expr(self, e):
+        """Rewrite accesses to per cell values in an expression."""
+        if isinstance(e, L.Symbol):
+            if e.name in self.locals or e.name in self.lane_arguments:
+                return e[self.lane]
+            elif e.name in self.soa_arguments:
+                raise NotImplementedError("Cannot vectorize use of array argument {}.".format(e.name))
+            return e
+        elif isinstance(e, L.ArrayAccess):
+            name = e.array.name
+            indices = [self.expr(i) for i in e.indices]
+            if name in self.locals:
+                return L.ArrayAccess(e.array, indices + [self.lane])
+            elif name in self.soa_arguments:
+                if len(indices) != 1:
+                    raise NotImplementedError("Expecting flat access to array argument {}.".format(name))
+                k, = indices
+                if isinstance(k, L.LiteralInt):
+                    offset = L.LiteralInt(k.value * self.width)
+                else:
+                    offset = k * self.width
+                return L.ArrayAccess(e.array, offset + self.lane)
+            return L.ArrayAccess(e.array, indices)
+        elif isinstance(e, L.CExprLiteral):
+            return e
+        elif isinstance(e, L.BinOp):
+            return type(e)(self.expr(e.lhs), self.expr(e.rhs))
+        elif isinstance(e, L.NaryOp):
+            return type(e)([self.expr(arg) for arg in e.args])
+        elif isinstance(e, L.UnaryOp):
+            return type(e)(self.expr(e.arg))
+        elif isinstance(e, L.Conditional):
+            return L.Conditional(self.expr(e.condition), self.expr(e.true), self.expr(e.false))
+        elif isinstance(e, L.Call):
+            return L.Call(e.function, [self.expr(arg) for arg in e.arguments])
+        raise NotImplementedError("Cannot vectorize expression of type {}.".format(type(e).__name__))
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 FEniCS Project
+#
+# This file is part of FFC (https://www.fenicsproject.org)
+#
+# SPDX-License-Identifier:    LGPL-3.0-or-later
+"""On-disk cache of generated code.
+
+The code generated for each element, dofmap, coordinate mapping and
+integral is stored in the directory 'code' under the cache dir, keyed
+by the classname and signature of its intermediate representation and
+the compilation relevant parameters. When one integral of a module
+with many forms changes, only the code of that integral is generated
+again. The cache is enabled with the parameter 'code_cache'.
+"""
+
+import hashlib
+import logging
+
+import ffc.parameters
+from ffc import diskcache, profiling
+
+logger = logging.getLogger(__name__)
+
+
+def cached_code(generate, kind, ir, parameters):
+    """Return the code generated by 'generate(ir, parameters)', reading
+    it from the code cache if present and storing it there otherwise."""
+    if not parameters.get("code_cache"):
+        return generate(ir, parameters)
+
+    key = repr((kind, ir.classname, ir.signature, getattr(ir, "id", None),
+                ffc.parameters.compute_jit_signature(parameters), ffc.__version__))
+    sig = hashlib.sha1(key.encode("utf-8")).hexdigest()
+    filename = diskcache.cache_path(parameters, "code", "{}_{}.pickle".format(kind, sig))
+
+    code = diskcache.load(filename)
+    if code is None:
+        profiling.record(code_cache_misses=1)
+        code = generate(ir, parameters)
+        diskcache.store(filename, code)
+    else:
+        profiling.record(code_cache_hits=1)
+        logger.debug("Reusing {} code from {}".format(kind, str(filename)))
+
+    return code
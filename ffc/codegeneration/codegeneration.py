@@ -15,12 +15,16 @@ UFC function from an intermediate representation (IR).
 import logging
 from collections import namedtuple
 
+from ffc import profiling
+
+from ffc.codegeneration.codecache import cached_code
 from ffc.codegeneration.finite_element import generator as finite_element_generator
 from ffc.codegeneration.coordinate_mapping import \
     generator as coordinate_mapping_generator
 from ffc.codegeneration.dofmap import generator as dofmap_generator
 from ffc.codegeneration.form import generator as form_generator
 from ffc.codegeneration.integrals import generator as integral_generator
+from ffc.codegeneration.integrals import shared_generator as shared_integral_generator
 
 logger = logging.getLogger(__name__)
 
@@ -28,33 +32,66 @@ code_blocks = namedtuple('code_blocks', ['elements', 'dofmaps',
                                          'coordinate_mappings', 'integrals', 'forms'])
 
 
-def generate_code(ir, parameters):
+def generate_code(ir, parameters, lazy=False):
     """Generate code blocks from intermediate representation.
 
+    If lazy is true, the code blocks are generators which generate the
+    code of each object when iterated over, so that the code can be
+    written out before the code of the next object is generated.
     """
 
     logger.debug("Compiler stage 4: Generating code")
 
+    def generate(name, codes):
+        if lazy:
+            return codes
+        with profiling.timer(name + "_generator"):
+            return list(codes)
+
     # Generate code for finite_elements
     logger.debug("Generating code for {} finite_element(s)".format(len(ir.elements)))
-    code_finite_elements = [finite_element_generator(element_ir, parameters) for element_ir in ir.elements]
+    code_finite_elements = generate("finite_element", (
+        cached_code(finite_element_generator, "finite_element", element_ir, parameters)
+        for element_ir in ir.elements))
 
     # Generate code for dofmaps
     logger.debug("Generating code for {} dofmap(s)".format(len(ir.dofmaps)))
-    code_dofmaps = [dofmap_generator(dofmap_ir, parameters) for dofmap_ir in ir.dofmaps]
+    code_dofmaps = generate("dofmap", (
+        cached_code(dofmap_generator, "dofmap", dofmap_ir, parameters) for dofmap_ir in ir.dofmaps))
 
     # Generate code for coordinate_mappings
     logger.debug("Generating code for {} coordinate_mapping(s)".format(len(ir.coordinate_mappings)))
-    code_coordinate_mappings = [coordinate_mapping_generator(cmap_ir, parameters) for cmap_ir in ir.coordinate_mappings]
+    code_coordinate_mappings = generate("coordinate_mapping", (
+        cached_code(coordinate_mapping_generator, "coordinate_mapping", cmap_ir, parameters)
+        for cmap_ir in ir.coordinate_mappings))
 
     # Generate code for integrals
     logger.debug("Generating code for integrals")
-    code_integrals = [integral_generator(integral_ir, parameters) for integral_ir in ir.integrals]
+    code_integrals = generate("integral", _generate_integrals(ir.integrals, parameters))
 
     # Generate code for forms
     logger.debug("Generating code for forms")
-    code_forms = [form_generator(form_ir, parameters) for form_ir in ir.forms]
+    code_forms = generate("form", (form_generator(form_ir, parameters) for form_ir in ir.forms))
 
     return code_blocks(elements=code_finite_elements, dofmaps=code_dofmaps,
                        coordinate_mappings=code_coordinate_mappings, integrals=code_integrals,
                        forms=code_forms)
+
+
+def _generate_integrals(integral_irs, parameters):
+    """Generate code for integrals, one at a time.
+
+    With the parameter 'deduplicate_kernels', the kernels of integrals
+    with the same signature, e.g. the same integrand on several
+    subdomains, are generated only for the first of them, and the
+    others are created with these kernels.
+    """
+    classnames = {}
+    for integral_ir in integral_irs:
+        if parameters["deduplicate_kernels"]:
+            key = (integral_ir.representation, integral_ir.signature)
+            shared_classname = classnames.setdefault(key, integral_ir.classname)
+            if shared_classname != integral_ir.classname:
+                yield shared_integral_generator(integral_ir, shared_classname)
+                continue
+        yield cached_code(integral_generator, "integral", integral_ir, parameters)
@@ -61,9 +61,24 @@ def generate_evaluate_reference_basis(L, data, parameters):
     # Return statement (value indicates that function is implemented)
     ret = L.Return(0)
 
+    # Evaluate the dofs of scalar tensor product elements by sum
+    # factorization, and all other dofs from their expansion in the
+    # basis of the full polynomial space
+    dofs_data = data["dofs_data"]
+    tensor_dofs = [idof for idof, dof_data in enumerate(dofs_data)
+                   if dof_data.get("tensor_factors") is not None]
+    expansion_dofs = [idof for idof, dof_data in enumerate(dofs_data)
+                      if dof_data.get("tensor_factors") is None]
+
     # Generate code with static tables of expansion coefficients
-    tables_code, coefficients_for_dof = generate_expansion_coefficients(
-        L, data["dofs_data"])
+    tables_code, coefficients = generate_expansion_coefficients(
+        L, [dofs_data[idof] for idof in expansion_dofs])
+    coefficients_for_dof = dict(zip(expansion_dofs, coefficients))
+
+    tensor_tables_code, factors = generate_tensor_factor_coefficients(
+        L, [dofs_data[idof] for idof in tensor_dofs])
+    tensor_factors_for_dof = dict(zip(tensor_dofs, factors))
+    tables_code += tensor_tables_code
 
     # Reset reference_values[:] to 0
     reset_values_code = [
@@ -77,15 +92,35 @@ def generate_evaluate_reference_basis(L, data, parameters):
     setup_code = tables_code + reset_values_code
 
     # Generate code to compute tables of basisvalues
-    basisvalues_code, basisvalues_for_degree, need_fiat_coordinates = \
-        generate_compute_basisvalues(
-            L, data["dofs_data"], element_cellname, tdim, X, ip)
+    if expansion_dofs:
+        basisvalues_code, basisvalues_for_degree, need_fiat_coordinates = \
+            generate_compute_basisvalues(
+                L, [dofs_data[idof] for idof in expansion_dofs], element_cellname, tdim, X, ip)
+    else:
+        basisvalues_code, need_fiat_coordinates = [], False
+    if tensor_dofs:
+        # Factors of degree 0 are constant and do not depend on Y
+        need_tensor_coordinates = any(num_members > 1 for factors in tensor_factors_for_dof.values()
+                                      for _, _, (_, num_members) in factors)
+        if need_tensor_coordinates and not need_fiat_coordinates:
+            basisvalues_code = generate_fiat_coordinate_mapping(L, tdim, X, ip) + basisvalues_code
+        factor_values_code, factor_values = generate_compute_tensor_factor_values(
+            L, tensor_factors_for_dof.values(), tdim)
+        basisvalues_code += factor_values_code
 
     # Accumulate products of basisvalues and coefficients into values
     accumulation_code = [
         L.Comment("Accumulate products of coefficients and basisvalues"),
     ]
-    for idof, dof_data in enumerate(data["dofs_data"]):
+    for idof in tensor_dofs:
+        # Product of the interval basis functions in each direction
+        dof_data = dofs_data[idof]
+        value = L.float_product([factor_values[factor][k] for factor, k in zip(
+            tensor_factors_for_dof[idof], dof_data["tensor_index"])])
+        accumulation_code += [L.Assign(ref_values[ip, idof, dof_data["reference_offset"]], value)]
+
+    for idof in expansion_dofs:
+        dof_data = dofs_data[idof]
         embedded_degree = dof_data["embedded_degree"]
         num_components = dof_data["num_components"]
         num_members = dof_data["num_expansion_members"]
@@ -220,21 +255,110 @@ def generate_compute_basisvalues(L, dofs_data, element_cellname, tdim, X, ip):
             basisvalues_for_degree[embedded_degree] = basisvalues
 
     if need_fiat_coordinates:
-        # Mapping from UFC reference cell coordinate X to FIAT reference cell coordinate Y
-        fiat_coordinate_mapping = [
-            L.Comment(
-                "Map from UFC reference coordinate X to FIAT reference coordinate Y"
-            ),
-            L.ArrayDecl(
-                "const double",
-                Y, (tdim, ),
-                values=[2.0 * X[ip * tdim + jj] - 1.0 for jj in range(tdim)]),
-        ]
-        basisvalues_code = fiat_coordinate_mapping + basisvalues_code
+        basisvalues_code = generate_fiat_coordinate_mapping(L, tdim, X, ip) + basisvalues_code
 
     return basisvalues_code, basisvalues_for_degree, need_fiat_coordinates
 
 
+def generate_fiat_coordinate_mapping(L, tdim, X, ip):
+    """Mapping from UFC reference cell coordinate X to FIAT reference cell coordinate Y."""
+    Y = L.Symbol("Y")
+    return [
+        L.Comment(
+            "Map from UFC reference coordinate X to FIAT reference coordinate Y"
+        ),
+        L.ArrayDecl(
+            "const double",
+            Y, (tdim, ),
+            values=[2.0 * X[ip * tdim + jj] - 1.0 for jj in range(tdim)]),
+    ]
+
+
+def generate_tensor_factor_coefficients(L, dofs_data):
+    """Generate static tables with the expansion coefficients of the
+    interval elements of tensor product elements.
+
+    Returns the tables and, for each dof, a tuple of (table name,
+    direction, table shape) identifying its factor in each direction.
+    """
+    all_tables = []
+    tables_code = []
+    factors_for_dof = []
+    for dof_data in dofs_data:
+        factors = []
+        for d, fiat_coefficients in enumerate(dof_data["tensor_factors"]):
+            # Reuse equal tables
+            coefficients = None
+            for symbol, table in all_tables:
+                if table.shape == fiat_coefficients.shape and numpy.allclose(
+                        table, fiat_coefficients):
+                    coefficients = symbol
+                    break
+
+            if coefficients is None:
+                coefficients = L.Symbol("tensor_coefficients%d" % len(all_tables))
+                all_tables.append((coefficients, fiat_coefficients))
+                tables_code += [
+                    L.ArrayDecl(
+                        "static const double",
+                        coefficients, fiat_coefficients.shape,
+                        values=fiat_coefficients)
+                ]
+            factors.append((coefficients.name, d, fiat_coefficients.shape))
+        factors_for_dof.append(tuple(factors))
+
+    return tables_code, factors_for_dof
+
+
+def generate_compute_tensor_factor_values(L, factors_for_dof, tdim):
+    """Generate code to compute the values of the interval basis
+    functions of tensor product elements in each direction, from the
+    Legendre polynomials in the FIAT reference coordinate Y."""
+    code = [
+        L.Comment("Compute interval basis functions in each direction"),
+    ]
+    Y = L.Symbol("Y")
+    i = L.Symbol("i")
+    r = L.Symbol("r")
+    legendre_for_degree = {}
+    values_for_factor = {}
+    for factors in factors_for_dof:
+        for factor in factors:
+            if factor in values_for_factor:
+                continue
+            name, d, (num_dofs, num_members) = factor
+            coefficients = L.Symbol(name)
+
+            # Legendre polynomials in direction d
+            degree = num_members - 1
+            legendre = legendre_for_degree.get((degree, d))
+            if legendre is None:
+                legendre = L.Symbol("legendre%d_%d" % (degree, d))
+                legendre_for_degree[(degree, d)] = legendre
+                Yd = L.FlattenedArray(Y, dims=(tdim, ), offset=d)
+                code += _generate_compute_interval_basisvalues(
+                    L, legendre, Yd, degree, num_members)
+
+            values = L.Symbol("tensor_values%d" % len(values_for_factor))
+            values_for_factor[factor] = values
+            code += [
+                L.ArrayDecl("double", values, (num_dofs, ), values=0),
+                L.ForRange(
+                    i,
+                    0,
+                    num_dofs,
+                    index_type=index_type,
+                    body=L.ForRange(
+                        r,
+                        0,
+                        num_members,
+                        index_type=index_type,
+                        body=L.AssignAdd(values[i], coefficients[i, r] * legendre[r])))
+            ]
+
+    return code, values_for_factor
+
+
 def _generate_compute_basisvalues(L, basisvalues, Y, element_cellname,
                                   embedded_degree, num_members):
     """From FIAT_NEW.expansions."""
@@ -8,11 +8,59 @@
 # You should have received a copy of the GNU Lesser General Public License
 # along with UFLACS. If not, see <http://www.gnu.org/licenses/>.
 
+import hashlib
+
+import numpy
+
 from ffc.codegeneration import integrals_template as ufc_integrals
 
+# Alignment (bytes) of the element tables stored in binary form
+binary_table_alignment = 64
+
+# numpy types of the supported scalar types
+_scalar_dtypes = {
+    "float": numpy.float32,
+    "double": numpy.float64,
+    "float complex": numpy.complex64,
+    "double complex": numpy.complex128,
+}
+
+
+def format_binary_tables(factory_name, tables, scalar_type):
+    """Format the element tables of an integral stored in binary form.
+
+    Returns the code defining an assembler label for each table, with
+    the values included from the file named after the integral with
+    the assembler directive .incbin, and the contents of this file.
+    The assembler looks for the file in the directory it is run from,
+    which must hence be the directory the file is written to.
+
+    The file name ends with the hash of the contents, since modules
+    built in the same directory (e.g. the JIT cache directory) may
+    contain integrals with the same name but different tables.
+    """
+    dtype = _scalar_dtypes[scalar_type]
+    tables = [(label, numpy.ascontiguousarray(values, dtype=dtype)) for label, values in tables.items()]
+    data = b"".join(values.tobytes() for _, values in tables)
+    filename = "{}_{}.bin".format(factory_name, hashlib.sha1(data).hexdigest())
+    parts = []
+    offset = 0
+    for label, values in tables:
+        parts.append(ufc_integrals.binary_table.format(
+            alignment=binary_table_alignment, label=label, filename=filename, offset=offset,
+            size=values.nbytes))
+        offset += values.nbytes
+    code = ufc_integrals.binary_tables.format(
+        factory_name=factory_name, filename=filename, tables="\n".join(parts))
+    return code, {filename: data}
+
 
 def generator(ir, parameters):
-    """Generate UFC code for an integral"""
+    """Generate UFC code for an integral.
+
+    Returns the declaration and implementation code, and a dict with
+    the contents of the binary files the implementation depends on,
+    keyed by file name."""
     factory_name = ir.classname
     integral_type = ir.integral_type
 
@@ -37,11 +85,66 @@ def generator(ir, parameters):
     tabulate_tensor_fn = tabulate_tensor_declaration.format(
         factory_name=factory_name, tabulate_tensor=code["tabulate_tensor"])
 
+    # Format batched tabulate tensor (custom integrals have none)
+    tabulate_tensor_batch_fn = ""
+    set_tabulate_tensor_batch = ""
+    if integral_type in ufc_integrals.tabulate_batch_implementation:
+        if "tabulate_tensor_batch_cell" in code:
+            tabulate_tensor_batch_fn = ufc_integrals.tabulate_batch_implementation[integral_type].format(
+                factory_name=factory_name, tables=code["tabulate_tensor_batch_tables"],
+                tabulate_tensor=code["tabulate_tensor_batch_cell"], **code["tabulate_tensor_batch_strides"])
+            tabulate_tensor_batch_name = "tabulate_tensor_batch_" + factory_name
+        else:
+            tabulate_tensor_batch_name = "NULL"
+        set_tabulate_tensor_batch = "\n  integral->tabulate_tensor_batch = {};".format(tabulate_tensor_batch_name)
+
+    # Format vectorized tabulate tensor (cell integrals only)
+    tabulate_tensor_simd_fn = ""
+    set_tabulate_tensor_simd = ""
+    if integral_type == "cell":
+        if "tabulate_tensor_simd" in code:
+            tabulate_tensor_simd_fn = ufc_integrals.tabulate_simd_implementation.format(
+                factory_name=factory_name, tabulate_tensor=code["tabulate_tensor_simd"])
+            simd_width = code["simd_width"]
+            tabulate_tensor_simd_name = "tabulate_tensor_simd_" + factory_name
+        else:
+            simd_width = 0
+            tabulate_tensor_simd_name = "NULL"
+        set_tabulate_tensor_simd = ("\n  integral->simd_width = {};"
+                                    "\n  integral->tabulate_tensor_simd = {};").format(
+                                        simd_width, tabulate_tensor_simd_name)
+
+    # Format element tables stored in binary form
+    binary_tables_code = ""
+    binary_files = {}
+    if code.get("binary_tables"):
+        binary_tables_code, binary_files = format_binary_tables(
+            factory_name, code["binary_tables"], parameters["scalar_type"])
+
     # Format implementation code
     implementation = ufc_integrals.factory.format(
         type=integral_type,
         factory_name=factory_name,
+        binary_tables=binary_tables_code,
         enabled_coefficients=code["enabled_coefficients"],
-        tabulate_tensor=tabulate_tensor_fn)
+        tabulate_tensor=tabulate_tensor_fn,
+        tabulate_tensor_batch=tabulate_tensor_batch_fn,
+        set_tabulate_tensor_batch=set_tabulate_tensor_batch,
+        tabulate_tensor_simd=tabulate_tensor_simd_fn,
+        set_tabulate_tensor_simd=set_tabulate_tensor_simd)
 
-    return declaration, implementation
+    return declaration, implementation, binary_files
+
+
+def shared_generator(ir, shared_classname):
+    """Generate UFC code for an integral with the same signature as the
+    integral named shared_classname, creating it with the kernels of the
+    latter instead of generating them again.
+
+    Returns the declaration and implementation code, and an empty dict
+    of binary files, as 'generator'."""
+    declaration = ufc_integrals.declaration.format(
+        type=ir.integral_type, factory_name=ir.classname)
+    implementation = ufc_integrals.shared_factory.format(
+        type=ir.integral_type, factory_name=ir.classname, shared_name=shared_classname)
+    return declaration, implementation, {}
@@ -62,20 +62,140 @@ void tabulate_tensor_{factory_name}(ufc_scalar_t* restrict A, const ufc_scalar_t
 """
 }
 
-factory = """
-// Code for {type}_integral {factory_name}
+tabulate_batch_implementation = {
+    "cell":
+    """
+void tabulate_tensor_batch_{factory_name}(ufc_scalar_t* restrict A_batch, const ufc_scalar_t* w_batch,
+                                          const double* restrict coordinate_dofs_batch, int num_cells,
+                                          const int* restrict cell_orientations)
+{{
+{tables}
+    for (int cell_index = 0; cell_index < num_cells; ++cell_index)
+    {{
+        ufc_scalar_t* restrict A = A_batch + cell_index * {A_size};
+        const ufc_scalar_t* w = w_batch + cell_index * {w_size};
+        const double* restrict coordinate_dofs = coordinate_dofs_batch + cell_index * {coordinate_dofs_size};
+        const int cell_orientation = cell_orientations ? cell_orientations[cell_index] : 0;
+        // Not every kernel uses all of its arguments
+        (void) w; (void) coordinate_dofs; (void) cell_orientation;
+{tabulate_tensor}
+    }}
+}}
+""",
+    "exterior_facet":
+    """
+void tabulate_tensor_batch_{factory_name}(ufc_scalar_t* restrict A_batch, const ufc_scalar_t* w_batch,
+                                          const double* restrict coordinate_dofs_batch, int num_cells,
+                                          const int* restrict facets,
+                                          const int* restrict cell_orientations)
+{{
+{tables}
+    for (int cell_index = 0; cell_index < num_cells; ++cell_index)
+    {{
+        ufc_scalar_t* restrict A = A_batch + cell_index * {A_size};
+        const ufc_scalar_t* w = w_batch + cell_index * {w_size};
+        const double* restrict coordinate_dofs = coordinate_dofs_batch + cell_index * {coordinate_dofs_size};
+        const int facet = facets[cell_index];
+        const int cell_orientation = cell_orientations ? cell_orientations[cell_index] : 0;
+        // Not every kernel uses all of its arguments
+        (void) w; (void) coordinate_dofs; (void) facet; (void) cell_orientation;
+{tabulate_tensor}
+    }}
+}}
+""",
+    "interior_facet":
+    """
+void tabulate_tensor_batch_{factory_name}(ufc_scalar_t* restrict A_batch, const ufc_scalar_t* w_batch,
+                                          const double* restrict coordinate_dofs_0_batch,
+                                          const double* restrict coordinate_dofs_1_batch, int num_cells,
+                                          const int* restrict facets_0, const int* restrict facets_1,
+                                          const int* restrict cell_orientations_0,
+                                          const int* restrict cell_orientations_1)
+{{
+{tables}
+    for (int cell_index = 0; cell_index < num_cells; ++cell_index)
+    {{
+        ufc_scalar_t* restrict A = A_batch + cell_index * {A_size};
+        const ufc_scalar_t* w = w_batch + cell_index * {w_size};
+        const double* restrict coordinate_dofs_0 = coordinate_dofs_0_batch + cell_index * {coordinate_dofs_size};
+        const double* restrict coordinate_dofs_1 = coordinate_dofs_1_batch + cell_index * {coordinate_dofs_size};
+        const int facet_0 = facets_0[cell_index];
+        const int facet_1 = facets_1[cell_index];
+        const int cell_orientation_0 = cell_orientations_0 ? cell_orientations_0[cell_index] : 0;
+        const int cell_orientation_1 = cell_orientations_1 ? cell_orientations_1[cell_index] : 0;
+        // Not every kernel uses all of its arguments
+        (void) w; (void) coordinate_dofs_0; (void) coordinate_dofs_1; (void) facet_0; (void) facet_1;
+        (void) cell_orientation_0; (void) cell_orientation_1;
+{tabulate_tensor}
+    }}
+}}
+""",
+    "vertex":
+    """
+void tabulate_tensor_batch_{factory_name}(ufc_scalar_t* restrict A_batch, const ufc_scalar_t* w_batch,
+                                          const double* restrict coordinate_dofs_batch, int num_cells,
+                                          const int* restrict vertices,
+                                          const int* restrict cell_orientations)
+{{
+{tables}
+    for (int cell_index = 0; cell_index < num_cells; ++cell_index)
+    {{
+        ufc_scalar_t* restrict A = A_batch + cell_index * {A_size};
+        const ufc_scalar_t* w = w_batch + cell_index * {w_size};
+        const double* restrict coordinate_dofs = coordinate_dofs_batch + cell_index * {coordinate_dofs_size};
+        const int vertex = vertices[cell_index];
+        const int cell_orientation = cell_orientations ? cell_orientations[cell_index] : 0;
+        // Not every kernel uses all of its arguments
+        (void) w; (void) coordinate_dofs; (void) vertex; (void) cell_orientation;
+{tabulate_tensor}
+    }}
+}}
+"""
+}
 
+tabulate_simd_implementation = """
+void tabulate_tensor_simd_{factory_name}(ufc_scalar_t* restrict A, const ufc_scalar_t* restrict w,
+                                         const double* restrict coordinate_dofs,
+                                         const int* restrict cell_orientation)
+{{
 {tabulate_tensor}
+}}
+"""
+
+binary_tables = """
+// Element tables of {factory_name}, read from {filename} by the assembler
+__asm__(".pushsection .rodata\\n"
+{tables}
+        ".popsection");"""
+
+binary_table = """        ".balign {alignment}\\n"
+        "{label}:\\n"
+        ".incbin \\"{filename}\\", {offset}, {size}\\n\""""
 
+factory = """
+// Code for {type}_integral {factory_name}
+{binary_tables}
+{tabulate_tensor}
+{tabulate_tensor_batch}{tabulate_tensor_simd}
 ufc_{type}_integral* create_{factory_name}(void)
 {{
   static const bool enabled{enabled_coefficients}
 
   ufc_{type}_integral* integral = malloc(sizeof(*integral));
   integral->enabled_coefficients = enabled;
-  integral->tabulate_tensor = tabulate_tensor_{factory_name};
+  integral->tabulate_tensor = tabulate_tensor_{factory_name};{set_tabulate_tensor_batch}{set_tabulate_tensor_simd}
   return integral;
 }};
 
 // End of code for {type}_integral {factory_name}
 """
+
+shared_factory = """
+// Code for {type}_integral {factory_name}, using the kernels of {shared_name}
+ufc_{type}_integral* create_{factory_name}(void)
+{{
+  return create_{shared_name}();
+}};
+
+// End of code for {type}_integral {factory_name}
+"""
@@ -5,6 +5,9 @@
 #
 # SPDX-License-Identifier:    LGPL-3.0-or-later
 
+import collections
+import concurrent.futures
+import fcntl
 import importlib
 import logging
 import os
@@ -18,6 +21,18 @@ import ffc
 
 logger = logging.getLogger(__name__)
 
+# Bounds (seconds) of the exponential backoff used when waiting for
+# another process to finish building a module
+_WAIT_MIN_DELAY = 0.001
+_WAIT_MAX_DELAY = 0.1
+
+# Open lock files of modules being built by this process
+_build_locks = {}
+
+# Modules loaded by this process and their created objects, keyed by
+# module name and ordered from least to most recently used
+_module_cache = collections.OrderedDict()
+
 UFC_HEADER_DECL = """
 typedef {} ufc_scalar_t;  /* Hack to deal with scalar type */
 
@@ -138,6 +153,14 @@ const bool* enabled_coefficients;
 void (*tabulate_tensor)(ufc_scalar_t* restrict A, const ufc_scalar_t* w,
                         const double* restrict coordinate_dofs,
                         int cell_orientation);
+void (*tabulate_tensor_batch)(ufc_scalar_t* restrict A, const ufc_scalar_t* w,
+                              const double* restrict coordinate_dofs,
+                              int num_cells,
+                              const int* restrict cell_orientations);
+int simd_width;
+void (*tabulate_tensor_simd)(ufc_scalar_t* restrict A, const ufc_scalar_t* restrict w,
+                             const double* restrict coordinate_dofs,
+                             const int* restrict cell_orientation);
 } ufc_cell_integral;
 
 typedef struct ufc_exterior_facet_integral
@@ -146,6 +169,10 @@ const bool* enabled_coefficients;
 void (*tabulate_tensor)(ufc_scalar_t* restrict A, const ufc_scalar_t* w,
                         const double* restrict coordinate_dofs, int facet,
                         int cell_orientation);
+void (*tabulate_tensor_batch)(ufc_scalar_t* restrict A, const ufc_scalar_t* w,
+                              const double* restrict coordinate_dofs,
+                              int num_cells, const int* restrict facets,
+                              const int* restrict cell_orientations);
 } ufc_exterior_facet_integral;
 
 typedef struct ufc_interior_facet_integral
@@ -156,6 +183,13 @@ void (*tabulate_tensor)(ufc_scalar_t* restrict A, const ufc_scalar_t* w,
                         const double* restrict coordinate_dofs_1,
                         int facet_0, int facet_1, int cell_orientation_0,
                         int cell_orientation_1);
+void (*tabulate_tensor_batch)(ufc_scalar_t* restrict A, const ufc_scalar_t* w,
+                              const double* restrict coordinate_dofs_0,
+                              const double* restrict coordinate_dofs_1,
+                              int num_cells, const int* restrict facets_0,
+                              const int* restrict facets_1,
+                              const int* restrict cell_orientations_0,
+                              const int* restrict cell_orientations_1);
 } ufc_interior_facet_integral;
 
 typedef struct ufc_vertex_integral
@@ -164,6 +198,10 @@ const bool* enabled_coefficients;
 void (*tabulate_tensor)(ufc_scalar_t* restrict A, const ufc_scalar_t* w,
                         const double* restrict coordinate_dofs, int vertex,
                         int cell_orientation);
+void (*tabulate_tensor_batch)(ufc_scalar_t* restrict A, const ufc_scalar_t* w,
+                              const double* restrict coordinate_dofs,
+                              int num_cells, const int* restrict vertices,
+                              const int* restrict cell_orientations);
 } ufc_vertex_integral;
 
 typedef struct ufc_custom_integral
@@ -214,6 +252,19 @@ ufc_custom_integral* (*create_custom_integral)(int subdomain_id);
 
 
 def get_cached_module(module_name, object_names, parameters):
+    """Load a module from the cache, waiting for it if another process
+    is building it.
+
+    Returns ``(None, None)`` if the module should be built by this
+    process. The build lock on the module is then held until the
+    caller releases it with ``_release_build_lock``, after building
+    the module or failing to.
+    """
+    # Fast path for modules already loaded by this process
+    compiled = _module_cache.get(module_name)
+    if compiled is not None:
+        _module_cache.move_to_end(module_name)
+        return compiled
 
     cache_dir = pathlib.Path(parameters.get("cache_dir", "compile_cache"))
     cache_dir = cache_dir.expanduser()
@@ -222,31 +273,88 @@ def get_cached_module(module_name, object_names, parameters):
 
     c_filename = cache_dir.joinpath(module_name + ".c")
     ready_name = c_filename.with_suffix(".c.cached")
+    lock_name = c_filename.with_suffix(".c.lock")
 
-    # Ensure cache dir exists and ensure it is first on the path for loading modules
+    # Ensure cache dir exists
     os.makedirs(cache_dir, exist_ok=True)
-    sys.path.insert(0, str(cache_dir))
 
-    try:
-        # Create C file with exclusive access
-        open(c_filename, "x")
-        return None, None
-    except FileExistsError:
-        logger.info("Cached C file already exists: " + str(c_filename))
-        # Now wait for ready
-        for i in range(timeout):
-            if os.path.exists(ready_name):
-                # Build list of compiled objects
-                compiled_module = importlib.import_module(module_name)
-                sys.path.remove(str(cache_dir))
-                compiled_objects = [getattr(compiled_module.lib, "create_" + name)() for name in object_names]
-                return compiled_objects, compiled_module
-
-            logger.info("Waiting for {} to appear.".format(str(ready_name)))
-            time.sleep(1)
-        raise TimeoutError("""JIT compilation did not complete on another process.
+    if not ready_name.exists():
+        lock = open(lock_name, "a+")
+        deadline = time.monotonic() + timeout
+        delay = _WAIT_MIN_DELAY
+        while True:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                # Another process is building the module
+                if delay == _WAIT_MIN_DELAY:
+                    logger.info("Waiting for {} to appear.".format(str(ready_name)))
+            else:
+                if ready_name.exists():
+                    break
+
+                # A pid left in the lock file belongs to a builder that
+                # died without releasing the lock properly
+                lock.seek(0)
+                pid = lock.read().strip()
+                if pid:
+                    logger.warning("Recovering stale lock {} of process {}.".format(str(lock_name), pid))
+                lock.seek(0)
+                lock.truncate()
+                lock.write(str(os.getpid()))
+                lock.flush()
+                _build_locks[module_name] = lock
+                return None, None
+
+            if ready_name.exists():
+                break
+            if time.monotonic() > deadline:
+                lock.close()
+                raise TimeoutError("""JIT compilation did not complete on another process.
         Try cleaning cache (e.g. remove {}) or increase timeout parameter.""".format(c_filename))
 
+            time.sleep(delay)
+            delay = min(2 * delay, _WAIT_MAX_DELAY)
+        lock.close()
+
+    return _load_module(module_name, object_names, cache_dir, parameters)
+
+
+def _load_module(module_name, object_names, cache_dir, parameters):
+    """Import a compiled module from the cache dir, create its objects
+    and store both in the in-memory module cache."""
+
+    # Ensure cache dir is first on the path for loading the module
+    path = str(cache_dir.absolute())
+    sys.path.insert(0, path)
+    try:
+        compiled_module = importlib.import_module(module_name)
+    finally:
+        sys.path.remove(path)
+
+    # Build list of compiled objects
+    compiled_objects = [getattr(compiled_module.lib, "create_" + name)() for name in object_names]
+
+    # Store in cache, evicting the least recently used modules
+    cache_size = int(parameters.get("module_cache_size", 128))
+    if cache_size > 0:
+        _module_cache[module_name] = (compiled_objects, compiled_module)
+        while len(_module_cache) > cache_size:
+            _module_cache.popitem(last=False)
+
+    return compiled_objects, compiled_module
+
+
+def _release_build_lock(module_name):
+    """Release the build lock taken by get_cached_module."""
+    lock = _build_locks.pop(module_name, None)
+    if lock is not None:
+        lock.seek(0)
+        lock.truncate()
+        lock.flush()
+        fcntl.flock(lock, fcntl.LOCK_UN)
+        lock.close()
+
 
 def compile_elements(elements, module_name=None, parameters=None):
     """Compile a list of UFL elements and dofmaps into UFC Python objects"""
@@ -270,16 +378,20 @@ def compile_elements(elements, module_name=None, parameters=None):
         obj = list(zip(obj[::2], obj[1::2]))
         return obj, mod
 
-    scalar_type = p["scalar_type"].replace("complex", "_Complex")
-    decl = UFC_HEADER_DECL.format(scalar_type) + UFC_ELEMENT_DECL + UFC_DOFMAP_DECL
-    element_template = "ufc_finite_element * create_{name}(void);\n"
-    dofmap_template = "ufc_dofmap * create_{name}(void);\n"
-
-    for i in range(len(elements)):
-        decl += element_template.format(name=names[i * 2])
-        decl += dofmap_template.format(name=names[i * 2 + 1])
-
-    objects, module = _compile_objects(decl, elements, names, module_name, p)
+    # This process holds the build lock until the module is built or fails
+    try:
+        scalar_type = p["scalar_type"].replace("complex", "_Complex")
+        decl = UFC_HEADER_DECL.format(scalar_type) + UFC_ELEMENT_DECL + UFC_DOFMAP_DECL
+        element_template = "ufc_finite_element * create_{name}(void);\n"
+        dofmap_template = "ufc_dofmap * create_{name}(void);\n"
+
+        for i in range(len(elements)):
+            decl += element_template.format(name=names[i * 2])
+            decl += dofmap_template.format(name=names[i * 2 + 1])
+
+        objects, module = _compile_objects(decl, elements, names, module_name, p)
+    finally:
+        _release_build_lock(module_name)
     # Pair up elements with dofmaps
     objects = list(zip(objects[::2], objects[1::2]))
     return objects, module
@@ -301,15 +413,61 @@ def compile_forms(forms, module_name=None, parameters=None):
     if obj is not None:
         return obj, mod
 
-    scalar_type = p["scalar_type"].replace("complex", "_Complex")
-    decl = UFC_HEADER_DECL.format(scalar_type) + UFC_ELEMENT_DECL + UFC_DOFMAP_DECL + \
-        UFC_COORDINATEMAPPING_DECL + UFC_INTEGRAL_DECL + UFC_FORM_DECL
+    # This process holds the build lock until the module is built or fails
+    try:
+        scalar_type = p["scalar_type"].replace("complex", "_Complex")
+        decl = UFC_HEADER_DECL.format(scalar_type) + UFC_ELEMENT_DECL + UFC_DOFMAP_DECL + \
+            UFC_COORDINATEMAPPING_DECL + UFC_INTEGRAL_DECL + UFC_FORM_DECL
+
+        form_template = "ufc_form * create_{name}(void);\n"
+        for name in form_names:
+            decl += form_template.format(name=name)
+
+        return _compile_objects(decl, forms, form_names, module_name, p)
+    finally:
+        _release_build_lock(module_name)
+
+
+def compile_forms_parallel(forms, parameters=None, max_workers=None):
+    """Compile a list of UFL forms into UFC Python objects, one module
+    per form, distributing code generation and C compilation over a
+    pool of processes.
+
+    Returns a list with the ``(objects, module)`` pair for each form,
+    as returned by ``compile_forms([form], parameters=parameters)``.
+
+    Forms sharing a signature are built once. Workers build through
+    ``compile_forms``, so the cache protocol of ``get_cached_module``
+    ensures no two processes build the same module.
+    """
+    p = ffc.parameters.validate_parameters(parameters)
+
+    logger.info('Compiling forms in parallel: ' + str(forms))
+
+    # Only submit one build per unique signature which is not already
+    # available in the cache
+    cache_dir = pathlib.Path(p["cache_dir"]).expanduser()
+    pending = {}
+    for form in forms:
+        module_name = 'libffc_forms_' + ffc.classname.compute_signature([form], '', p)
+        ready_name = cache_dir.joinpath(module_name + ".c.cached")
+        if module_name not in pending and not ready_name.exists():
+            pending[module_name] = form
+
+    if len(pending) > 1:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(_build_forms_module, form, p) for form in pending.values()]
+            for future in concurrent.futures.as_completed(futures):
+                logger.info("Built module {}".format(future.result()))
+
+    # Load modules (and build any remaining one) on this process
+    return [compile_forms([form], parameters=p) for form in forms]
 
-    form_template = "ufc_form * create_{name}(void);\n"
-    for name in form_names:
-        decl += form_template.format(name=name)
 
-    return _compile_objects(decl, forms, form_names, module_name, p)
+def _build_forms_module(form, parameters):
+    """Build the module for a single form on a worker process and return its name."""
+    _, module = compile_forms([form], parameters=parameters)
+    return module.__name__
 
 
 def compile_coordinate_maps(meshes, module_name=None, parameters=None):
@@ -328,20 +486,34 @@ def compile_coordinate_maps(meshes, module_name=None, parameters=None):
     if obj is not None:
         return obj, mod
 
-    scalar_type = p["scalar_type"].replace("complex", "_Complex")
-    decl = UFC_HEADER_DECL.format(scalar_type) + UFC_COORDINATEMAPPING_DECL
-    cmap_template = "ufc_coordinate_mapping * create_{name}(void);\n"
+    # This process holds the build lock until the module is built or fails
+    try:
+        scalar_type = p["scalar_type"].replace("complex", "_Complex")
+        decl = UFC_HEADER_DECL.format(scalar_type) + UFC_COORDINATEMAPPING_DECL
+        cmap_template = "ufc_coordinate_mapping * create_{name}(void);\n"
 
-    for name in cmap_names:
-        decl += cmap_template.format(name=name)
+        for name in cmap_names:
+            decl += cmap_template.format(name=name)
 
-    return _compile_objects(decl, meshes, cmap_names, module_name, p)
+        return _compile_objects(decl, meshes, cmap_names, module_name, p)
+    finally:
+        _release_build_lock(module_name)
 
 
 def _compile_objects(decl, ufl_objects, object_names, module_name, parameters):
     cache_dir = pathlib.Path(parameters.get("cache_dir", "compile_cache"))
     cache_dir = cache_dir.expanduser()
-    _, code_body = ffc.compiler.compile_ufl_objects(ufl_objects, prefix="JIT", parameters=parameters)
+
+    # Ensure cache dir exists
+    os.makedirs(cache_dir, exist_ok=True)
+
+    _, code_body, binary_files = ffc.compiler.compile_ufl_objects(
+        ufl_objects, prefix="JIT", parameters=parameters)
+
+    # Binary files included by the code are written next to the C file,
+    # in the directory the C compiler is run from
+    for filename, data in binary_files.items():
+        ffc.formatting.write_binary_file(data, filename, dict(parameters, output_dir=str(cache_dir)))
 
     ffibuilder = cffi.FFI()
     ffibuilder.set_source(
@@ -354,10 +526,6 @@ def _compile_objects(decl, ufl_objects, object_names, module_name, parameters):
     c_filename = cache_dir.joinpath(module_name + ".c")
     ready_name = c_filename.with_suffix(".c.cached")
 
-    # Ensure path is set for module and ensure cache dir exists
-    sys.path.insert(0, str(cache_dir))
-    os.makedirs(cache_dir, exist_ok=True)
-
     # Compile
     ffibuilder.compile(tmpdir=cache_dir, verbose=False)
 
@@ -366,9 +534,4 @@ def _compile_objects(decl, ufl_objects, object_names, module_name, parameters):
     fd = open(ready_name, "x")
     fd.close()
 
-    # Build list of compiled objects
-    compiled_module = importlib.import_module(module_name)
-    sys.path.remove(str(cache_dir))
-    compiled_objects = [getattr(compiled_module.lib, "create_" + name)() for name in object_names]
-
-    return compiled_objects, compiled_module
+    return _load_module(module_name, object_names, cache_dir, parameters)
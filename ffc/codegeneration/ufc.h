@@ -386,6 +386,27 @@ extern "C"
     void (*tabulate_tensor)(ufc_scalar_t* restrict A, const ufc_scalar_t* w,
                             const double* restrict coordinate_dofs,
                             int cell_orientation);
+
+    /// Tabulate the element tensors of num_cells cells. A, w and
+    /// coordinate_dofs hold the arrays passed to tabulate_tensor for
+    /// each cell, one after the other. cell_orientations may be NULL.
+    void (*tabulate_tensor_batch)(ufc_scalar_t* restrict A, const ufc_scalar_t* w,
+                                  const double* restrict coordinate_dofs,
+                                  int num_cells,
+                                  const int* restrict cell_orientations);
+
+    /// Number of cells tabulated by each call to tabulate_tensor_simd,
+    /// 0 if the integral has no vectorized kernel
+    int simd_width;
+
+    /// Tabulate the element tensors of simd_width cells at once. A, w
+    /// and coordinate_dofs are in structure of arrays layout, with
+    /// entry i of cell c at [i*simd_width + c], and cell_orientation
+    /// holds one value per cell. NULL unless generated with the
+    /// parameter vectorize.
+    void (*tabulate_tensor_simd)(ufc_scalar_t* restrict A, const ufc_scalar_t* restrict w,
+                                 const double* restrict coordinate_dofs,
+                                 const int* restrict cell_orientation);
   } ufc_cell_integral;
 
   typedef struct ufc_exterior_facet_integral
@@ -394,6 +415,12 @@ extern "C"
     void (*tabulate_tensor)(ufc_scalar_t* restrict A, const ufc_scalar_t* w,
                             const double* restrict coordinate_dofs, int facet,
                             int cell_orientation);
+
+    /// Batched tabulate_tensor, see ufc_cell_integral
+    void (*tabulate_tensor_batch)(ufc_scalar_t* restrict A, const ufc_scalar_t* w,
+                                  const double* restrict coordinate_dofs,
+                                  int num_cells, const int* restrict facets,
+                                  const int* restrict cell_orientations);
   } ufc_exterior_facet_integral;
 
   typedef struct ufc_interior_facet_integral
@@ -404,6 +431,15 @@ extern "C"
                             const double* restrict coordinate_dofs_1,
                             int facet_0, int facet_1, int cell_orientation_0,
                             int cell_orientation_1);
+
+    /// Batched tabulate_tensor, see ufc_cell_integral
+    void (*tabulate_tensor_batch)(ufc_scalar_t* restrict A, const ufc_scalar_t* w,
+                                  const double* restrict coordinate_dofs_0,
+                                  const double* restrict coordinate_dofs_1,
+                                  int num_cells, const int* restrict facets_0,
+                                  const int* restrict facets_1,
+                                  const int* restrict cell_orientations_0,
+                                  const int* restrict cell_orientations_1);
   } ufc_interior_facet_integral;
 
   typedef struct ufc_vertex_integral
@@ -412,6 +448,12 @@ extern "C"
     void (*tabulate_tensor)(ufc_scalar_t* restrict A, const ufc_scalar_t* w,
                             const double* restrict coordinate_dofs, int vertex,
                             int cell_orientation);
+
+    /// Batched tabulate_tensor, see ufc_cell_integral
+    void (*tabulate_tensor_batch)(ufc_scalar_t* restrict A, const ufc_scalar_t* w,
+                                  const double* restrict coordinate_dofs,
+                                  int num_cells, const int* restrict vertices,
+                                  const int* restrict cell_orientations);
   } ufc_vertex_integral;
 
   typedef struct ufc_custom_integral
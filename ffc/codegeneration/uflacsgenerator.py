@@ -11,10 +11,13 @@ import collections
 import itertools
 import logging
 
+import numpy
+
 import ufl
 from ffc.codegeneration.backend import FFCBackend
 from ffc.codegeneration.C.cnodes import pad_dim, pad_innermost_dim
 from ffc.codegeneration.C.format_lines import format_indented_lines
+from ffc.codegeneration.C.vectorize import vectorize_cells
 from ffc.ir.representationutils import initialize_integral_code
 from ffc.ir.uflacs.elementtables import piecewise_ttypes
 
@@ -36,15 +39,49 @@ def generate_integral_code(ir, prefix, parameters):
     ig = IntegralGenerator(ir, backend, precision)
 
     # Generate code ast for the tabulate_tensor body
-    parts = ig.generate()
+    L = backend.language
+    tables = ig.generate_tables()
+    cell_code = ig.generate_cell_code()
 
     # Format code as string
-    body = format_indented_lines(parts.cs_format(precision), 1)
+    body = format_indented_lines(L.StatementList(tables + cell_code).cs_format(precision), 1)
 
     # Generate generic ffc code snippets and add uflacs specific parts
     code = initialize_integral_code(ir, prefix, parameters)
     code["tabulate_tensor"] = body
     code["additional_includes_set"] = set(ig.get_includes())
+    code["binary_tables"] = ig.binary_tables
+
+    # The batched kernel declares the tables once and computes the
+    # element tensors of the cells in a loop around the cell code
+    if ir.integral_type not in ufl.measure.custom_integral_types:
+        code["tabulate_tensor_batch_tables"] = format_indented_lines(L.StatementList(tables).cs_format(precision), 1)
+        code["tabulate_tensor_batch_cell"] = format_indented_lines(L.StatementList(cell_code).cs_format(precision), 2)
+        num_restrictions = 2 if ir.integral_type == "interior_facet" else 1
+        code["tabulate_tensor_batch_strides"] = {
+            "A_size": int(numpy.prod(ir.tensor_shape)),
+            "w_size": num_restrictions * ir.coefficient_dofs_size,
+            "coordinate_dofs_size": ir.coordinate_dofs_size,
+        }
+
+    # The vectorized kernel computes the element tensors of a fixed
+    # number of cells at once, with A, w and coordinate_dofs in
+    # structure of arrays layout
+    if ir.integral_type == "cell" and ir.params["vectorize"]:
+        symbols = backend.symbols
+        width = ir.params["simd_width"]
+        try:
+            simd_code = vectorize_cells(
+                cell_code, "lane", width,
+                soa_arguments=(symbols.element_tensor().name, "w", "coordinate_dofs"),
+                lane_arguments=(symbols.cell_orientation_argument(None).name, ),
+                alignas=ir.params["alignas"])
+        except NotImplementedError as e:
+            logger.warning("Not generating vectorized kernel for {}: {}".format(ir.classname, e))
+        else:
+            code["tabulate_tensor_simd"] = format_indented_lines(
+                L.StatementList(tables + simd_code).cs_format(precision), 1)
+            code["simd_width"] = width
     # code["additional_includes_set"].update(ir.get("additional_includes_set", ()))
 
     return code
@@ -81,6 +118,10 @@ class IntegralGenerator(object):
         # Set of counters used for assigning names to intermediate variables
         self.symbol_counters = collections.defaultdict(int)
 
+        # Values of the element tables stored in binary form, keyed by
+        # the assembler label of each table
+        self.binary_tables = collections.OrderedDict()
+
     def get_includes(self):
         """Return list of include statements needed to support generated code."""
         includes = set()
@@ -176,10 +217,11 @@ class IntegralGenerator(object):
         that matches a suitable version of the UFC tabulate_tensor signatures.
         """
         L = self.backend.language
+        return L.StatementList(self.generate_tables() + self.generate_cell_code())
 
-        # Assert that scopes are empty: expecting this to be called only once
-        assert not any(d for d in self.scopes.values())
-
+    def generate_tables(self):
+        """Generate the static tables of the tabulate_tensor body, which
+        do not depend on the cell."""
         parts = []
 
         # Generate the tables of quadrature points and weights
@@ -188,6 +230,16 @@ class IntegralGenerator(object):
         # Generate the tables of basis function values and preintegrated blocks
         parts += self.generate_element_tables()
 
+        return parts
+
+    def generate_cell_code(self):
+        """Generate the part of the tabulate_tensor body computing the
+        element tensor of a cell from the static tables."""
+        # Assert that scopes are empty: expecting this to be called only once
+        assert not any(d for d in self.scopes.values())
+
+        parts = []
+
         # Generate code to compute piecewise constant scalar factors
         parts += self.generate_unstructured_piecewise_partition()
 
@@ -235,7 +287,7 @@ class IntegralGenerator(object):
         parts += all_postparts
         parts += all_finalizeparts
 
-        return L.StatementList(parts)
+        return parts
 
     def generate_quadrature_tables(self):
         """Generate static tables of quadrature points and weights."""
@@ -294,6 +346,7 @@ class IntegralGenerator(object):
 
         alignas = self.ir.params["alignas"]
         padlen = self.ir.params["padlen"]
+        binary_tables = self.ir.params["binary_tables"]
 
         if self.ir.integral_type in ufl.measure.custom_integral_types:
             # Define only piecewise tables
@@ -315,9 +368,31 @@ class IntegralGenerator(object):
             if inline_tables and name[:2] == "PI":
                 continue
 
-            decl = L.ArrayDecl(
-                "static const ufc_scalar_t", name, table.shape, table, alignas=alignas, padlen=p)
-            parts += [decl]
+            if binary_tables:
+                # Declare the table stored in the binary table file of
+                # the integral, see ffc.codegeneration.integrals. Block
+                # scope extern declarations with the same identifier
+                # refer to the same object throughout the file, so the
+                # table is declared under its label, unique per
+                # integral, and accessed through a pointer named after
+                # the table.
+                label = "{}_{}".format(self.ir.classname, name)
+                if label not in self.binary_tables:
+                    sizes = pad_innermost_dim(table.shape, p)
+                    values = numpy.zeros(sizes)
+                    values[..., :table.shape[-1]] = table
+                    self.binary_tables[label] = values
+                dims = ["[{}]".format(n) for n in self.binary_tables[label].shape]
+                decl = [
+                    L.VerbatimStatement("{}extern const ufc_scalar_t {}{} __asm__(\"{}\");".format(
+                        "alignas({}) ".format(alignas) if alignas else "", label, "".join(dims), label)),
+                    L.VerbatimStatement("const ufc_scalar_t (* const {}){} = {};".format(
+                        name, "".join(dims[1:]), label))
+                ]
+            else:
+                decl = [L.ArrayDecl(
+                    "static const ufc_scalar_t", name, table.shape, table, alignas=alignas, padlen=p)]
+            parts += decl
 
         # Add leading comment if there are any tables
         parts = L.commented_code_list(parts, [
@@ -325,6 +400,7 @@ class IntegralGenerator(object):
             "FE* dimensions: [entities][points][dofs]",
             "PI* dimensions: [entities][dofs][dofs] or [entities][dofs]",
             "PM* dimensions: [entities][dofs][dofs]",
+            "SF* dimensions: [points][dofs]",
         ])
         return parts
 
@@ -682,6 +758,7 @@ class IntegralGenerator(object):
             "full": "TF",
             "safe": "TS",
             "quadrature": "TQ",
+            "tensor": "TT",
         }
         blocknames = {
             # "preintegrated": "BI",
@@ -908,6 +985,15 @@ class IntegralGenerator(object):
             # Define rhs expression for A[blockmap[arg_indices]] += A_rhs
             A_rhs = B_rhs
 
+        elif blockdata.block_mode == "tensor":
+            fw_rhs = L.float_product([f, weight])
+            A_rhs, tensor_preparts, tensor_quadparts, tensor_postparts = \
+                self.generate_tensor_contraction(num_points, blockdata, tempname, fw_rhs, iq,
+                                                 arg_indices)
+            preparts += tensor_preparts
+            quadparts += tensor_quadparts
+            postparts += tensor_postparts
+
         # Equip code with comments
         comments = ["UFLACS block mode: {}".format(blockdata.block_mode)]
         preparts = L.commented_code_list(preparts, comments)
@@ -916,6 +1002,88 @@ class IntegralGenerator(object):
 
         return A_rhs, preparts, quadparts, postparts
 
+    def generate_tensor_contraction(self, num_points, blockdata, tempname, fw_rhs, iq, arg_indices):
+        """Generate sum factorized integration of a block on a tensor
+        product cell.
+
+        The weighted integrand values FW are stored for each point
+        inside the quadloop, and contracted with the one dimensional
+        factors of the argument tables after the quadloop, one
+        direction at a time. Stage s contracts the leading point axis
+        q_s of an array with shape [n_s][rest] into an array with
+        shape [rest][m_s^0]...[m_s^r], which leaves the block values
+        with the dofs of all arguments in direction 0 first.
+        """
+        L = self.backend.language
+        alignas = self.ir.params["alignas"]
+        vectorize = self.ir.params["vectorize"]
+        tables = self.ir.unique_tables
+
+        preparts = []
+        quadparts = []
+        postparts = []
+
+        factors = blockdata.tensor_factors
+        rank = len(factors)
+        dim = len(factors[0].names)
+
+        # Number of points and one dimensional dofs in each direction
+        n = [tables[factors[0].names[d]].shape[0] for d in range(dim)]
+        m = [[tables[tfd.names[d]].shape[1] for d in range(dim)] for tfd in factors]
+
+        # Store fw = f * weight for each point
+        key = (num_points, blockdata.factor_index, blockdata.factor_is_piecewise)
+        FW, defined = self.get_temp_symbol("TW", key)
+        if not defined:
+            preparts.append(L.ArrayDecl("ufc_scalar_t", FW, num_points, alignas=alignas))
+            quadparts.append(L.Assign(FW[iq], fw_rhs))
+
+        key += tuple(tfd.names for tfd in factors)
+        T, defined = self.get_temp_symbol(tempname, key)
+        if not defined:
+            ir = L.Symbol("ir")
+            X = FW
+            for s in range(dim):
+                # Size of the axes following the contracted one
+                rest = ufl.product(n[s + 1:]) * ufl.product(
+                    [m[a][d] for d in range(s) for a in range(rank)])
+                ms = [m[a][s] for a in range(rank)]
+
+                Y = T if s == dim - 1 else self.new_temp_symbol(tempname)
+                postparts.append(
+                    L.ArrayDecl("ufc_scalar_t", Y, rest * ufl.product(ms), 0, alignas=alignas))
+
+                # Y[r][k^0]...[k^r] += X[q][r] * U^0[q][k^0] * ... * U^r[q][k^r]
+                Xs = L.FlattenedArray(X, dims=(n[s], rest))
+                Ys = L.FlattenedArray(Y, dims=[rest] + ms)
+                Y_rhs = L.float_product(
+                    [Xs[iq, ir]] + [L.Symbol(factors[a].names[s])[iq][arg_indices[a]]
+                                    for a in range(rank)])
+                body = L.AssignAdd(Ys[(ir, ) + arg_indices], Y_rhs)
+                for a in reversed(range(rank)):
+                    body = L.ForRange(arg_indices[a], 0, ms[a], body=body,
+                                      vectorize=vectorize and a == rank - 1)
+                body = L.ForRange(iq, 0, n[s], body=body)
+                postparts.append(L.ForRange(ir, 0, rest, body=body))
+                X = Y
+
+        # Map the dofs of each argument to their position in T
+        dims = [m[a][d] for d in range(dim) for a in range(rank)]
+        strides = [ufl.product(dims[i + 1:]) for i in range(len(dims))]
+        T_index = []
+        for a in range(rank):
+            offsets = tuple(sum(k * strides[d * rank + a] for d, k in enumerate(row))
+                            for row in factors[a].dof_indices)
+            O, defined = self.get_temp_symbol("TO", (offsets, ))
+            if not defined:
+                preparts.append(L.ArrayDecl("static const int", O, len(offsets), offsets))
+            T_index.append(O[arg_indices[a]])
+
+        # Define rhs expression for A[blockmap[arg_indices]] += A_rhs
+        A_rhs = T[L.Sum(T_index)]
+
+        return A_rhs, preparts, quadparts, postparts
+
     def generate_preintegrated_dofblock_partition(self):
         # FIXME: Generalize this to unrolling all A[] += ... loops,
         # or all loops with noncontiguous DM??
@@ -60,6 +60,10 @@ Compiler stages:
    to the UFC format, generating as output one or more .h/.c files
    conforming to the UFC format.
 
+   When writing to file with write_ufl_objects, stages 3 and 4 are
+   interleaved, such that the code of each object is written to file
+   before the code of the next object is generated.
+
 """
 
 import logging
@@ -68,9 +72,10 @@ import typing
 from collections import defaultdict
 from time import time
 
+from ffc import profiling
 from ffc.analysis import analyze_ufl_objects
 from ffc.codegeneration.codegeneration import generate_code
-from ffc.formatting import format_code
+from ffc.formatting import format_code, iter_code, write_code_chunks
 from ffc.ir.representation import compute_ir
 from ffc.parameters import validate_parameters
 from ffc.wrappers import generate_wrapper_code
@@ -94,14 +99,61 @@ def compile_ufl_objects(ufl_objects: typing.Union[typing.List, typing.Tuple],
     ufl_objects
         Objects to be compiled. Accepts elements, forms, integrals or coordinate mappings.
 
+    Returns
+    -------
+    The header and source file contents, and a dict with the contents
+    of the binary files the source file depends on (see the uflacs
+    parameter 'binary_tables'), keyed by file name. The binary files
+    must be written to the directory the C compiler is run from.
+
+    """
+    cpu_time_0 = time()
+    code, wrapper_code, parameters = _generate_code(ufl_objects, object_names, prefix, parameters)
+
+    # Stage 4: format code
+    cpu_time = time()
+    with profiling.timer("format_code"):
+        code_h, code_c, binary_files = format_code(code, wrapper_code, prefix, parameters)
+    _print_timing(4, time() - cpu_time)
+
+    logger.info("FFC finished in {} seconds.".format(time() - cpu_time_0))
+
+    return code_h, code_c, binary_files
+
+
+def write_ufl_objects(ufl_objects: typing.Union[typing.List, typing.Tuple],
+                      object_names: typing.Dict = {},
+                      prefix: str = None,
+                      parameters: typing.Dict = None):
+    """Generate UFC code for a given UFL objects and write it to the
+    files prefix.h and prefix.c, and the binary files the code depends
+    on, in the output directory.
+
+    The code of each object is written to file as soon as it has been
+    generated, so the code of all objects is never held in memory at
+    once.
+
     """
+    cpu_time_0 = time()
+    code, wrapper_code, parameters = _generate_code(ufl_objects, object_names, prefix, parameters,
+                                                    lazy=True)
+
+    # Stage 3 and 4: generate, format and write code
+    cpu_time = time()
+    with profiling.timer("write_code"):
+        write_code_chunks(iter_code(code, wrapper_code, parameters), prefix, parameters)
+    _print_timing(4, time() - cpu_time)
+
+    logger.info("FFC finished in {} seconds.".format(time() - cpu_time_0))
+
+
+def _generate_code(ufl_objects, object_names, prefix, parameters, lazy=False):
+    """Run compiler stages 1 to 3, returning the code blocks, the
+    wrapper code and the validated parameters."""
     logger.info("Compiling {}\n".format(prefix))
     if prefix != os.path.basename(prefix):
         raise RuntimeError("Invalid prefix, looks like a full path? prefix='{}'.".format(prefix))
 
-    # Reset timing
-    cpu_time_0 = time()
-
     # Note that jit will always pass validated parameters so this is
     # only for commandline and direct call from Python
     parameters = validate_parameters(parameters)
@@ -112,18 +164,21 @@ def compile_ufl_objects(ufl_objects: typing.Union[typing.List, typing.Tuple],
 
     # Stage 1: analysis
     cpu_time = time()
-    analysis = analyze_ufl_objects(ufl_objects, parameters)
+    with profiling.timer("analysis"):
+        analysis = analyze_ufl_objects(ufl_objects, parameters)
     _print_timing(1, time() - cpu_time)
 
     # Stage 2: intermediate representation
     cpu_time = time()
-    ir = compute_ir(analysis, object_names, prefix, parameters)
+    with profiling.timer("compute_ir"):
+        ir = compute_ir(analysis, object_names, prefix, parameters)
     _print_timing(2, time() - cpu_time)
 
     # Stage 3: code generation
     cpu_time = time()
-    code = generate_code(ir, parameters)
-    _print_timing(4, time() - cpu_time)
+    with profiling.timer("generate_code"):
+        code = generate_code(ir, parameters, lazy=lazy)
+    _print_timing(3, time() - cpu_time)
 
     # Stage 3.1: generate convenience wrappers, e.g. for DOLFIN
     cpu_time = time()
@@ -141,17 +196,11 @@ def compile_ufl_objects(ufl_objects: typing.Union[typing.List, typing.Tuple],
             except TypeError:
                 for e in ir_comp:
                     classnames[e_name].append(e.classname)
-        wrapper_code = generate_wrapper_code(analysis, prefix, object_names, classnames, parameters)
+        with profiling.timer("generate_wrapper_code"):
+            wrapper_code = generate_wrapper_code(analysis, prefix, object_names, classnames, parameters)
     else:
         wrapper_code = None
 
-    _print_timing(4.1, time() - cpu_time)
-
-    # Stage 4: format code
-    cpu_time = time()
-    code_h, code_c = format_code(code, wrapper_code, prefix, parameters)
-    _print_timing(5, time() - cpu_time)
-
-    logger.info("FFC finished in {} seconds.".format(time() - cpu_time_0))
+    _print_timing(3.1, time() - cpu_time)
 
-    return code_h, code_c
+    return code, wrapper_code, parameters
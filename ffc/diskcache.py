@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 FEniCS Project
+#
+# This file is part of FFC (https://www.fenicsproject.org)
+#
+# SPDX-License-Identifier:    LGPL-3.0-or-later
+"""Storage of pickled compiler data in the cache dir."""
+
+import logging
+import os
+import pathlib
+import pickle
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+
+def cache_path(parameters, subdir, name):
+    """Return path of the file 'name' in 'subdir' of the cache dir."""
+    cache_dir = pathlib.Path(parameters.get("cache_dir", "compile_cache")).expanduser()
+    return cache_dir.joinpath(subdir, name)
+
+
+def load(filename):
+    """Return the object pickled in 'filename', or None if the file is
+    missing or can not be read."""
+    try:
+        with open(filename, "rb") as f:
+            return pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception:
+        # Treat a truncated or incompatible file as a cache miss
+        logger.warning("Failed to load cached data from {}".format(str(filename)))
+        return None
+
+
+def store(filename, obj):
+    """Pickle 'obj' to 'filename'. Objects that can not be pickled are
+    silently skipped."""
+    try:
+        data = pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+    except (pickle.PicklingError, AttributeError, TypeError):
+        logger.debug("Data for {} can not be cached".format(str(filename)))
+        return
+
+    # Write to a temporary file and rename it, so other processes never
+    # read a partially written file
+    os.makedirs(filename.parent, exist_ok=True)
+    fd, tmpname = tempfile.mkstemp(dir=str(filename.parent), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmpname, str(filename))
+    except BaseException:
+        os.remove(tmpname)
+        raise
@@ -5,6 +5,7 @@
 #
 # SPDX-License-Identifier:    LGPL-3.0-or-later
 
+import collections
 import logging
 import warnings
 
@@ -19,6 +20,8 @@ from FIAT.quadrature_element import QuadratureElement
 from FIAT.restricted import RestrictedElement
 from FIAT.tensor_product import FlattenedDimensions
 
+from ffc import diskcache, profiling
+
 logger = logging.getLogger(__name__)
 
 # Element families supported by FFC
@@ -28,8 +31,24 @@ supported_families = ("Brezzi-Douglas-Marini", "Brezzi-Douglas-Fortin-Marini", "
                       "Radau", "Raviart-Thomas", "Real", "Bubble", "Quadrature", "Regge",
                       "Hellan-Herrmann-Johnson", "Q", "DQ", "TensorProductElement")
 
-# Cache for computed elements
-_cache = {}
+# Cache for computed elements, keyed by UFL element and ordered from
+# least to most recently used
+_cache = collections.OrderedDict()
+_cache_size = 512
+_cache_hits = 0
+_cache_misses = 0
+
+element_cache_info_t = collections.namedtuple("element_cache_info_t",
+                                              ["hits", "misses", "size", "max_size"])
+
+# Cache for computed quadrature rules, keyed by (shape, degree, scheme)
+# and ordered from least to most recently used
+_quadrature_cache = collections.OrderedDict()
+_quadrature_cache_size = 128
+
+# Min degree of the quadrature rules stored in the cache dir, lower
+# degree rules are cheaper to compute than to load
+_stored_quadrature_min_degree = 12
 
 
 class SpaceOfReals(object):
@@ -47,15 +66,56 @@ def reference_cell_vertices(cellname):
     return cell.get_vertices()
 
 
+def element_cache_info():
+    """Return the number of hits and misses of the element cache, and
+    its current and max number of elements."""
+    return element_cache_info_t(_cache_hits, _cache_misses, len(_cache), _cache_size)
+
+
+def set_element_cache_size(max_size):
+    """Set the max number of elements kept in the element cache (0 to
+    disable the cache)."""
+    global _cache_size
+    _cache_size = int(max_size)
+    _evict_elements()
+
+
+def clear_element_cache():
+    """Remove all elements from the element cache and reset its
+    counters."""
+    global _cache_hits, _cache_misses
+    _cache.clear()
+    _cache_hits = 0
+    _cache_misses = 0
+
+
+def warm_element_cache(ufl_elements):
+    """Create the FIAT elements of the given UFL elements, so that they
+    are found in the element cache by later compilations."""
+    for ufl_element in ufl_elements:
+        create_element(ufl_element)
+
+
+def _evict_elements():
+    """Evict the least recently used elements beyond the cache size."""
+    while len(_cache) > _cache_size:
+        _cache.popitem(last=False)
+
+
 def create_element(ufl_element):
+    global _cache_hits, _cache_misses
 
     # Create element signature for caching (just use UFL element)
     element_signature = ufl_element
 
     # Check cache
-    if element_signature in _cache:
+    element = _cache.get(element_signature)
+    if element is not None:
         logger.debug("Reusing element from cache")
-        return _cache[element_signature]
+        _cache_hits += 1
+        _cache.move_to_end(element_signature)
+        return element
+    _cache_misses += 1
 
     if isinstance(ufl_element, ufl.FiniteElement):
         element = _create_fiat_element(ufl_element)
@@ -70,10 +130,12 @@ def create_element(ufl_element):
         element = NodalEnrichedElement(*elements)
     elif isinstance(ufl_element, ufl.RestrictedElement):
         element = _create_restricted_element(ufl_element)
+    else:
         raise RuntimeError("Cannot handle this element type: {}".format(ufl_element))
 
-    # Store in cache
+    # Store in cache, evicting the least recently used elements
     _cache[element_signature] = element
+    _evict_elements()
 
     return element
 
@@ -161,11 +223,49 @@ def _create_fiat_element(ufl_element):
     return element
 
 
-def create_quadrature(shape, degree, scheme="default"):
+def create_quadrature(shape, degree, scheme="default", parameters=None):
     """Generate quadrature rule (points, weights) for given shape
     that will integrate an polynomial of order 'degree' exactly.
 
+    The rules are cached in memory, so the returned arrays are
+    read-only. If the parameter 'quadrature_cache' is set, rules of
+    high degree are also stored in the cache dir.
+
     """
+    key = (shape, degree, scheme)
+    rule = _quadrature_cache.get(key)
+    if rule is not None:
+        _quadrature_cache.move_to_end(key)
+        return rule
+
+    if (parameters is not None and parameters.get("quadrature_cache") and isinstance(degree, int)
+            and degree >= _stored_quadrature_min_degree):
+        filename = diskcache.cache_path(parameters, "quadrature",
+                                        "{}_{}_{}.pickle".format(shape, degree, scheme))
+        rule = diskcache.load(filename)
+        if rule is None:
+            profiling.record(quadrature_cache_misses=1)
+            rule = _create_quadrature(shape, degree, scheme)
+            diskcache.store(filename, rule)
+        else:
+            profiling.record(quadrature_cache_hits=1)
+            logger.debug("Reusing quadrature rule from {}".format(str(filename)))
+    else:
+        rule = _create_quadrature(shape, degree, scheme)
+
+    for values in rule:
+        values.setflags(write=False)
+
+    # Store in cache, evicting the least recently used rules
+    _quadrature_cache[key] = rule
+    while len(_quadrature_cache) > _quadrature_cache_size:
+        _quadrature_cache.popitem(last=False)
+
+    return rule
+
+
+def _create_quadrature(shape, degree, scheme):
+    """Compute quadrature rule (points, weights), see create_quadrature."""
     if isinstance(shape, int) and shape == 0:
         return (numpy.zeros((1, 0)), numpy.ones((1, )))
 
@@ -17,6 +17,7 @@ ufc_utils.
 import logging
 import os
 import pprint
+import tempfile
 import textwrap
 from collections import namedtuple
 
@@ -62,7 +63,27 @@ c_extern_post = """
 
 
 def format_code(code: namedtuple, wrapper_code, prefix, parameters):
-    """Format given code in UFC format. Returns two strings with header and source file contents."""
+    """Format given code in UFC format. Returns two strings with header
+    and source file contents, and a dict with the contents of the binary
+    files the source file depends on, keyed by file name."""
+    chunks = list(iter_code(code, wrapper_code, parameters))
+    code_h = "".join(chunk[0] for chunk in chunks)
+    code_c = "".join(chunk[1] for chunk in chunks)
+    binary_files = {}
+    for chunk in chunks:
+        binary_files.update(chunk[2])
+    return code_h, code_c, binary_files
+
+
+def iter_code(code: namedtuple, wrapper_code, parameters):
+    """Format given code in UFC format, one object at a time.
+
+    Yields triples with consecutive chunks of the header and source
+    file contents, and a dict with the contents of the binary files the
+    source chunk depends on (see the uflacs parameter 'binary_tables'),
+    keyed by file name. If the code blocks are generators, the code of
+    each object is only generated when the chunk is requested.
+    """
 
     logger.debug("Compiler stage 5: Formatting code")
 
@@ -86,38 +107,20 @@ def format_code(code: namedtuple, wrapper_code, prefix, parameters):
 
     # Enclose header with 'extern "C"'
     code_h_pre += c_extern_pre
-    code_h_post = c_extern_post
-
-    # Add code for new finite_elements
-    code_h = "".join([e[0] for e in code.elements])
-    code_c = "".join([e[1] for e in code.elements])
-
-    # Add code for dofmaps
-    code_h += "".join([e[0] for e in code.dofmaps])
-    code_c += "".join([e[1] for e in code.dofmaps])
+    yield code_h_pre, code_c_pre, {}
 
-    # Add code for code_coordinate mappings
-    code_h += "".join([c[0] for c in code.coordinate_mappings])
-    code_c += "".join([c[1] for c in code.coordinate_mappings])
-
-    # Add code for integrals
-    code_h += "".join([integral[0] for integral in code.integrals])
-    code_c += "".join([integral[1] for integral in code.integrals])
-
-    # Add code for form
-    code_h += "".join([form[0] for form in code.forms])
-    code_c += "".join([form[1] for form in code.forms])
+    # Add code for new finite_elements, dofmaps, coordinate mappings,
+    # integrals and forms
+    for blocks in (code.elements, code.dofmaps, code.coordinate_mappings, code.integrals,
+                   code.forms):
+        for block in blocks:
+            yield block[0], block[1], block[2] if len(block) > 2 else {}
 
     # Add wrappers
     if wrapper_code:
-        code_h += wrapper_code[0]
-        code_c += wrapper_code[1]
-
-    # Add headers to body
-    code_h = code_h_pre + code_h + code_h_post
-    code_c = code_c_pre + code_c
+        yield wrapper_code[0], wrapper_code[1], {}
 
-    return code_h, code_c
+    yield c_extern_post, "", {}
 
 
 def write_code(code_h, code_c, prefix, parameters):
@@ -127,6 +130,34 @@ def write_code(code_h, code_c, prefix, parameters):
         _write_file(code_c, prefix, ".c", parameters)
 
 
+def write_code_chunks(chunks, prefix, parameters):
+    """Write header and source file chunks, and the binary files they
+    depend on, to file as they are produced, see iter_code.
+
+    The chunks are written to temporary files, which replace the
+    output files only once all chunks have been produced, so that the
+    output files are left unchanged if code generation fails."""
+    output_dir = parameters["output_dir"]
+    filename_h = os.path.join(output_dir, prefix + ".h")
+    filename_c = os.path.join(output_dir, prefix + ".c")
+    hfile = tempfile.NamedTemporaryFile("w", dir=output_dir, suffix=".h", delete=False)
+    cfile = tempfile.NamedTemporaryFile("w", dir=output_dir, suffix=".c", delete=False)
+    try:
+        with hfile, cfile:
+            for code_h, code_c, binary_files in chunks:
+                hfile.write(code_h)
+                cfile.write(code_c)
+                for filename, data in binary_files.items():
+                    write_binary_file(data, filename, parameters)
+        os.replace(hfile.name, filename_h)
+        os.replace(cfile.name, filename_c)
+    finally:
+        for tmpname in (hfile.name, cfile.name):
+            if os.path.exists(tmpname):
+                os.remove(tmpname)
+    logger.info("Output written to " + filename_h + " and " + filename_c + ".")
+
+
 def _write_file(output, prefix, postfix, parameters):
     """Write generated code to file."""
     filename = os.path.join(parameters["output_dir"], prefix + postfix)
@@ -135,6 +166,19 @@ def _write_file(output, prefix, postfix, parameters):
     logger.info("Output written to " + filename + ".")
 
 
+def write_binary_file(data, filename, parameters):
+    """Write binary data the generated code depends on to file.
+
+    The file is written under a temporary name and then renamed, so
+    that a file with the same name being compiled in the meantime is
+    never seen partially written."""
+    filename = os.path.join(parameters["output_dir"], filename)
+    with tempfile.NamedTemporaryFile(dir=parameters["output_dir"], delete=False) as f:
+        f.write(data)
+    os.replace(f.name, filename)
+    logger.info("Output written to " + filename + ".")
+
+
 def _generate_comment(parameters):
     """Generate code for comment on top of file."""
 
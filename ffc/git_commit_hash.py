@@ -0,0 +1,13 @@
+# Copyright (C) 2016 Jan Blechta
+#
+# This file is part of FFC (https://www.fenicsproject.org)
+#
+# SPDX-License-Identifier:    LGPL-3.0-or-later
+
+
+def git_commit_hash():
+    """Return git changeset hash (returns "unknown" if changeset is not
+    known)
+
+    """
+    return "2ffe7ed1de31cf3049364fa2555f6c7246e0bf9b"
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 FEniCS Project
+#
+# This file is part of FFC (https://www.fenicsproject.org)
+#
+# SPDX-License-Identifier:    LGPL-3.0-or-later
+"""On-disk cache of intermediate representations.
+
+Representations of elements, dofmaps, coordinate mappings and the
+integrals of a form are pickled to files in the directory 'ir' under
+the cache dir, keyed by the signature of the UFL object they were
+computed from (see ffc.classname.compute_signature). The cache is
+enabled with the parameter 'ir_cache'.
+"""
+
+import logging
+
+from ffc import classname, diskcache, profiling
+
+logger = logging.getLogger(__name__)
+
+
+def cached_ir(compute, kind, ufl_object, prefix, parameters, index=0, coordinate_mapping=False):
+    """Return the representation computed by 'compute()', reading it
+    from the IR cache if present and storing it there otherwise.
+
+    The representation must only depend on 'ufl_object', 'prefix',
+    'parameters' and 'index'.
+    """
+    if not parameters.get("ir_cache"):
+        return compute()
+
+    sig = classname.compute_signature([ufl_object], prefix, parameters, coordinate_mapping)
+    filename = diskcache.cache_path(parameters, "ir", "{}_{}_{}.pickle".format(kind, sig, index))
+
+    ir = diskcache.load(filename)
+    if ir is None:
+        profiling.record(ir_cache_misses=1)
+        ir = compute()
+        diskcache.store(filename, ir)
+    else:
+        profiling.record(ir_cache_hits=1)
+        logger.debug("Reusing {} representation from {}".format(kind, str(filename)))
+
+    return ir
@@ -17,6 +17,7 @@ should only need to use the data stored in the intermediate
 representation under the key "foo".
 """
 
+import hashlib
 import itertools
 import logging
 from collections import namedtuple
@@ -26,7 +27,8 @@ import numpy
 import ffc.fiatinterface
 import FIAT.reference_element
 import ufl
-from ffc import classname
+from ffc import classname, profiling
+from ffc.ir.ircache import cached_ir
 from ffc.fiatinterface import (EnrichedElement, FlattenedDimensions,
                                MixedElement, QuadratureElement, SpaceOfReals,
                                create_element)
@@ -73,9 +75,10 @@ ir_integral = namedtuple('ir_integral', ['representation', 'integral_type', 'sub
                                          'entitytype', 'num_facets', 'num_vertices', 'needs_oriented',
                                          'enabled_coefficients', 'classnames', 'element_dimensions',
                                          'tensor_shape', 'quadrature_rules', 'coefficient_numbering',
-                                         'coefficient_offsets', 'params', 'unique_tables', 'unique_table_types',
+                                         'coefficient_offsets', 'coefficient_dofs_size', 'coordinate_dofs_size',
+                                         'params', 'unique_tables', 'unique_table_types',
                                          'piecewise_ir', 'varying_irs', 'all_num_points', 'classname',
-                                         'prefix', 'integrals_metadata', 'integral_metadata'])
+                                         'prefix', 'integrals_metadata', 'integral_metadata', 'signature'])
 ir_tabulate_dof_coordinates = namedtuple('ir_tabulate_dof_coordinates', ['tdim', 'gdim', 'points', 'cell_shape'])
 ir_evaluate_dof = namedtuple('ir_evaluate_dof', ['mappings', 'reference_value_size', 'physical_value_size',
                                                  'geometric_dimension', 'topological_dimension', 'dofs',
@@ -129,30 +132,37 @@ def compute_ir(analysis: namedtuple, object_names, prefix, parameters):
     # Compute representation of elements
     logger.info("Computing representation of {} elements".format(len(analysis.unique_elements)))
     ir_elements = [
-        _compute_element_ir(e, analysis.element_numbers, classnames, parameters) for e in analysis.unique_elements
+        cached_ir(lambda: _compute_element_ir(e, analysis.element_numbers, classnames, parameters),
+                  "element", e, prefix, parameters)._replace(id=analysis.element_numbers[e])
+        for e in analysis.unique_elements
     ]
 
     # Compute representation of dofmaps
     logger.info("Computing representation of {} dofmaps".format(len(analysis.unique_elements)))
     ir_dofmaps = [
-        _compute_dofmap_ir(e, analysis.element_numbers, classnames, parameters) for e in analysis.unique_elements
+        cached_ir(lambda: _compute_dofmap_ir(e, analysis.element_numbers, classnames, parameters),
+                  "dofmap", e, prefix, parameters)._replace(id=analysis.element_numbers[e])
+        for e in analysis.unique_elements
     ]
 
     # Compute representation of coordinate mappings
     logger.info("Computing representation of {} coordinate mappings".format(
         len(analysis.unique_coordinate_elements)))
     ir_coordinate_mappings = [
-        _compute_coordinate_mapping_ir(e, analysis.element_numbers, classnames, parameters)
+        cached_ir(lambda: _compute_coordinate_mapping_ir(e, analysis.element_numbers, classnames, parameters),
+                  "coordinate_mapping", e, prefix, parameters,
+                  coordinate_mapping=True)._replace(id=analysis.element_numbers[e])
         for e in analysis.unique_coordinate_elements
     ]
 
     # Compute and flatten representation of integrals
     logger.info("Computing representation of integrals")
     irs = [
-        _compute_integral_ir(fd, i, prefix, analysis.element_numbers, classnames, parameters)
+        cached_ir(lambda: _compute_integral_ir(fd, i, prefix, analysis.element_numbers, classnames, parameters),
+                  "integrals", fd.original_form, prefix, parameters, index=i)
         for (i, fd) in enumerate(analysis.form_data)
     ]
-    ir_integrals = list(itertools.chain(*irs))
+    ir_integrals = [ir._replace(classnames=classnames) for ir in itertools.chain(*irs)]
 
     # Compute representation of forms
     logger.info("Computing representation of forms")
@@ -167,6 +177,7 @@ def compute_ir(analysis: namedtuple, object_names, prefix, parameters):
                    integrals=ir_integrals, forms=ir_forms)
 
 
+@profiling.timed("compute_element_ir")
 def _compute_element_ir(ufl_element, element_numbers, classnames, parameters):
     """Compute intermediate representation of element."""
     # Create FIAT element
@@ -265,6 +276,7 @@ def _compute_dofmap_permutation_tables(fiat_element, cell):
     return (edge_permutations, face_permutations, cell_topology)
 
 
+@profiling.timed("compute_dofmap_ir")
 def _compute_dofmap_ir(ufl_element, element_numbers, classnames, parameters):
     """Compute intermediate representation of dofmap."""
     # Create FIAT element
@@ -347,6 +359,7 @@ def _tabulate_coordinate_mapping_basis(ufl_element):
     return tables
 
 
+@profiling.timed("compute_coordinate_mapping_ir")
 def _compute_coordinate_mapping_ir(ufl_coordinate_element,
                                    element_numbers,
                                    classnames,
@@ -409,6 +422,7 @@ def _num_global_support_dofs(fiat_element):
     return num_reals
 
 
+@profiling.timed("compute_integral_ir")
 def _compute_integral_ir(form_data, form_index, prefix, element_numbers, classnames, parameters):
     """Compute intermediate represention for form integrals."""
     if form_data.representation == "uflacs":
@@ -439,11 +453,35 @@ def _compute_integral_ir(form_data, form_index, prefix, element_numbers, classna
         ir["integrals_metadata"] = itg_data.metadata
         ir["integral_metadata"] = [integral.metadata() for integral in itg_data.integrals]
 
+        ir["signature"] = _compute_integral_signature(itg_data, form_data, element_numbers)
+
         irs.append(ir_integral(**ir))
 
     return irs
 
 
+def _compute_integral_signature(itg_data, form_data, element_numbers):
+    """Compute signature of an integral, covering everything the
+    generated kernels of the integral depend on except the parameters.
+    Integrals with the same signature, e.g. the same integrand on
+    several subdomains, have the same kernels."""
+    from ufl.algorithms.signature import compute_form_signature
+    from ufl.utils.sorting import canonicalize_metadata
+
+    # Integrals of the form data refer to renumbered coefficients, so
+    # the signature does not depend on the coefficient count of the
+    # original form. The kernels do not depend on the subdomain.
+    renumbering = form_data.preprocessed_form._compute_renumbering()
+    integrals = [integral.reconstruct(subdomain_id="otherwise") for integral in itg_data.integrals]
+    data = (compute_form_signature(ufl.Form(integrals), renumbering),
+            itg_data.integral_type, canonicalize_metadata(itg_data.metadata),
+            tuple(itg_data.enabled_coefficients),
+            tuple(c.ufl_element() for c in form_data.reduced_coefficients),
+            tuple(element_numbers))
+    return hashlib.sha1(repr(data).encode("utf-8")).hexdigest()
+
+
+@profiling.timed("compute_form_ir")
 def _compute_form_ir(form_data, form_id, prefix, element_numbers,
                      classnames, object_names, parameters):
     """Compute intermediate representation of form."""
@@ -646,6 +684,7 @@ def _evaluate_basis(ufl_element, fiat_element, epsilon):
     dofs_data = []
     for e in elements:
         num_components = ufl.utils.sequences.product(e.value_shape())
+        tensor_factors = None
         if isinstance(e, FlattenedDimensions):
             # Tensor product element
             A = e.element.A
@@ -653,6 +692,8 @@ def _evaluate_basis(ufl_element, fiat_element, epsilon):
             # Attach suitable coefficients to element
             if isinstance(A, FlattenedDimensions):
                 # This is for hexahedral element
+                tensor_factors = [A.element.A.get_coeffs(), A.element.B.get_coeffs(),
+                                  B.get_coeffs()]
                 ac = A.element.A.get_coeffs()
                 bc = A.element.B.get_coeffs()
                 ac = numpy.block([[w * ac for w in v] for v in bc])
@@ -670,6 +711,7 @@ def _evaluate_basis(ufl_element, fiat_element, epsilon):
                 dmats += [numpy.block([[w * ai for w in v] for v in bd[0]])]
                 ad = dmats
             else:
+                tensor_factors = [A.get_coeffs(), B.get_coeffs()]
                 ac = A.get_coeffs()
                 ad = A.dmats()
             bc = B.get_coeffs()
@@ -692,6 +734,24 @@ def _evaluate_basis(ufl_element, fiat_element, epsilon):
             dmats = e.dmats()
             num_expansion_members = e.get_num_members(e.degree())
 
+        # The basis functions of scalar tensor product elements are
+        # products of the basis functions of the interval elements in
+        # each direction, numbered with the last direction varying
+        # fastest, while the expansion members above are numbered
+        # with the first direction varying fastest
+        if tensor_factors is not None:
+            if num_components == 1 and all(c.ndim == 2 for c in tensor_factors):
+                tensor_factors = [numpy.array(c) for c in tensor_factors]
+                for c in tensor_factors:
+                    c[numpy.where(numpy.isclose(c, 0.0, rtol=epsilon, atol=epsilon))] = 0.0
+                tensor_shape = tuple(c.shape[0] for c in tensor_factors)
+                dim = len(tensor_shape)
+                coeffs = coeffs.reshape(tensor_shape[::-1] + (-1, ))
+                coeffs = coeffs.transpose(list(reversed(range(dim))) + [dim])
+                coeffs = coeffs.reshape(e.space_dimension(), -1)
+            else:
+                tensor_factors = None
+
         # Clamp dmats zeros
         dmats = numpy.asarray(dmats)
         dmats[numpy.where(numpy.isclose(dmats, 0.0, rtol=epsilon, atol=epsilon))] = 0.0
@@ -707,6 +767,7 @@ def _evaluate_basis(ufl_element, fiat_element, epsilon):
             "num_components": num_components,
             "dmats": dmats,
             "num_expansion_members": num_expansion_members,
+            "tensor_factors": tensor_factors,
         }
         value_rank = len(e.value_shape())
 
@@ -738,6 +799,10 @@ def _evaluate_basis(ufl_element, fiat_element, epsilon):
                 "physical_offset": physical_offsets[dof],
                 "reference_offset": reference_offsets[dof],
             }
+            if tensor_factors is not None:
+                # Index of the interval element dof in each direction
+                dof_data["tensor_index"] = tuple(
+                    int(k) for k in numpy.unravel_index(i, tensor_shape))
             # Still storing element data in dd to avoid rewriting dependent code
             dof_data.update(subelement_data)
 
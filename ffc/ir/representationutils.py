@@ -21,15 +21,15 @@ from ffc.fiatinterface import (create_element, create_quadrature, map_facet_poin
 logger = logging.getLogger(__name__)
 
 
-def create_quadrature_points_and_weights(integral_type, cell, degree, rule):
+def create_quadrature_points_and_weights(integral_type, cell, degree, rule, parameters=None):
     """Create quadrature rule and return points and weights."""
     if integral_type == "cell":
-        (points, weights) = create_quadrature(cell.cellname(), degree, rule)
+        (points, weights) = create_quadrature(cell.cellname(), degree, rule, parameters)
     elif integral_type in ufl.measure.facet_integral_types:
         (points, weights) = create_quadrature(ufl.cell.cellname2facetname[cell.cellname()], degree,
-                                              rule)
+                                              rule, parameters)
     elif integral_type in ufl.measure.point_integral_types:
-        (points, weights) = create_quadrature("vertex", degree, rule)
+        (points, weights) = create_quadrature("vertex", degree, rule, parameters)
     elif integral_type in ufl.measure.custom_integral_types:
         (points, weights) = (None, None)
     else:
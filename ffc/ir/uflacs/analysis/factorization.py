@@ -23,8 +23,8 @@ def build_argument_indices(S):
     """Build ordered list of indices to modified arguments."""
 
     arg_indices = []
-    for i, v in S.nodes.items():
-        arg = strip_modified_terminal(v['expression'])
+    for i, expr in enumerate(S.column('expression')):
+        arg = strip_modified_terminal(expr)
         if isinstance(arg, Argument):
             arg_indices.append(i)
 
@@ -335,8 +335,7 @@ def compute_argument_factorization(S, rank):
         F.nodes[i]['target'] += [k]
 
     # Compute dependencies in FV
-    for i, v in F.nodes.items():
-        expr = v['expression']
+    for i, expr in enumerate(F.column('expression')):
         if not expr._ufl_is_terminal_ and not expr._ufl_is_terminal_modifier_:
             for o in expr.ufl_operands:
                 F.add_edge(i, F.e2i[o])
@@ -6,6 +6,7 @@
 # SPDX-License-Identifier:    LGPL-3.0-or-later
 """Linearized data structure for the computational graph."""
 
+import array
 import logging
 
 import numpy
@@ -17,35 +18,202 @@ from ffc.ir.uflacs.analysis.valuenumbering import ValueNumberer
 
 logger = logging.getLogger(__name__)
 
+# Values of the 'status' node attribute, stored in the status column by index
+node_status = (None, "inactive", "active", "piecewise", "varying")
+
+# Node attributes and the dtypes of the columns storing them
+_node_attributes = {
+    "expression": object,
+    "target": object,
+    "status": numpy.int8,
+    "mt": object,
+    "tr": object,
+    "factors": object
+}
+
+
+class GraphNode(object):
+    """Dict-like view of the attributes of a single graph node."""
+
+    __slots__ = ("graph", "index")
+
+    def __init__(self, graph, index):
+        self.graph = graph
+        self.index = index
+
+    def __getitem__(self, name):
+        value = self.graph._get_attribute(name, self.index)
+        if value is None:
+            raise KeyError(name)
+        return value
+
+    def __setitem__(self, name, value):
+        self.graph._set_attribute(name, self.index, value)
+
+    def __contains__(self, name):
+        return self.get(name) is not None
+
+    def get(self, name, default=None):
+        value = self.graph._get_attribute(name, self.index)
+        return default if value is None else value
+
+    def keys(self):
+        return [name for name in _node_attributes if name in self]
+
+    def items(self):
+        return [(name, self[name]) for name in self.keys()]
+
+
+class NodeView(object):
+    """Dict-like view of the nodes of a graph, keyed by node index."""
+
+    __slots__ = ("graph", )
+
+    def __init__(self, graph):
+        self.graph = graph
+
+    def __len__(self):
+        return self.graph._num_nodes
+
+    def __contains__(self, key):
+        return 0 <= key < self.graph._num_nodes
+
+    def __iter__(self):
+        return iter(range(self.graph._num_nodes))
+
+    def __getitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        return GraphNode(self.graph, key)
+
+    def keys(self):
+        return range(self.graph._num_nodes)
+
+    def values(self):
+        return (GraphNode(self.graph, i) for i in range(self.graph._num_nodes))
+
+    def items(self):
+        return ((i, GraphNode(self.graph, i)) for i in range(self.graph._num_nodes))
+
+
+class Adjacency(object):
+    """Compressed sparse row storage of the edges leaving (or entering) each node."""
+
+    __slots__ = ("offsets", "indices")
+
+    def __init__(self, num_nodes, sources, targets):
+        sources = numpy.frombuffer(sources, dtype=numpy.int32)
+        targets = numpy.frombuffer(targets, dtype=numpy.int32)
+        # A stable sort keeps the insertion order of edges from each node
+        order = numpy.argsort(sources, kind="stable")
+        self.offsets = numpy.zeros(num_nodes + 1, dtype=numpy.int32)
+        numpy.cumsum(numpy.bincount(sources, minlength=num_nodes), out=self.offsets[1:])
+        self.indices = targets[order]
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, key):
+        if not 0 <= key < len(self):
+            raise KeyError(key)
+        return self.indices[self.offsets[key]:self.offsets[key + 1]].tolist()
+
+    def items(self):
+        return ((i, self[i]) for i in range(len(self)))
+
 
 class ExpressionGraph(object):
     """A directed multi-edge graph, allowing multiple edges
     between the same nodes, and respecting the insertion order
-    of nodes and edges."""
+    of nodes and edges.
+
+    Nodes are numbered consecutively in insertion order. Node
+    attributes are stored in one NumPy column per attribute and
+    edges in flat integer arrays, compressed to sparse row format
+    when the adjacency is first queried."""
 
     def __init__(self):
 
-        # Data structures for directed multi-edge graph
-        self.nodes = {}
-        self.out_edges = {}
-        self.in_edges = {}
+        # Node attribute columns, grown geometrically
+        self._num_nodes = 0
+        self._columns = {name: numpy.empty(0, dtype=dtype) for name, dtype in _node_attributes.items()}
+
+        # Edge lists in insertion order
+        self._sources = array.array("i")
+        self._targets = array.array("i")
+        self._out_edges = None
+        self._in_edges = None
 
     def number_of_nodes(self):
-        return len(self.nodes)
+        return self._num_nodes
+
+    @property
+    def nodes(self):
+        return NodeView(self)
+
+    @property
+    def out_edges(self):
+        if self._out_edges is None:
+            self._out_edges = Adjacency(self._num_nodes, self._sources, self._targets)
+        return self._out_edges
+
+    @property
+    def in_edges(self):
+        if self._in_edges is None:
+            self._in_edges = Adjacency(self._num_nodes, self._targets, self._sources)
+        return self._in_edges
+
+    def column(self, name):
+        """Return the attribute column of all nodes as a writable array.
+
+        The 'status' column holds indices into node_status. The view
+        is invalidated by adding nodes."""
+        return self._columns[name][:self._num_nodes]
 
     def add_node(self, key, **kwargs):
         """Add a node with optional properties"""
-        self.nodes[key] = kwargs
-        self.out_edges[key] = []
-        self.in_edges[key] = []
+        if key != self._num_nodes:
+            raise KeyError("Nodes must be added in order of their keys")
+
+        capacity = len(self._columns["expression"])
+        if key == capacity:
+            capacity = max(2 * capacity, 64)
+            for name, values in self._columns.items():
+                # Object columns start out as None, the status column as 0
+                grown = numpy.empty(capacity, dtype=values.dtype)
+                grown[key:] = None if values.dtype == object else 0
+                grown[:key] = values
+                self._columns[name] = grown
+        self._num_nodes += 1
+
+        for name, value in kwargs.items():
+            self._set_attribute(name, key, value)
+
+        self._out_edges = None
+        self._in_edges = None
 
     def add_edge(self, node1, node2):
         """Add a directed edge from node1 to node2"""
-        if node1 not in self.nodes or node2 not in self.nodes:
+        if not (0 <= node1 < self._num_nodes and 0 <= node2 < self._num_nodes):
             raise KeyError("Adding edge to unknown node")
 
-        self.out_edges[node1] += [node2]
-        self.in_edges[node2] += [node1]
+        self._sources.append(node1)
+        self._targets.append(node2)
+        self._out_edges = None
+        self._in_edges = None
+
+    def _get_attribute(self, name, index):
+        value = self._columns[name][index]
+        if name == "status":
+            return node_status[value]
+        return value
+
+    def _set_attribute(self, name, index, value):
+        if name not in _node_attributes:
+            raise KeyError("Unknown graph node attribute '%s'" % name)
+        if name == "status":
+            value = node_status.index(value)
+        self._columns[name][index] = value
 
 
 def build_graph_vertices(expression, scalar=False):
@@ -82,20 +250,112 @@ def build_scalar_graph(expression):
 
     # Build new list representation of graph where all
     # vertices of V represent single scalar operations
-    G = build_graph_vertices(scalar_expression, scalar=True)
+    return _build_scalar_graph_with_unique_post_traversal(scalar_expression)
 
-    # Compute graph edges
-    V_deps = []
-    for i, v in G.nodes.items():
-        expr = v['expression']
-        if expr._ufl_is_terminal_ or expr._ufl_is_terminal_modifier_:
-            V_deps.append(())
-        else:
-            V_deps.append([G.e2i[o] for o in expr.ufl_operands])
 
-    for i, edges in enumerate(V_deps):
-        for j in edges:
-            G.add_edge(i, j)
+def fold_zero_nodes(S, zero_nodes):
+    """Build a new scalar graph from S where the nodes in zero_nodes are zero.
+
+    Zeros are propagated through the existing graph: products of zero
+    and zero divided by anything are zero, a sum with a zero term is
+    replaced by the other term, and conditionals with two zero values
+    are zero. Only nodes whose operands change in other ways are
+    reconstructed, and nodes no longer reachable from the target are
+    removed.
+    """
+    n = len(S.nodes)
+    expressions = list(S.column('expression'))
+    operands = [S.out_edges[i] for i in range(n)]
+
+    # Representative node of each node after folding, None if zero,
+    # and whether the expression of the node has been reconstructed
+    rep = list(range(n))
+    reconstructed = [False] * n
+
+    # Map from expression to representative node, and from
+    # reconstructed nodes to their new operands
+    index = {}
+    new_operands = {}
+
+    # Index of a zero node for reconstructed nodes with zero operands,
+    # placed first in the new graph when used
+    zero = ufl.as_ufl(0.0)
+    zero_index = n
+
+    for i, expr in enumerate(expressions):
+        if i in zero_nodes or isinstance(expr, ufl.classes.Zero):
+            rep[i] = None
+            continue
+
+        deps = operands[i]
+        ops = [rep[j] for j in deps]
+        if ops != deps or any(reconstructed[j] for j in deps):
+            if isinstance(expr, ufl.classes.Product):
+                if None in ops:
+                    rep[i] = None
+                    continue
+            elif isinstance(expr, ufl.classes.Sum):
+                if ops[0] is None:
+                    rep[i] = ops[1]
+                    continue
+                elif ops[1] is None:
+                    rep[i] = ops[0]
+                    continue
+            elif isinstance(expr, (ufl.classes.Division, ufl.classes.Abs, ufl.classes.Conj,
+                                   ufl.classes.Real, ufl.classes.Imag)):
+                if ops[0] is None:
+                    rep[i] = None
+                    continue
+            elif isinstance(expr, ufl.classes.Conditional):
+                if ops[1] is None and ops[2] is None:
+                    rep[i] = None
+                    continue
+
+            # Reconstruct with the folded operands
+            if None in ops:
+                index[zero] = zero_index
+            expr = expr._ufl_expr_reconstruct_(*[zero if j is None else expressions[j] for j in ops])
+            if isinstance(expr, ufl.classes.Zero):
+                rep[i] = None
+                continue
+            expressions[i] = expr
+            reconstructed[i] = True
+            if expr._ufl_is_terminal_ or expr._ufl_is_terminal_modifier_:
+                new_operands[i] = []
+            else:
+                new_operands[i] = [index[o] for o in expr.ufl_operands]
+
+        # Merge with an equal node found earlier
+        j = index.setdefault(expr, i)
+        if j != i:
+            rep[i] = j
+
+    # Find the nodes that the folded target depends on
+    targets = [i for i, t in enumerate(S.column('target')) if t]
+    assert len(targets) == 1
+    target = rep[targets[0]]
+    if target is None:
+        target = zero_index
+    live = numpy.zeros(n + 1, dtype=bool)
+    live[target] = True
+    for i in range(n - 1, -1, -1):
+        if live[i]:
+            live[new_operands.get(i, operands[i])] = True
+
+    # Build the graph of the remaining nodes, keeping their order
+    G = ExpressionGraph()
+    G.e2i = {}
+    renumbering = {}
+    for i in ([zero_index] if live[zero_index] else []) + numpy.flatnonzero(live[:n]).tolist():
+        expr = zero if i == zero_index else expressions[i]
+        k = len(renumbering)
+        renumbering[i] = k
+        G.add_node(k, expression=expr)
+        G.e2i[expr] = k
+        if i != zero_index:
+            for j in new_operands.get(i, operands[i]):
+                G.add_edge(k, renumbering[j])
+    G.nodes[renumbering[target]]['target'] = True
 
     return G
 
@@ -216,3 +476,40 @@ def _count_nodes_with_unique_post_traversal(expr, skip_terminal_modifiers=False)
                 e2i[expr] = count
             stack.pop()
     return e2i
+
+
+def _build_scalar_graph_with_unique_post_traversal(expression):
+    """Build graph of scalar expression, adding each node together with
+    its edges when it is visited, child before parent.
+    Modified terminals are treated as a unit."""
+
+    def getops(e):
+        if e._ufl_is_terminal_ or is_modified_terminal(e):
+            return []
+        else:
+            return list(e.ufl_operands)
+
+    G = ExpressionGraph()
+    G.e2i = e2i = {}
+    stack = [(expression, getops(expression))]
+    while stack:
+        expr, ops = stack[-1]
+        for i, o in enumerate(ops):
+            if o is not None and o not in e2i:
+                stack.append((o, getops(o)))
+                ops[i] = None
+                break
+        else:
+            if not isinstance(expr, (ufl.classes.MultiIndex, ufl.classes.Label)):
+                count = len(e2i)
+                e2i[expr] = count
+                G.add_node(count, expression=expr)
+                if not (expr._ufl_is_terminal_ or expr._ufl_is_terminal_modifier_):
+                    for o in expr.ufl_operands:
+                        G.add_edge(count, e2i[o])
+            stack.pop()
+
+    # Get vertex index representing input expression root
+    G.nodes[e2i[expression]]['target'] = True
+
+    return G
@@ -13,14 +13,18 @@ import logging
 import numpy
 
 import ufl
+from ffc import profiling
 from ffc.ir.uflacs.analysis.factorization import compute_argument_factorization
-from ffc.ir.uflacs.analysis.graph import build_scalar_graph
+from ffc.ir.uflacs.analysis.graph import (build_scalar_graph, fold_zero_nodes,
+                                          node_status)
 from ffc.ir.uflacs.analysis.modified_terminals import (analyse_modified_terminal,
                                                        is_modified_terminal)
 from ffc.ir.uflacs.analysis.visualise import visualise
 from ffc.ir.uflacs.elementtables import (build_optimized_tables,
                                          clamp_table_small_numbers,
-                                         piecewise_ttypes)
+                                         equal_tables, piecewise_ttypes)
+from ffc.ir.uflacs.tensorfactorization import (factorize_argument_table,
+                                               quadrature_grid_shape)
 from ufl.algorithms.balancing import balance_modifiers
 from ufl.checks import is_cellwise_constant
 from ufl.classes import CellCoordinate, FacetCoordinate, QuadratureWeight
@@ -31,9 +35,11 @@ logger = logging.getLogger(__name__)
 
 ma_data_t = collections.namedtuple("ma_data_t", ["ma_index", "tabledata"])
 
+tensor_factor_data_t = collections.namedtuple("tensor_factor_data_t", ["names", "dof_indices"])
+
 block_data_t = collections.namedtuple("block_data_t",
                                       ["block_mode",
-                                       # "safe" | "full" | "preintegrated" | "premultiplied"
+                                       # "safe" | "full" | "preintegrated" | "premultiplied" | "tensor"
                                        "ttypes",  # list of table types for each block rank
                                        "factor_index",  # int: index of factor in vertex array
                                        "factor_is_piecewise",
@@ -45,93 +51,73 @@ block_data_t = collections.namedtuple("block_data_t",
                                        "is_uniform",  # used in "preintegrated" and "premultiplied"
                                        "name",  # used in "preintegrated" and "premultiplied"
                                        "ma_data",  # used in "full", "safe" and "partial"
-                                       "piecewise_ma_index"  # used in "partial"
+                                       "piecewise_ma_index",  # used in "partial"
+                                       "tensor_factors",  # used in "tensor"
                                        ])
 
 
-def multiply_block_interior_facets(point_index, unames, ttypes, unique_tables,
-                                   unique_table_num_dofs):
-    rank = len(unames)
-    tables = [unique_tables.get(name) for name in unames]
-    num_dofs = tuple(unique_table_num_dofs[name] for name in unames)
-
-    num_entities = max([1] + [tbl.shape[0] for tbl in tables if tbl is not None])
-    ptable = numpy.zeros((num_entities, ) * rank + num_dofs)
-    for facets in itertools.product(*[range(num_entities)] * rank):
-        vectors = []
-        for i, tbl in enumerate(tables):
-            if tbl is None:
-                assert ttypes[i] == "ones"
-                vectors.append(numpy.ones((num_dofs[i], )))
-            else:
-                # Some tables are compacted along entities or points
-                e = 0 if tbl.shape[0] == 1 else facets[i]
-                q = 0 if tbl.shape[1] == 1 else point_index
-                vectors.append(tbl[e, q, :])
-        if rank > 1:
-            assert rank == 2
-            ptable[facets[0], facets[1], ...] = numpy.outer(*vectors)
-        elif rank == 1:
-            ptable[facets[0], :] = vectors[0]
-        else:
-            raise RuntimeError("Nothing to multiply!")
+def _block_tables(unames, ttypes, unique_tables, unique_table_num_dofs):
+    """Return the tables of the arguments of a block, with axes
+    (entity, point, dof). Tables may be compacted to a single entity
+    or point, and tables of type 'ones' are represented by a table
+    with one entity and one point."""
+    tables = []
+    for name, ttype in zip(unames, ttypes):
+        tbl = unique_tables.get(name)
+        if tbl is None:
+            assert ttype == "ones"
+            tbl = numpy.ones((1, 1, unique_table_num_dofs[name]))
+        tables.append(tbl)
+    return tables
 
-    return ptable
 
+def _contract_block(tables, weights, interior_facets):
+    """Compute the weighted sum over the points of the outer product of
+    the tables of the arguments of a block, for each entity.
 
-def multiply_block(point_index, unames, ttypes, unique_tables, unique_table_num_dofs):
-    rank = len(unames)
-    tables = [unique_tables.get(name) for name in unames]
-    num_dofs = tuple(unique_table_num_dofs[name] for name in unames)
-
-    num_entities = max([1] + [tbl.shape[0] for tbl in tables if tbl is not None])
-    ptable = numpy.zeros((num_entities, ) + num_dofs)
-    for entity in range(num_entities):
-        vectors = []
-        for i, tbl in enumerate(tables):
-            if tbl is None:
-                assert ttypes[i] == "ones"
-                vectors.append(numpy.ones((num_dofs[i], )))
-            else:
-                # Some tables are compacted along entities or points
-                e = 0 if tbl.shape[0] == 1 else entity
-                q = 0 if tbl.shape[1] == 1 else point_index
-                vectors.append(tbl[e, q, :])
-        if rank > 1:
-            ptable[entity, ...] = numpy.outer(*vectors)
-        elif rank == 1:
-            ptable[entity, :] = vectors[0]
-        else:
-            raise RuntimeError("Nothing to multiply!")
+    For interior facet integrals, each argument has its own entity
+    axis in the result, otherwise the arguments share the entity axis.
+    """
+    rank = len(tables)
+    if rank == 0:
+        raise RuntimeError("Nothing to multiply!")
+    num_entities = max(tbl.shape[0] for tbl in tables)
+    num_points = len(weights)
 
-    return ptable
+    # Build subscripts q,eqi,eqj->eij or q,aqi,bqj->abij
+    entity_indices = "abcd"[:rank] if interior_facets else "e" * rank
+    dof_indices = "ijkl"[:rank]
+    operands = [numpy.broadcast_to(tbl, (num_entities, num_points, tbl.shape[2])) for tbl in tables]
+    subscripts = ",".join(["q"] + [e + "q" + i for e, i in zip(entity_indices, dof_indices)])
+    output = (entity_indices if interior_facets else "e") + dof_indices
+    return numpy.einsum(subscripts + "->" + output, weights, *operands, optimize=True)
 
 
-def integrate_block(weights, unames, ttypes, unique_tables, unique_table_num_dofs):
-    tables = [unique_tables.get(name) for name in unames]
-    num_dofs = tuple(unique_table_num_dofs[name] for name in unames)
+def _point_tables(tables, point_index):
+    """Restrict tables with axes (entity, point, dof) to a point."""
+    return [tbl[:, :1, :] if tbl.shape[1] == 1 else tbl[:, point_index:point_index + 1, :]
+            for tbl in tables]
 
-    num_entities = max([1] + [tbl.shape[0] for tbl in tables if tbl is not None])
-    ptable = numpy.zeros((num_entities, ) + num_dofs)
-    for iq, w in enumerate(weights):
-        ptable[...] += w * multiply_block(iq, unames, ttypes, unique_tables, unique_table_num_dofs)
 
-    return ptable
+def multiply_block_interior_facets(point_index, unames, ttypes, unique_tables,
+                                   unique_table_num_dofs):
+    tables = _block_tables(unames, ttypes, unique_tables, unique_table_num_dofs)
+    return _contract_block(_point_tables(tables, point_index), numpy.ones(1), True)
 
 
-def integrate_block_interior_facets(weights, unames, ttypes, unique_tables, unique_table_num_dofs):
-    rank = len(unames)
-    tables = [unique_tables.get(name) for name in unames]
-    num_dofs = tuple(unique_table_num_dofs[name] for name in unames)
-
-    num_entities = max([1] + [tbl.shape[0] for tbl in tables if tbl is not None])
-    ptable = numpy.zeros((num_entities, ) * rank + num_dofs)
-    for iq, w in enumerate(weights):
-        mtable = multiply_block_interior_facets(iq, unames, ttypes, unique_tables,
-                                                unique_table_num_dofs)
-        ptable[...] += w * mtable
+def multiply_block(point_index, unames, ttypes, unique_tables, unique_table_num_dofs):
+    tables = _block_tables(unames, ttypes, unique_tables, unique_table_num_dofs)
+    return _contract_block(_point_tables(tables, point_index), numpy.ones(1), False)
+
 
-    return ptable
+def integrate_block(weights, unames, ttypes, unique_tables, unique_table_num_dofs):
+    tables = _block_tables(unames, ttypes, unique_tables, unique_table_num_dofs)
+    return _contract_block(tables, numpy.asarray(weights), False)
+
+
+def integrate_block_interior_facets(weights, unames, ttypes, unique_tables, unique_table_num_dofs):
+    tables = _block_tables(unames, ttypes, unique_tables, unique_table_num_dofs)
+    return _contract_block(tables, numpy.asarray(weights), True)
 
 
 def uflacs_default_parameters(optimize):
@@ -159,9 +145,12 @@ def uflacs_default_parameters(optimize):
         "enable_sum_factorization": False,
         "enable_block_transpose_reuse": False,
         "enable_table_zero_compression": False,
+        "enable_tensor_factorization": False,  # sum factorization on quadrilaterals and hexahedra
 
         # Code generation parameters
         "vectorize": False,
+        "simd_width": 4,  # number of cells in the vectorized kernel
+        "binary_tables": False,  # store element tables in binary files linked with .incbin
         "alignas": 0,
         "padlen": 1,
         "use_symbol_array": True,
@@ -177,6 +166,7 @@ def uflacs_default_parameters(optimize):
             "enable_sum_factorization": True,
             "enable_block_transpose_reuse": True,
             "enable_table_zero_compression": True,
+            "enable_tensor_factorization": False,
 
             # Code generation parameters
             "vectorize": False,
@@ -218,6 +208,9 @@ def parse_uflacs_optimization_parameters(parameters, integral_type):
     if integral_type in skip_premultiplied:
         p["enable_premultiplication"] = False
 
+    if integral_type != "cell":
+        p["enable_tensor_factorization"] = False
+
     return p
 
 
@@ -261,6 +254,10 @@ def build_uflacs_ir(cell, integral_type, entitytype, integrands, tensor_shape,
     cases = [(num_points, [integrands[num_points]]) for num_points in all_num_points]
     ir["all_num_points"] = all_num_points
 
+    # One dimensional factors of element tables, shared by all
+    # quadrature loops
+    tensor_factor_tables = {}
+
     for num_points, expressions in cases:
 
         assert len(expressions) == 1
@@ -273,10 +270,9 @@ def build_uflacs_ir(cell, integral_type, entitytype, integrands, tensor_shape,
         expression = replace_quadratureweight(expression)
 
         # Build initial scalar list-based graph representation
-        S = build_scalar_graph(expression)
-        S_targets = [i for i, v in S.nodes.items() if v.get('target', False)]
-        assert len(S_targets) == 1
-        S_target = S_targets[0]
+        with profiling.timer("build_scalar_graph"):
+            S = build_scalar_graph(expression)
+        profiling.record(graph_nodes=len(S.nodes))
 
         # Build terminal_data from V here before factorization. Then we
         # can use it to derive table properties for all modified
@@ -288,39 +284,30 @@ def build_uflacs_ir(cell, integral_type, entitytype, integrands, tensor_shape,
                              for i, v in S.nodes.items()
                              if is_modified_terminal(v['expression'])}
 
-        unique_tables, unique_table_types, unique_table_num_dofs, mt_unique_table_reference = build_optimized_tables(
-            num_points,
-            quadrature_rules,
-            cell,
-            integral_type,
-            entitytype,
-            initial_terminals.values(),
-            ir["unique_tables"],
-            p["enable_table_zero_compression"],
-            rtol=p["table_rtol"],
-            atol=p["table_atol"])
-
-        # If there are any 'zero' tables, replace symbolically and rebuild graph
+        with profiling.timer("build_optimized_tables"):
+            unique_tables, unique_table_types, unique_table_num_dofs, mt_unique_table_reference = \
+                build_optimized_tables(
+                    num_points,
+                    quadrature_rules,
+                    cell,
+                    integral_type,
+                    entitytype,
+                    initial_terminals.values(),
+                    ir["unique_tables"],
+                    p["enable_table_zero_compression"],
+                    rtol=p["table_rtol"],
+                    atol=p["table_atol"])
+
+        # If there are any 'zero' tables, fold the zeros through the graph
         if 'zeros' in unique_table_types.values():
+            zero_nodes = set()
             for i, mt in initial_terminals.items():
-                # Set modified terminals with zero tables to zero
                 tr = mt_unique_table_reference.get(mt)
                 if tr is not None and tr.ttype == "zeros":
-                    S.nodes[i]['expression'] = ufl.as_ufl(0.0)
+                    zero_nodes.add(i)
 
-            # Propagate expression changes using dependency list
-            for i, v in S.nodes.items():
-                deps = [S.nodes[j]['expression'] for j in S.out_edges[i]]
-                if deps:
-                    v['expression'] = v['expression']._ufl_expr_reconstruct_(*deps)
-
-            # Rebuild scalar target expressions and graph (this may be
-            # overkill and possible to optimize away if it turns out to be
-            # costly)
-            expression = S.nodes[S_target]['expression']
-
-            # Rebuild scalar list-based graph representation
-            S = build_scalar_graph(expression)
+            with profiling.timer("fold_zero_nodes"):
+                S = fold_zero_nodes(S, zero_nodes)
 
         # Output diagnostic graph as pdf
         if parameters['visualise']:
@@ -328,7 +315,9 @@ def build_uflacs_ir(cell, integral_type, entitytype, integrands, tensor_shape,
 
         # Compute factorization of arguments
         rank = len(tensor_shape)
-        F = compute_argument_factorization(S, rank)
+        with profiling.timer("compute_argument_factorization"):
+            F = compute_argument_factorization(S, rank)
+        profiling.record(factorized_nodes=len(F.nodes))
 
         # Get the 'target' nodes that are factors of arguments, and insert in dict
         FV_targets = [i for i, v in F.nodes.items() if v.get('target', False)]
@@ -394,6 +383,14 @@ def build_uflacs_ir(cell, integral_type, entitytype, integrands, tensor_shape,
 
             factor_is_piecewise = F.nodes[fi]['status'] == 'piecewise'
 
+            # Factorize argument tables on tensor product cells
+            tensor_factors = None
+            if p["enable_tensor_factorization"] and rank > 0 and num_points > 1 and all(
+                    tt in ("varying", "uniform") for tt in ttypes):
+                tensor_factors = build_tensor_factors(
+                    [F.nodes[ai]['mt'] for ai in ma_indices], trs, quadrature_rules[num_points][0],
+                    cell, integral_type, entitytype, tensor_factor_tables, p)
+
             # TODO: Add separate block modes for quadrature
             # Both arguments in quadrature elements
             """
@@ -431,6 +428,11 @@ def build_uflacs_ir(cell, integral_type, entitytype, integrands, tensor_shape,
                 # Integrate functional in quadloop, scale block after
                 # quadloop
                 block_mode = "premultiplied"
+            elif tensor_factors is not None:
+                # Contract integrand values with one dimensional
+                # factors of the argument tables, one direction at a
+                # time, after quadloop
+                block_mode = "tensor"
             elif p["enable_sum_factorization"]:
                 if (rank == 2 and any(tt in piecewise_ttypes for tt in ttypes)):
                     # Partial computation in quadloop of f*u[i], compute
@@ -489,7 +491,7 @@ def build_uflacs_ir(cell, integral_type, entitytype, integrands, tensor_shape,
                 blockdata = block_data_t(
                     block_mode, ttypes, fi, factor_is_piecewise, block_unames,
                     block_restrictions, block_is_transposed, block_is_uniform, pname,
-                    None, None)
+                    None, None, None)
                 block_is_piecewise = True
 
             elif block_mode == "premultiplied":
@@ -527,7 +529,8 @@ def build_uflacs_ir(cell, integral_type, entitytype, integrands, tensor_shape,
                 block_unames = (pname, )
                 blockdata = block_data_t(
                     block_mode, ttypes, fi, factor_is_piecewise, block_unames,
-                    block_restrictions, block_is_transposed, block_is_uniform, pname, None, None)
+                    block_restrictions, block_is_transposed, block_is_uniform, pname, None, None,
+                    None)
                 block_is_piecewise = False
 
 #           elif block_mode == "scaled":
@@ -568,7 +571,7 @@ def build_uflacs_ir(cell, integral_type, entitytype, integrands, tensor_shape,
                     blockdata = block_data_t(block_mode, ttypes, fi,
                                              factor_is_piecewise, block_unames,
                                              block_restrictions, block_is_transposed,
-                                             None, None, tuple(ma_data), piecewise_ma_index)
+                                             None, None, tuple(ma_data), piecewise_ma_index, None)
                 elif block_mode in ("full", "safe"):
                     # Add to contributions:
                     # B[i] = sum_q weight * f * u[i] * v[j];  generated inside quadloop
@@ -578,7 +581,17 @@ def build_uflacs_ir(cell, integral_type, entitytype, integrands, tensor_shape,
                     blockdata = block_data_t(block_mode, ttypes, fi,
                                              factor_is_piecewise, block_unames,
                                              block_restrictions, block_is_transposed,
-                                             None, None, tuple(ma_data), None)
+                                             None, None, tuple(ma_data), None, None)
+            elif block_mode == "tensor":
+                # Add to contributions:
+                # FW[q] = weight * f;                       generated inside quadloop
+                # T[k] = sum_q FW[q] * prod_d U_d[q_d,k_d];  generated after quadloop
+                # A[blockmap] += T[...];                    generated after quadloop
+                block_unames = unames
+                blockdata = block_data_t(block_mode, ttypes, fi, factor_is_piecewise, block_unames,
+                                         block_restrictions, False, None, None, None, None,
+                                         tensor_factors)
+                block_is_piecewise = False
             else:
                 raise RuntimeError("Invalid block_mode %s" % (block_mode, ))
 
@@ -606,6 +619,14 @@ def build_uflacs_ir(cell, integral_type, entitytype, integrands, tensor_shape,
                 elif blockdata.block_mode in ("partial", "full", "safe"):
                     for mad in blockdata.ma_data:
                         active_table_names.add(mad.tabledata.name)
+                elif blockdata.block_mode == "tensor":
+                    for tfd in blockdata.tensor_factors:
+                        active_table_names.update(tfd.names)
+
+        # Add the one dimensional factors of element tables
+        for name, table in tensor_factor_tables.items():
+            unique_tables[name] = table
+            unique_table_types[name] = "tensor_factor"
 
         # Record all table types before dropping tables
         ir["unique_table_types"].update(unique_table_types)
@@ -678,9 +699,49 @@ def build_uflacs_ir(cell, integral_type, entitytype, integrands, tensor_shape,
                                          "block_contributions": block_contributions,
                                          "need_points": need_points,
                                          "need_weights": need_weights}
+
+    profiling.record(unique_tables=len(ir["unique_tables"]),
+                     unique_table_values=sum(t.size for t in ir["unique_tables"].values()))
     return ir
 
 
+def build_tensor_factors(mts, trs, points, cell, integral_type, entitytype, tensor_factor_tables,
+                         p):
+    """Factorize the argument tables of a block into one dimensional
+    tables, or return None if the quadrature rule or any of the
+    tables are not tensor products."""
+    if cell.cellname() not in ("quadrilateral", "hexahedron"):
+        return None
+    grid_shape = quadrature_grid_shape(points, rtol=p["table_rtol"], atol=p["table_atol"])
+    if grid_shape is None:
+        return None
+
+    tensor_factors = []
+    for mt, tr in zip(mts, trs):
+        res = factorize_argument_table(mt, tr, points, cell, integral_type, entitytype, grid_shape,
+                                       rtol=p["table_rtol"], atol=p["table_atol"])
+        if res is None:
+            return None
+        factors, dof_indices = res
+
+        # Reuse equal factor tables
+        names = []
+        for table in factors:
+            table = clamp_table_small_numbers(table, rtol=p["table_rtol"], atol=p["table_atol"])
+            for name in sorted(tensor_factor_tables):
+                if equal_tables(table, tensor_factor_tables[name], rtol=p["table_rtol"],
+                                atol=p["table_atol"]):
+                    break
+            else:
+                name = "SF%d" % len(tensor_factor_tables)
+                tensor_factor_tables[name] = table
+            names.append(name)
+        tensor_factors.append(
+            tensor_factor_data_t(tuple(names), tuple(tuple(int(k) for k in row)
+                                                     for row in dof_indices)))
+    return tuple(tensor_factors)
+
+
 def analyse_dependencies(F, mt_unique_table_reference):
     # Sets 'status' of all nodes to either: 'inactive', 'piecewise' or 'varying'
     # Children of 'target' nodes are either 'piecewise' or 'varying'.
@@ -688,25 +749,27 @@ def analyse_dependencies(F, mt_unique_table_reference):
     # Varying nodes are identified by their tables ('tr'). All their parent
     # nodes are also set to 'varying' - any remaining active nodes are 'piecewise'.
 
+    inactive, active, piecewise, varying = (node_status.index(s)
+                                            for s in ('inactive', 'active', 'piecewise', 'varying'))
+    status = F.column('status')
+
     # Set targets, and dependencies to 'active'
-    targets = [i for i, v in F.nodes.items() if v.get('target')]
-    for i, v in F.nodes.items():
-        v['status'] = 'inactive'
+    targets = [i for i, t in enumerate(F.column('target')) if t]
+    status[:] = inactive
 
     while targets:
         s = targets.pop()
-        F.nodes[s]['status'] = 'active'
+        status[s] = active
         for j in F.out_edges[s]:
-            if F.nodes[j]['status'] == 'inactive':
+            if status[j] == inactive:
                 targets.append(j)
 
     # Build piecewise/varying markers for factorized_vertices
     varying_ttypes = ("varying", "uniform", "quadrature")
     varying_indices = []
-    for i, v in F.nodes.items():
-        if v.get('mt') is None:
+    for i, (mt, tr) in enumerate(zip(F.column('mt'), F.column('tr'))):
+        if mt is None:
             continue
-        tr = v.get('tr')
         if tr is not None:
             ttype = tr.ttype
             # Check if table computations have revealed values varying over points
@@ -717,7 +780,7 @@ def analyse_dependencies(F, mt_unique_table_reference):
                 if ttype not in ("fixed", "piecewise", "ones", "zeros"):
                     raise RuntimeError("Invalid ttype %s" % (ttype, ))
 
-        elif not is_cellwise_constant(v['expression']):
+        elif not is_cellwise_constant(F.nodes[i]['expression']):
             raise RuntimeError("Error")
             # Keeping this check to be on the safe side,
             # not sure which cases this will cover (if any)
@@ -726,15 +789,12 @@ def analyse_dependencies(F, mt_unique_table_reference):
     # Set all parents of active varying nodes to 'varying'
     while varying_indices:
         s = varying_indices.pop()
-        if F.nodes[s]['status'] == 'active':
-            F.nodes[s]['status'] = 'varying'
-            for j in F.in_edges[s]:
-                varying_indices.append(j)
+        if status[s] == active:
+            status[s] = varying
+            varying_indices.extend(F.in_edges[s])
 
     # Any remaining active nodes must be 'piecewise'
-    for i, v in F.nodes.items():
-        if v['status'] == 'active':
-            v['status'] = 'piecewise'
+    status[status == active] = piecewise
 
 
 def replace_quadratureweight(expression):
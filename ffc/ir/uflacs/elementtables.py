@@ -6,6 +6,7 @@
 # SPDX-License-Identifier:    LGPL-3.0-or-later
 """Tools for precomputed tables of terminal values."""
 
+import bisect
 import collections
 import logging
 
@@ -13,6 +14,7 @@ import numpy
 
 import ufl
 import ufl.utils.derivativetuples
+from ffc import profiling
 from ffc.fiatinterface import create_element
 from ffc.ir.representationutils import (create_quadrature_points_and_weights,
                                         integral_type_to_entity_dim,
@@ -25,7 +27,7 @@ default_rtol = 1e-5
 default_atol = 1e-8
 
 table_origin_t = collections.namedtuple(
-    "table_origin", ["element", "avg", "derivatives", "flat_component", "dofrange", "dofmap"])
+    "table_origin_t", ["element", "avg", "derivatives", "flat_component", "dofrange", "dofmap"])
 
 piecewise_ttypes = ("piecewise", "fixed", "ones", "zeros")
 
@@ -34,9 +36,14 @@ uniform_ttypes = ("uniform", "fixed", "ones", "zeros")
 valid_ttypes = set(("quadrature", )) | set(piecewise_ttypes) | set(uniform_ttypes)
 
 unique_table_reference_t = collections.namedtuple(
-    "unique_table_reference",
+    "unique_table_reference_t",
     ["name", "values", "dofrange", "dofmap", "original_dim", "ttype", "is_piecewise", "is_uniform"])
 
+# Cache for tabulations of elements, keyed by element, derivative order
+# and points, and ordered from least to most recently used
+_tabulation_cache = collections.OrderedDict()
+_tabulation_cache_size = 256
+
 
 # TODO: Get restriction postfix from somewhere central
 def ufc_restriction_offset(restriction, length):
@@ -98,30 +105,93 @@ def strip_table_zeros(table, compress_zeros, rtol=default_rtol, atol=default_ato
 
 def build_unique_tables(tables, rtol=default_rtol, atol=default_atol):
     """Given a list or dict of tables, return a list of unique tables
-    and a dict of unique table indices for each input table key."""
+    and a dict of unique table indices for each input table key.
+
+    Each table is mapped to the first unique table it is equal to
+    within rtol and atol, see equal_tables. To avoid comparing every
+    pair of tables, the unique tables of each shape are kept sorted by
+    a weighted sum of their values, and a table is only compared to
+    the unique tables with a weighted sum close enough to its own for
+    the tables to be equal.
+    """
     unique = []
     mapping = {}
 
+    # Weights, sorted weighted sums and unique table indices in the
+    # same order, for each table shape
+    buckets = {}
+
     if isinstance(tables, list):
         keys = list(range(len(tables)))
     elif isinstance(tables, dict):
         keys = sorted(tables.keys())
 
+    eps = numpy.finfo(numpy.float64).eps
     for k in keys:
         t = tables[k]
-        found = -1
-        for i, u in enumerate(unique):
-            if equal_tables(u, t, rtol=rtol, atol=atol):
-                found = i
+        values = numpy.asarray(t, dtype=numpy.float64)
+        bucket = buckets.get(values.shape)
+        if bucket is None:
+            # Fixed weights in [1, 2), spread out to tell apart tables
+            # with the same values in different order
+            weights = 1.0 + (numpy.arange(values.size) * 0.6180339887498949) % 1.0
+            bucket = buckets[values.shape] = (weights, [], [])
+        weights, sums, indices = bucket
+
+        # Bound the difference between the weighted sums of this table
+        # and any table equal to it, including rounding errors
+        values = values.ravel()
+        wsum = numpy.dot(weights, values)
+        wabs = numpy.dot(weights, numpy.abs(values))
+        tol = atol * numpy.sum(weights) + rtol * wabs
+        tol += 4 * values.size * eps * (wabs + tol)
+
+        begin = bisect.bisect_left(sums, wsum - tol)
+        end = bisect.bisect_right(sums, wsum + tol)
+        for i in sorted(indices[begin:end]):
+            if equal_tables(unique[i], t, rtol=rtol, atol=atol):
                 break
-        if found == -1:
+        else:
             i = len(unique)
             unique.append(t)
+            j = bisect.bisect_right(sums, wsum)
+            sums.insert(j, wsum)
+            indices.insert(j, i)
         mapping[k] = i
 
     return unique, mapping
 
 
+def tabulate_element(ufl_element, deriv_order, points):
+    """Tabulate the FIAT element of ufl_element and its derivatives up
+    to order deriv_order in points.
+
+    The tabulations are cached, as the same element is typically
+    tabulated in the same points for many integrals, components and
+    derivatives, so the returned arrays are read-only.
+    """
+    points = numpy.ascontiguousarray(points, dtype=numpy.float64)
+    key = (ufl_element, deriv_order, points.shape, points.tobytes())
+    tables = _tabulation_cache.get(key)
+    if tables is not None:
+        profiling.record(tabulation_cache_hits=1)
+        _tabulation_cache.move_to_end(key)
+        return tables
+
+    profiling.record(tabulation_cache_misses=1)
+    tables = create_element(ufl_element).tabulate(deriv_order, points)
+    tables = {derivatives: numpy.asarray(values).view() for derivatives, values in tables.items()}
+    for values in tables.values():
+        values.setflags(write=False)
+
+    # Store in cache, evicting the least recently used tabulations
+    _tabulation_cache[key] = tables
+    while len(_tabulation_cache) > _tabulation_cache_size:
+        _tabulation_cache.popitem(last=False)
+
+    return tables
+
+
 def get_ffc_table_values(points, cell, integral_type, ufl_element, avg, entitytype,
                          derivative_counts, flat_component):
     """Extract values from ffc element table.
@@ -158,14 +228,13 @@ def get_ffc_table_values(points, cell, integral_type, ufl_element, avg, entityty
                                                                ufl_element.degree(), "default")
 
     # Tabulate table of basis functions and derivatives in points for each entity
-    fiat_element = create_element(ufl_element)
     tdim = cell.topological_dimension()
     entity_dim = integral_type_to_entity_dim(integral_type, tdim)
     num_entities = ufl.cell.num_cell_entities[cell.cellname()][entity_dim]
     entity_tables = []
     for entity in range(num_entities):
         entity_points = map_integral_points(points, integral_type, cell, entity)
-        tbl = fiat_element.tabulate(deriv_order, entity_points)[derivative_counts]
+        tbl = tabulate_element(ufl_element, deriv_order, entity_points)[derivative_counts]
         entity_tables.append(tbl)
 
     # Extract arrays for the right scalar component
@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 FEniCS Project
+#
+# This file is part of FFC (https://www.fenicsproject.org)
+#
+# SPDX-License-Identifier:    LGPL-3.0-or-later
+"""Tools for factorizing element tables on tensor product cells.
+
+On quadrilaterals and hexahedra, the basis functions of Q and DQ
+elements and their reference derivatives are products of functions of
+one variable, and the default quadrature rules are tensor products of
+rules on the interval. A table of values of such basis functions in
+the quadrature points, with points and dofs numbered
+lexicographically, is then a Kronecker product of one dimensional
+tables, which allows evaluating integrals by sum factorization.
+
+The factorization is computed numerically from the dense tables, so it
+does not depend on how FIAT numbers the dofs.
+"""
+
+import itertools
+
+import numpy
+
+from ffc.ir.uflacs.elementtables import (get_ffc_table_values,
+                                         get_modified_terminal_element)
+
+
+def quadrature_grid_shape(points, rtol=1e-5, atol=1e-8):
+    """Return the number of points in each direction if the points are
+    a tensor product grid numbered lexicographically (the first
+    coordinate varying slowest), otherwise None."""
+    points = numpy.asarray(points)
+    if points.ndim != 2 or points.shape[1] < 2:
+        return None
+
+    # Find the distinct coordinates in each direction
+    coordinates = []
+    for d in range(points.shape[1]):
+        unique = []
+        for x in points[:, d]:
+            if not any(numpy.isclose(x, u, rtol=rtol, atol=atol) for u in unique):
+                unique.append(x)
+        coordinates.append(unique)
+
+    shape = tuple(len(x) for x in coordinates)
+    if numpy.prod(shape) != points.shape[0]:
+        return None
+    grid = numpy.array(list(itertools.product(*coordinates)))
+    if not numpy.allclose(grid, points, rtol=rtol, atol=atol):
+        return None
+    return shape
+
+
+def _rank_one_factors(tensor):
+    """Return vectors whose outer product best approximates tensor."""
+    factors = []
+    r = tensor
+    for n in tensor.shape[:-1]:
+        u, s, vt = numpy.linalg.svd(r.reshape(n, -1), full_matrices=False)
+        factors.append(u[:, 0])
+        r = s[0] * vt[0]
+    factors.append(r)
+    return factors
+
+
+def _outer(factors):
+    t = factors[0]
+    for f in factors[1:]:
+        t = numpy.multiply.outer(t, f)
+    return t
+
+
+def _normalize(v):
+    """Scale v to unit length with its largest entry positive."""
+    norm = numpy.linalg.norm(v)
+    if v[numpy.argmax(numpy.abs(v))] < 0:
+        norm = -norm
+    return v / norm
+
+
+def dof_grid_indices(table, grid_shape, rtol=1e-5, atol=1e-8):
+    """Find the position of each dof in a grid of one dimensional basis
+    functions.
+
+    'table' has shape (num_points, num_dofs) and holds the values of
+    the basis functions in the points of a tensor product quadrature
+    rule, numbered lexicographically on a grid of shape 'grid_shape'.
+    Returns an integer array of shape (num_dofs, len(grid_shape)), or
+    None if the basis functions are not products of distinct one
+    dimensional functions covering a full grid.
+    """
+    table = numpy.asarray(table)
+    num_points, num_dofs = table.shape
+    if numpy.prod(grid_shape) != num_points or num_dofs == 0:
+        return None
+    dim = len(grid_shape)
+
+    # Factorize each column, collecting the distinct normalized
+    # factors in each direction
+    unique = [[] for d in range(dim)]
+    dof_indices = numpy.zeros((num_dofs, dim), dtype=int)
+    for j in range(num_dofs):
+        column = table[:, j].reshape(grid_shape)
+        factors = _rank_one_factors(column)
+        if not numpy.allclose(_outer(factors), column, rtol=rtol, atol=atol):
+            return None
+        for d, f in enumerate(factors):
+            if not numpy.any(f):
+                return None
+            f = _normalize(f)
+            for k, u in enumerate(unique[d]):
+                if numpy.allclose(u, f, rtol=rtol, atol=atol):
+                    break
+            else:
+                k = len(unique[d])
+                unique[d].append(f)
+            dof_indices[j, d] = k
+
+    # The dofs must cover a full grid
+    m = tuple(len(u) for u in unique)
+    if numpy.prod(m) != num_dofs or len(set(map(tuple, dof_indices))) != num_dofs:
+        return None
+    return dof_indices
+
+
+def factorize_table(table, grid_shape, dof_indices, rtol=1e-5, atol=1e-8):
+    """Factorize a table of basis function values in the points of a
+    tensor product quadrature rule.
+
+    'table' has shape (num_points, num_dofs), with the points numbered
+    lexicographically on a grid of shape 'grid_shape', and dof j at
+    position dof_indices[j] in a grid of one dimensional factors (see
+    dof_grid_indices). Returns one table of shape (grid_shape[d],
+    m[d]) for each direction d, such that
+
+        table[q, j] = prod_d factors[d][q[d], dof_indices[j, d]]
+
+    where (q[0], q[1], ...) is the grid position of point q, or None
+    if the table is not a tensor product of this form.
+    """
+    table = numpy.asarray(table)
+    dim = len(grid_shape)
+    m = tuple(int(k) + 1 for k in numpy.max(dof_indices, axis=0))
+
+    # Arrange the values as a tensor with the point and dof index of
+    # each direction next to each other, which is then the outer
+    # product of the factors
+    values = numpy.zeros((table.shape[0], numpy.prod(m)))
+    values[:, numpy.ravel_multi_index(tuple(dof_indices.T), m)] = table
+    values = values.reshape(tuple(grid_shape) + m)
+    values = values.transpose([i + d * dim for i in range(dim) for d in range(2)])
+    values = values.reshape(tuple(n * k for n, k in zip(grid_shape, m)))
+
+    factors = _rank_one_factors(values)
+    if not numpy.allclose(_outer(factors), values, rtol=rtol, atol=atol):
+        return None
+    return [f.reshape(n, k) for f, n, k in zip(factors, grid_shape, m)]
+
+
+def factorize_argument_table(mt, tr, points, cell, integral_type, entitytype, grid_shape,
+                             rtol=1e-5, atol=1e-8):
+    """Factorize the table of a modified argument in a cell integral.
+
+    The position of each dof in the grid of one dimensional factors is
+    found from the table of basis function values, since the
+    derivatives of different basis functions may coincide. Returns
+    the factor tables and the dof positions of the columns of
+    tr.values, or None if the table can not be factorized.
+    """
+    element, avg, derivatives, fc = get_modified_terminal_element(mt)
+    if avg:
+        return None
+
+    tdim = cell.topological_dimension()
+    value_table = get_ffc_table_values(points, cell, integral_type, element, avg, entitytype,
+                                       (0, ) * tdim, fc)
+    value_table = value_table[0][:, tr.dofmap]
+    dof_indices = dof_grid_indices(value_table, grid_shape, rtol=rtol, atol=atol)
+    if dof_indices is None:
+        return None
+
+    factors = factorize_table(tr.values[0], grid_shape, dof_indices, rtol=rtol, atol=atol)
+    if factors is None:
+        return None
+    return factors, dof_indices
@@ -27,7 +27,7 @@ def collect_quadrature_rules(integrals, default_scheme, default_degree):
     return rules
 
 
-def compute_quadrature_rules(rules, integral_type, cell):
+def compute_quadrature_rules(rules, integral_type, cell, parameters=None):
     """Compute points and weights for a set of quadrature rules."""
     quadrature_rules = {}
     quadrature_rule_sizes = {}
@@ -36,7 +36,7 @@ def compute_quadrature_rules(rules, integral_type, cell):
 
         # Compute quadrature points and weights
         (points, weights) = create_quadrature_points_and_weights(integral_type, cell, degree,
-                                                                 scheme)
+                                                                 scheme, parameters)
 
         if points is not None:
             points = numpy.asarray(points)
@@ -68,7 +68,7 @@ def compute_integral_ir(itg_data, form_data, form_id, element_numbers, classname
 
     # Compute actual points and weights
     quadrature_rules, quadrature_rule_sizes = compute_quadrature_rules(
-        rules, quadrature_integral_type, cell)
+        rules, quadrature_integral_type, cell, parameters)
 
     # Store quadrature rules in format { num_points: (points, weights) }
     ir["quadrature_rules"] = quadrature_rules
@@ -113,6 +113,11 @@ def compute_integral_ir(itg_data, form_data, form_id, element_numbers, classname
     # Copy offsets also into IR
     ir["coefficient_offsets"] = offsets
 
+    # Sizes of the coefficient and coordinate dof arrays of a cell,
+    # used as strides by the batched tabulate_tensor
+    ir["coefficient_dofs_size"] = _offset
+    ir["coordinate_dofs_size"] = create_element(itg_data.domain.ufl_coordinate_element()).space_dimension()
+
     # Build the more uflacs-specific intermediate representation
     uflacs_ir = build_uflacs_ir(itg_data.domain.ufl_cell(), itg_data.integral_type,
                                 ir["entitytype"], integrands, ir["tensor_shape"],
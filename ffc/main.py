@@ -18,7 +18,7 @@ import string
 
 import ufl
 from ffc import __version__ as FFC_VERSION
-from ffc import compiler, formatting
+from ffc import compiler, profiling
 from ffc.parameters import default_parameters
 
 logger = logging.getLogger(__name__)
@@ -32,6 +32,8 @@ parser.add_argument("-d", "--debug", action='store_true', help="enable debug out
 parser.add_argument("-v", "--verbose", action='store_true', help="verbose output")
 parser.add_argument("-o", "--output-directory", type=str, help="output directory")
 parser.add_argument("-p", "--profile", action='store_true', help="enable profiling")
+parser.add_argument(
+    "-t", "--timings", action='store_true', help="write compile time profile of each stage to JSON file")
 parser.add_argument(
     "-q",
     "--quadrature-rule",
@@ -103,11 +105,11 @@ def main(args=None):
     # ufl.constantvalue.precision = int(parameters["precision"])
 
     # Call parser and compiler for each file
-    resultcode = _compile_files(xargs.ufl_file, parameters, xargs.profile)
+    resultcode = _compile_files(xargs.ufl_file, parameters, xargs.profile, xargs.timings)
     return resultcode
 
 
-def _compile_files(args, parameters, enable_profile):
+def _compile_files(args, parameters, enable_profile, enable_timings=False):
     # Call parser and compiler for each file
     for filename in args:
         file = pathlib.Path(filename)
@@ -129,16 +131,14 @@ def _compile_files(args, parameters, enable_profile):
         # Load UFL file
         ufd = ufl.algorithms.load_ufl_file(filename)
 
-        # Generate code
-        if len(ufd.forms) > 0:
-            code_h, code_c = compiler.compile_ufl_objects(
-                ufd.forms, ufd.object_names, prefix=prefix, parameters=parameters)
-        else:
-            code_h, code_c = compiler.compile_ufl_objects(
-                ufd.elements, ufd.object_names, prefix=prefix, parameters=parameters)
-
-        # Write to file
-        formatting.write_code(code_h, code_c, prefix, parameters)
+        # Generate code and write to file
+        with profiling.profile(prefix) as prof:
+            if len(ufd.forms) > 0:
+                compiler.write_ufl_objects(
+                    ufd.forms, ufd.object_names, prefix=prefix, parameters=parameters)
+            else:
+                compiler.write_ufl_objects(
+                    ufd.elements, ufd.object_names, prefix=prefix, parameters=parameters)
 
         # except Exception as exception:
         #    # Catch exceptions only when not in debug mode
@@ -157,4 +157,11 @@ def _compile_files(args, parameters, enable_profile):
             pr.dump_stats(pfn)
             print("Wrote profiling info to file {0}".format(pfn))
 
+        # Write compile time profile to file
+        if enable_timings:
+            tfn = "ffc_{0}.timings.json".format(prefix)
+            with open(tfn, "w") as f:
+                f.write(prof.to_json(indent=1))
+            print("Wrote timings to file {0}".format(tfn))
+
     return 0
@@ -24,6 +24,7 @@ _FFC_GENERATE_PARAMETERS = {
     "scalar_type": "double",
     "timeout": 10,  # Max time to wait on cache if not building on this process (seconds)
     "external_includes": "",  # ':' separated list of include filenames to add to generated code
+    "deduplicate_kernels": False,  # generate the kernels of integrals with the same signature once
 }
 _FFC_BUILD_PARAMETERS = {
     "external_include_dirs": "",  # ':' separated list of include dirs to add when JIT compiling
@@ -31,6 +32,10 @@ _FFC_BUILD_PARAMETERS = {
 _FFC_CACHE_PARAMETERS = {
     "cache_dir": "~/.cache/fenics",  # cache dir used by default
     "output_dir": ".",  # output directory for generated code
+    "ir_cache": False,  # cache intermediate representations in cache dir
+    "code_cache": False,  # cache generated code of integrals and elements in cache dir
+    "quadrature_cache": False,  # cache high degree quadrature rules in cache dir
+    "module_cache_size": 128,  # max number of JIT modules kept in memory by a process (0 to disable)
 }
 _FFC_LOG_PARAMETERS = {
     # "log_level": INFO + 5,  # log level, displaying only messages with level >= log_level
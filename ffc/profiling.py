@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 FEniCS Project
+#
+# This file is part of FFC (https://www.fenicsproject.org)
+#
+# SPDX-License-Identifier:    LGPL-3.0-or-later
+"""Compile time profiling.
+
+The compiler stages are instrumented with named timers and counters,
+which are collected in a timing tree while a profile is active:
+
+    with ffc.profiling.profile() as prof:
+        ffc.compiler.compile_ufl_objects(forms, prefix="Poisson")
+    print(prof.to_json())
+
+Timers with the same name under the same parent are merged, adding up
+their time and number of calls. Outside of a profile the timers and
+counters do nothing.
+"""
+
+import contextlib
+import functools
+import json
+import threading
+from collections import OrderedDict
+from time import perf_counter
+
+_state = threading.local()
+
+
+class TimingNode(object):
+    """Node of a timing tree, with the accumulated time and number of
+    calls of a named timer, counters and child timers."""
+
+    def __init__(self, name):
+        self.name = name
+        self.time = 0.0
+        self.calls = 0
+        self.counts = OrderedDict()
+        self.children = OrderedDict()
+
+    def child(self, name):
+        node = self.children.get(name)
+        if node is None:
+            node = TimingNode(name)
+            self.children[name] = node
+        return node
+
+    def as_dict(self):
+        return {"name": self.name,
+                "time": self.time,
+                "calls": self.calls,
+                "counts": dict(self.counts),
+                "children": [c.as_dict() for c in self.children.values()]}
+
+    def report(self, indent=0):
+        """Return the tree formatted as text, one timer per line."""
+        counts = "".join(", {}={}".format(k, v) for k, v in self.counts.items())
+        lines = ["{}{}: {:.6f} s ({} calls{})".format("  " * indent, self.name, self.time, self.calls, counts)]
+        for c in self.children.values():
+            lines.append(c.report(indent + 1))
+        return "\n".join(lines)
+
+
+class Profile(object):
+    """Timing tree collected while a profile is active."""
+
+    def __init__(self, name="ffc"):
+        self.root = TimingNode(name)
+
+    def as_dict(self):
+        return self.root.as_dict()
+
+    def to_json(self, **kwargs):
+        return json.dumps(self.as_dict(), **kwargs)
+
+    def report(self):
+        return self.root.report()
+
+
+def _stack():
+    return getattr(_state, "stack", None)
+
+
+@contextlib.contextmanager
+def profile(name="ffc"):
+    """Collect timings of all instrumented code run in the context in
+    a new Profile. Profiles may be nested."""
+    prof = Profile(name)
+    previous = _stack()
+    _state.stack = [prof.root]
+    t0 = perf_counter()
+    try:
+        yield prof
+    finally:
+        prof.root.time += perf_counter() - t0
+        prof.root.calls += 1
+        _state.stack = previous
+
+
+@contextlib.contextmanager
+def timer(name):
+    """Time the code run in the context as a child of the current timer."""
+    stack = _stack()
+    if not stack:
+        yield
+        return
+
+    node = stack[-1].child(name)
+    stack.append(node)
+    t0 = perf_counter()
+    try:
+        yield
+    finally:
+        node.time += perf_counter() - t0
+        node.calls += 1
+        stack.pop()
+
+
+def record(**counts):
+    """Add the given counts to the counters of the current timer."""
+    stack = _stack()
+    if not stack:
+        return
+    node = stack[-1]
+    for k, v in counts.items():
+        node.counts[k] = node.counts.get(k, 0) + v
+
+
+def timed(name):
+    """Decorator timing each call to the function with timer(name)."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with timer(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
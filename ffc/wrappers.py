@@ -14,7 +14,7 @@ logger = logging.getLogger(__name__)
 
 
 def generate_wrapper_code(analysis: namedtuple, prefix, object_names, classnames, parameters):
-    logger.info("Compiler stage 4.1: Generating additional wrapper code for {}".format(object_names))
+    logger.info("Compiler stage 3.1: Generating additional wrapper code for {}".format(object_names))
     if not analysis.form_data:
         capsules = _encapsulate_elements(analysis.unique_elements, object_names, classnames)
         common_space = False
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 FEniCS Project
+#
+# This file is part of FFC (https://www.fenicsproject.org)
+#
+# SPDX-License-Identifier:    LGPL-3.0-or-later
+
+import gc
+import weakref
+
+import ufl
+from ffc.classname import (compute_signature, signature_cache_clear,
+                           signature_cache_info)
+from ffc.parameters import validate_parameters
+
+
+def test_signature_cache():
+    signature_cache_clear()
+    element = ufl.FiniteElement("Lagrange", ufl.triangle, 1)
+    u, v = ufl.TrialFunction(element), ufl.TestFunction(element)
+    a = ufl.inner(u, v) * ufl.dx
+    p = validate_parameters(None)
+
+    sig = compute_signature([a], "", p)
+    assert signature_cache_info().misses == 1
+
+    # Warm lookups do not recompute the signature
+    assert compute_signature([a], "", p) == sig
+    assert compute_signature([a], "", validate_parameters(None)) == sig
+    info = signature_cache_info()
+    assert info.hits == 2 and info.misses == 1
+
+    # An equal but distinct form, or other parameters, are computed again
+    b = ufl.inner(u, v) * ufl.dx
+    assert compute_signature([b], "", p) == sig
+    assert compute_signature([a], "", validate_parameters({"scalar_type": "float"})) != sig
+    assert compute_signature([element], "", p) != compute_signature([element], "", p, True)
+    assert signature_cache_info().misses == 5
+
+
+def test_signature_cache_does_not_keep_forms_alive():
+    signature_cache_clear()
+    element = ufl.FiniteElement("Lagrange", ufl.triangle, 1)
+    f = ufl.Coefficient(element)
+    a = f * ufl.TestFunction(element) * ufl.dx
+    p = validate_parameters(None)
+
+    sig = compute_signature([a], "", p)
+    assert compute_signature([a], "", p) == sig
+    assert signature_cache_info().hits == 1
+    assert signature_cache_info().currsize == 0
+
+    # The coefficient of a dropped form is released
+    ref = weakref.ref(f)
+    del a, f
+    gc.collect()
+    assert ref() is None
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 FEniCS Project
+#
+# This file is part of FFC (https://www.fenicsproject.org)
+#
+# SPDX-License-Identifier:    LGPL-3.0-or-later
+
+import ufl
+import ffc.codegeneration.codegeneration as codegeneration
+from ffc.compiler import compile_ufl_objects
+
+
+def test_code_cache(tmpdir, monkeypatch):
+    element = ufl.FiniteElement("Lagrange", ufl.triangle, 2)
+    u, v = ufl.TrialFunction(element), ufl.TestFunction(element)
+    f = ufl.Coefficient(element)
+    a = ufl.inner(ufl.grad(u), ufl.grad(v)) * ufl.dx + u * v * ufl.ds
+    L = f * v * ufl.dx
+    parameters = {"code_cache": True, "cache_dir": str(tmpdir)}
+
+    code = compile_ufl_objects([a, L], prefix="CodeCache", parameters=parameters)
+    assert len(tmpdir.join("code").listdir()) > 0
+
+    calls = []
+    integral_generator = codegeneration.integral_generator
+
+    def count(ir, parameters):
+        calls.append(ir.classname)
+        return integral_generator(ir, parameters)
+
+    monkeypatch.setattr(codegeneration, "integral_generator", count)
+
+    # Compiling again reuses the code of all integrals
+    assert compile_ufl_objects([a, L], prefix="CodeCache", parameters=parameters) == code
+    assert calls == []
+
+    # Only the code of a changed integral is generated again
+    a2 = ufl.inner(ufl.grad(u), ufl.grad(v)) * ufl.dx + 2 * u * v * ufl.ds
+    code2 = compile_ufl_objects([a2, L], prefix="CodeCache", parameters=parameters)
+    assert len(calls) == 1 and "exterior_facet" in calls[0]
+    assert code2 != code
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 FEniCS Project
+#
+# This file is part of FFC (https://www.fenicsproject.org)
+#
+# SPDX-License-Identifier:    LGPL-3.0-or-later
+
+import numpy
+import pytest
+
+import ufl
+import ffc.ir.uflacs.elementtables as elementtables
+from ffc.fiatinterface import create_element, create_quadrature
+
+
+def test_tabulation_cache(monkeypatch):
+    element = ufl.VectorElement("Lagrange", ufl.triangle, 2)
+    points, weights = create_quadrature("triangle", 3)
+
+    calls = []
+    tabulate_element = elementtables.tabulate_element
+
+    def count(ufl_element, deriv_order, points):
+        tables = tabulate_element(ufl_element, deriv_order, points)
+        calls.append(tables)
+        return tables
+
+    monkeypatch.setattr(elementtables, "tabulate_element", count)
+    tables = [elementtables.get_ffc_table_values(points, ufl.triangle, "cell", element, None, "cell",
+                                                 derivatives, component)
+              for derivatives in ((1, 0), (0, 1)) for component in (0, 1)]
+
+    # All components and derivatives come from the same tabulation
+    assert len(calls) == 4
+    assert all(t is calls[0] for t in calls)
+    with pytest.raises(ValueError):
+        calls[0][(1, 0)][0, 0, 0] = 1.0
+
+    reference = create_element(element).tabulate(1, points)
+    for (derivatives, component), table in zip([(d, c) for d in ((1, 0), (0, 1)) for c in (0, 1)], tables):
+        assert numpy.allclose(table[0], reference[derivatives][:, component, :].T)
+
+
+def test_build_unique_tables():
+    a = numpy.array([[[0.0, 0.5, 1.0]]])
+    tables = {
+        "A": a,
+        "B": a[..., ::-1],  # same values in another order
+        "C": a + 1e-9,  # equal to A within tolerance
+        "D": a.reshape(1, 3, 1),  # same values with another shape
+        "E": a + 1e-3,
+        "F": a[..., ::-1] - 1e-9,  # equal to B within tolerance
+    }
+    unique, mapping = elementtables.build_unique_tables(tables, rtol=1e-6, atol=1e-8)
+    assert len(unique) == 4
+    assert mapping == {"A": 0, "B": 1, "C": 0, "D": 2, "E": 3, "F": 1}
+    assert unique[0] is tables["A"]
@@ -22,10 +22,14 @@
 # Modified by Lizao Li, 2016
 
 
+import collections
+
 import pytest
 import numpy
 
+import ufl
 from ufl import FiniteElement
+import ffc.fiatinterface
 from ffc.fiatinterface import create_element
 
 
@@ -191,3 +195,30 @@ supported (non-mixed) for low degrees"""
                 else:
                     for k in range(element.value_shape()[0]):
                         assert round(basis[i][k][0] - reference[i](x)[k], 10) == 0.0
+
+
+def test_restricted_element():
+    element = create_element(ufl.RestrictedElement(FiniteElement("Lagrange", "triangle", 3), "facet"))
+    assert element.space_dimension() == 9
+
+
+def test_element_cache(monkeypatch):
+    monkeypatch.setattr(ffc.fiatinterface, "_cache", collections.OrderedDict())
+    monkeypatch.setattr(ffc.fiatinterface, "_cache_size", 512)
+    ffc.fiatinterface.clear_element_cache()
+
+    elements = [FiniteElement("Lagrange", "triangle", p) for p in (1, 2, 3)]
+    ffc.fiatinterface.warm_element_cache(elements)
+    assert ffc.fiatinterface.element_cache_info() == (0, 3, 3, 512)
+
+    fiat_element = create_element(FiniteElement("Lagrange", "triangle", 2))
+    assert create_element(elements[1]) is fiat_element
+    assert ffc.fiatinterface.element_cache_info() == (2, 3, 3, 512)
+
+    # The least recently used elements are evicted
+    ffc.fiatinterface.set_element_cache_size(2)
+    assert ffc.fiatinterface.element_cache_info().size == 2
+    create_element(elements[0])
+    create_element(elements[2])
+    assert ffc.fiatinterface.element_cache_info() == (2, 5, 2, 2)
+    assert create_element(elements[1]) is not fiat_element
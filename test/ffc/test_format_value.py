@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 FEniCS Project
+#
+# This file is part of FFC (https://www.fenicsproject.org)
+#
+# SPDX-License-Identifier:    LGPL-3.0-or-later
+
+import numpy
+import pytest
+
+from ffc.codegeneration.C import cnodes as L
+from ffc.codegeneration.C.format_lines import format_indented_lines
+from ffc.codegeneration.C.format_value import format_float, format_float_array
+
+
+@pytest.mark.parametrize("precision", [None, 5, 16])
+def test_format_float_array(precision):
+    values = numpy.array([[0.0, -0.0, 1.0, -1.0], [1e-20, 2.5e+30, 1.0 / 3.0, 1.0]])
+    formatted = format_float_array(values, precision)
+    assert formatted.shape == values.shape
+    for x, s in zip(values.flat, formatted.flat):
+        assert s == format_float(x, precision)
+
+
+def test_array_decl_float_values():
+    values = numpy.array([[0.5, -0.0, 1.0 / 3.0], [1e-05, 0.5, 2.0]])
+    decl = L.ArrayDecl("static const double", "FE", values.shape, values, padlen=4)
+    assert format_indented_lines(decl.cs_format(16)) == ("static const double FE[2][4] =\n"
+                                                         "    { { 0.5, -0.0, 0.3333333333333333, 0.0 },\n"
+                                                         "      { 1e-5, 0.5, 2.0, 0.0 } };")
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 FEniCS Project
+#
+# This file is part of FFC (https://www.fenicsproject.org)
+#
+# SPDX-License-Identifier:    LGPL-3.0-or-later
+
+import pickle
+
+import pytest
+
+import ufl
+from ffc.ir.uflacs.analysis.factorization import compute_argument_factorization
+from ffc.ir.uflacs.analysis.graph import (ExpressionGraph, build_scalar_graph,
+                                          fold_zero_nodes)
+from ffc.ir.uflacs.analysis.modified_terminals import strip_modified_terminal
+
+
+def test_graph_edges_keep_insertion_order():
+    G = ExpressionGraph()
+    for i in range(4):
+        G.add_node(i, expression=i)
+    for i, j in [(3, 1), (0, 2), (3, 0), (3, 1), (2, 1)]:
+        G.add_edge(i, j)
+
+    assert [G.out_edges[i] for i in range(4)] == [[2], [], [1], [1, 0, 1]]
+    assert [G.in_edges[i] for i in range(4)] == [[3], [3, 3, 2], [0], []]
+
+    # Adding edges after querying the adjacency updates it
+    G.add_edge(1, 0)
+    assert G.out_edges[1] == [0]
+    assert G.in_edges[0] == [3, 1]
+
+    with pytest.raises(KeyError):
+        G.add_edge(0, 4)
+    with pytest.raises(KeyError):
+        G.add_node(5)
+
+
+def test_graph_node_attributes():
+    G = ExpressionGraph()
+    for i in range(100):
+        G.add_node(i, expression=i)
+    G.nodes[7]['target'] = [(0, 1)]
+    G.nodes[7]['target'] += [(1, 0)]
+    G.nodes[7]['status'] = 'varying'
+
+    assert len(G.nodes) == 100
+    assert G.nodes[7]['target'] == [(0, 1), (1, 0)]
+    assert G.nodes[7]['status'] == 'varying'
+    assert G.nodes[8].get('target', False) is False
+    with pytest.raises(KeyError):
+        G.nodes[8]['status']
+    with pytest.raises(KeyError):
+        G.nodes[8]['unknown'] = 1
+
+    G.column('status')[:] = 1
+    assert G.nodes[99]['status'] == 'inactive'
+    assert list(G.column('expression')) == list(range(100))
+
+
+def test_scalar_graph_and_factorization():
+    cell = ufl.triangle
+    element = ufl.FiniteElement("Lagrange", cell, 1)
+    u, v = ufl.TrialFunction(element), ufl.TestFunction(element)
+    f = ufl.Coefficient(element)
+    expression = ufl.algorithms.apply_algebra_lowering.apply_algebra_lowering(
+        f * u * v + f * f * u.dx(0) * v)
+
+    S = build_scalar_graph(expression)
+    for i, expr in enumerate(S.column('expression')):
+        if not (expr._ufl_is_terminal_ or expr._ufl_is_terminal_modifier_):
+            assert S.out_edges[i] == [S.e2i[o] for o in expr.ufl_operands]
+
+    F = compute_argument_factorization(S, 2)
+    targets = [i for i, v in F.nodes.items() if v.get('target', False)]
+    assert len(targets) == 2
+
+    # Graphs are stored in the intermediate representation cache
+    F2 = pickle.loads(pickle.dumps(F))
+    assert F2.out_edges[targets[0]] == F.out_edges[targets[0]]
+    assert F2.nodes[targets[1]]['target'] == F.nodes[targets[1]]['target']
+
+
+def test_fold_zero_nodes():
+    element = ufl.VectorElement("Lagrange", ufl.triangle, 1)
+    u, v = ufl.TrialFunction(element), ufl.TestFunction(element)
+    f = ufl.Coefficient(ufl.FiniteElement("Lagrange", ufl.triangle, 1))
+    expression = ufl.algorithms.apply_algebra_lowering.apply_algebra_lowering(
+        ufl.conditional(ufl.lt(f, 0.5), u[1], 0.0) * v[1] + ufl.sqrt(f) * ufl.inner(u, v)
+        + ufl.inner(ufl.grad(u), ufl.grad(v)))
+
+    S = build_scalar_graph(expression)
+
+    # Set the second value component of the arguments to zero
+    zero_nodes = {i for i, expr in enumerate(S.column('expression'))
+                  if isinstance(strip_modified_terminal(expr), ufl.Argument)
+                  and expr.ufl_operands[1] == ufl.classes.MultiIndex((ufl.classes.FixedIndex(1), ))}
+    assert zero_nodes
+    F = fold_zero_nodes(S, zero_nodes)
+
+    # Same target as reconstructing all expressions with the zeros inserted
+    expressions = list(S.column('expression'))
+    for i in range(len(expressions)):
+        if i in zero_nodes:
+            expressions[i] = ufl.as_ufl(0.0)
+        elif S.out_edges[i]:
+            expressions[i] = expressions[i]._ufl_expr_reconstruct_(*[expressions[j] for j in S.out_edges[i]])
+    targets = [i for i, t in enumerate(F.column('target')) if t]
+    assert targets == [len(F.nodes) - 1]
+    assert F.nodes[targets[0]]['expression'] == expressions[-1]
+
+    # No dead or duplicated nodes remain, and edges match the operands
+    R = build_scalar_graph(expressions[-1])
+    assert set(F.column('expression')) == set(R.column('expression'))
+    assert len(F.nodes) == len(R.nodes) < len(S.nodes)
+    for i, expr in enumerate(F.column('expression')):
+        if not (expr._ufl_is_terminal_ or expr._ufl_is_terminal_modifier_):
+            assert F.out_edges[i] == [F.e2i[o] for o in expr.ufl_operands]
+
+
+def test_fold_zero_target():
+    element = ufl.FiniteElement("Lagrange", ufl.triangle, 1)
+    u, v = ufl.TrialFunction(element), ufl.TestFunction(element)
+    S = build_scalar_graph(u * v)
+    zero_nodes = {S.e2i[u]}
+    F = fold_zero_nodes(S, zero_nodes)
+    assert list(F.column('expression')) == [ufl.as_ufl(0.0)]
+    assert F.nodes[0]['target']
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 FEniCS Project
+#
+# This file is part of FFC (https://www.fenicsproject.org)
+#
+# SPDX-License-Identifier:    LGPL-3.0-or-later
+
+import ufl
+import ffc.ir.representation
+from ffc.compiler import compile_ufl_objects
+
+
+def test_ir_cache(tmpdir, monkeypatch):
+    element = ufl.VectorElement("Lagrange", ufl.triangle, 2)
+    u, v = ufl.TrialFunction(element), ufl.TestFunction(element)
+    f = ufl.Coefficient(element)
+    a = ufl.inner(ufl.grad(u), ufl.grad(v)) * ufl.dx + ufl.inner(u, v) * ufl.ds
+    L = ufl.inner(f, v) * ufl.dx
+    parameters = {"ir_cache": True, "cache_dir": str(tmpdir)}
+
+    code = compile_ufl_objects([a, L], prefix="IRCache", parameters=parameters)
+    assert len(tmpdir.join("ir").listdir()) > 0
+
+    # Compiling again must not recompute any of the cached representations
+    def fail(*args):
+        raise RuntimeError("Representation was recomputed")
+
+    for name in ["_compute_element_ir", "_compute_dofmap_ir",
+                 "_compute_coordinate_mapping_ir", "_compute_integral_ir"]:
+        monkeypatch.setattr(ffc.ir.representation, name, fail)
+    assert compile_ufl_objects([a, L], prefix="IRCache", parameters=parameters) == code
+
+    # Only the representation of a changed form is recomputed
+    a2 = ufl.inner(ufl.grad(u), ufl.grad(v)) * ufl.dx
+    monkeypatch.undo()
+    calls = []
+    compute_integral_ir = ffc.ir.representation._compute_integral_ir
+
+    def count(form_data, *args):
+        calls.append(form_data)
+        return compute_integral_ir(form_data, *args)
+
+    monkeypatch.setattr(ffc.ir.representation, "_compute_integral_ir", count)
+    compile_ufl_objects([a2, L], prefix="IRCache", parameters=parameters)
+    assert len(calls) == 1
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 FEniCS Project
+#
+# This file is part of FFC (https://www.fenicsproject.org)
+#
+# SPDX-License-Identifier:    LGPL-3.0-or-later
+
+import numpy
+
+from ffc.ir.uflacs.build_uflacs_ir import (integrate_block, integrate_block_interior_facets,
+                                           multiply_block)
+
+
+def test_integrate_block():
+    # A table varying over entities and points, and a table compacted
+    # to one entity
+    u = numpy.random.random((3, 5, 4))
+    v = numpy.random.random((1, 5, 2))
+    weights = numpy.random.random(5)
+    unique_tables = {"u": u, "v": v}
+    num_dofs = {"u": 4, "v": 2, "1": 3}
+
+    ptable = integrate_block(weights, ("u", "v"), ("varying", "varying"), unique_tables, num_dofs)
+    assert ptable.shape == (3, 4, 2)
+    for e in range(3):
+        assert numpy.allclose(ptable[e], sum(w * numpy.outer(u[e, q], v[0, q]) for q, w in enumerate(weights)))
+
+    ptable = integrate_block_interior_facets(weights, ("u", "u"), ("varying", "varying"), unique_tables,
+                                             num_dofs)
+    assert ptable.shape == (3, 3, 4, 4)
+    for e0 in range(3):
+        for e1 in range(3):
+            assert numpy.allclose(ptable[e0, e1],
+                                  sum(w * numpy.outer(u[e0, q], u[e1, q]) for q, w in enumerate(weights)))
+
+    # Tables of ones are not stored
+    ptable = multiply_block(2, ("u", "1"), ("varying", "ones"), unique_tables, num_dofs)
+    assert ptable.shape == (3, 4, 3)
+    for e in range(3):
+        assert (ptable[e] == numpy.outer(u[e, 2], numpy.ones(3))).all()
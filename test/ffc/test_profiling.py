@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 FEniCS Project
+#
+# This file is part of FFC (https://www.fenicsproject.org)
+#
+# SPDX-License-Identifier:    LGPL-3.0-or-later
+
+import json
+
+import ufl
+from ffc import profiling
+from ffc.compiler import compile_ufl_objects
+
+
+def test_profile_compile():
+    element = ufl.FiniteElement("Lagrange", ufl.triangle, 1)
+    u, v = ufl.TrialFunction(element), ufl.TestFunction(element)
+    a = ufl.inner(ufl.grad(u), ufl.grad(v)) * ufl.dx
+
+    with profiling.profile("Poisson") as prof:
+        compile_ufl_objects([a], prefix="Profile")
+
+    root = prof.as_dict()
+    assert root["name"] == "Poisson" and root["calls"] == 1
+    stages = [c["name"] for c in root["children"]]
+    assert stages == ["analysis", "compute_ir", "generate_code", "format_code"]
+
+    compute_ir = prof.root.children["compute_ir"]
+    assert compute_ir.children["compute_element_ir"].calls > 0
+    integral_ir = compute_ir.children["compute_integral_ir"]
+    assert "build_scalar_graph" in integral_ir.children
+    assert "compute_argument_factorization" in integral_ir.children
+    assert integral_ir.counts["graph_nodes"] > 0
+    assert integral_ir.counts["unique_tables"] > 0
+
+    generate_code = prof.root.children["generate_code"]
+    assert "integral_generator" in generate_code.children
+
+    # Times of children never exceed the time of the parent
+    assert sum(c.time for c in prof.root.children.values()) <= prof.root.time
+    assert json.loads(prof.to_json()) == root
+    assert "compute_integral_ir" in prof.report()
+
+
+def test_timers_outside_profile():
+    with profiling.timer("nothing"):
+        profiling.record(count=1)
+
+    with profiling.profile() as prof:
+        with profiling.timer("outer"):
+            for i in range(3):
+                with profiling.timer("inner"):
+                    profiling.record(count=2)
+    outer = prof.root.children["outer"]
+    assert outer.calls == 1
+    assert outer.children["inner"].calls == 3
+    assert outer.children["inner"].counts == {"count": 6}
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 FEniCS Project
+#
+# This file is part of FFC (https://www.fenicsproject.org)
+#
+# SPDX-License-Identifier:    LGPL-3.0-or-later
+
+import collections
+
+import numpy
+import pytest
+
+import ufl
+import ffc.fiatinterface as fiatinterface
+from ffc.compiler import compile_ufl_objects
+
+
+def test_quadrature_rules_are_shared():
+    points, weights = fiatinterface.create_quadrature("triangle", 4)
+    assert fiatinterface.create_quadrature("triangle", 4) == (points, weights)
+    assert fiatinterface.create_quadrature("triangle", 4, "default")[0] is points
+    with pytest.raises(ValueError):
+        weights[0] = 1.0
+
+
+def test_quadrature_cache(tmpdir, monkeypatch):
+    element = ufl.FiniteElement("Lagrange", ufl.triangle, 3)
+    u, v = ufl.TrialFunction(element), ufl.TestFunction(element)
+    a = ufl.inner(ufl.grad(u), ufl.grad(v)) * ufl.dx(degree=14) + u * v * ufl.ds(degree=14)
+    parameters = {"quadrature_cache": True, "cache_dir": str(tmpdir)}
+
+    monkeypatch.setattr(fiatinterface, "_quadrature_cache", collections.OrderedDict())
+    code = compile_ufl_objects([a], prefix="QuadratureCache", parameters=parameters)
+    assert len(tmpdir.join("quadrature").listdir()) == 2
+
+    # Rules are read from the cache dir by a new process
+    calls = []
+
+    def count(shape, degree, scheme):
+        calls.append(shape)
+        return numpy.zeros((1, 0)), numpy.ones((1, ))
+
+    monkeypatch.setattr(fiatinterface, "_quadrature_cache", collections.OrderedDict())
+    monkeypatch.setattr(fiatinterface, "_create_quadrature", count)
+    assert compile_ufl_objects([a], prefix="QuadratureCache", parameters=parameters) == code
+    assert calls == []
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 FEniCS Project
+#
+# This file is part of FFC (https://www.fenicsproject.org)
+#
+# SPDX-License-Identifier:    LGPL-3.0-or-later
+
+import numpy
+import pytest
+
+import ufl
+from ffc.compiler import compile_ufl_objects
+from ffc.fiatinterface import create_element, create_quadrature
+from ffc.ir.uflacs.tensorfactorization import (dof_grid_indices, factorize_table,
+                                               quadrature_grid_shape)
+
+
+@pytest.mark.parametrize("family,degree", [("Q", 1), ("Q", 3), ("DQ", 2)])
+def test_factorize_table(family, degree):
+    points, weights = create_quadrature("hexahedron", 6, "default")
+    grid_shape = quadrature_grid_shape(points)
+    assert grid_shape == (4, 4, 4)
+
+    element = create_element(ufl.FiniteElement(family, ufl.hexahedron, degree))
+    tables = element.tabulate(1, points)
+    dof_indices = dof_grid_indices(tables[(0, 0, 0)].T, grid_shape)
+    assert dof_indices is not None
+
+    for derivatives, table in tables.items():
+        table = table.T
+        factors = factorize_table(table, grid_shape, dof_indices)
+        assert factors is not None
+        for q, x in enumerate(numpy.ndindex(*grid_shape)):
+            values = [numpy.prod([f[x[d], k[d]] for d, f in enumerate(factors)]) for k in dof_indices]
+            assert numpy.allclose(table[q], values)
+
+
+def test_quadrature_grid_shape_simplex():
+    points, weights = create_quadrature("tetrahedron", 4, "default")
+    assert quadrature_grid_shape(points) is None
+
+
+def test_tensor_block_mode():
+    element = ufl.FiniteElement("Q", ufl.quadrilateral, 2)
+    u, v = ufl.TrialFunction(element), ufl.TestFunction(element)
+    g = ufl.Coefficient(element)
+    a = g * ufl.inner(ufl.grad(u), ufl.grad(v)) * ufl.dx
+
+    code = compile_ufl_objects([a], prefix="Tensor", parameters={"enable_tensor_factorization": True})
+    assert "UFLACS block mode: tensor" in code[1]
+    code = compile_ufl_objects([a], prefix="Tensor")
+    assert "UFLACS block mode: tensor" not in code[1]
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 FEniCS Project
+#
+# This file is part of FFC (https://www.fenicsproject.org)
+#
+# SPDX-License-Identifier:    LGPL-3.0-or-later
+
+import pytest
+
+import ufl
+from ffc.compiler import compile_ufl_objects, write_ufl_objects
+from ffc.formatting import write_code_chunks
+
+
+def test_write_ufl_objects(tmpdir):
+    element = ufl.FiniteElement("Lagrange", ufl.triangle, 2)
+    u, v = ufl.TrialFunction(element), ufl.TestFunction(element)
+    f = ufl.Coefficient(element)
+    a = ufl.inner(ufl.grad(u), ufl.grad(v)) * ufl.dx + u * v * ufl.ds
+    L = f * v * ufl.dx
+
+    # Writing the code one object at a time gives the same files
+    code_h, code_c, _ = compile_ufl_objects([a, L], prefix="Streaming")
+    write_ufl_objects([a, L], prefix="Streaming", parameters={"output_dir": str(tmpdir)})
+    assert tmpdir.join("Streaming.h").read() == code_h
+    assert tmpdir.join("Streaming.c").read() == code_c
+
+
+def test_write_binary_tables(tmpdir):
+    # Integrals with the same name but different tables, as in modules
+    # built in the same directory, store their tables in different files
+    for degree in (2, 3):
+        element = ufl.FiniteElement("Lagrange", ufl.triangle, degree)
+        u, v = ufl.TrialFunction(element), ufl.TestFunction(element)
+        f = ufl.Coefficient(element)
+        write_ufl_objects([f * u * v * ufl.dx], prefix="Tables",
+                          parameters={"output_dir": str(tmpdir), "binary_tables": True})
+    filenames = sorted(p.basename for p in tmpdir.listdir() if p.ext == ".bin")
+    assert len(filenames) == 2
+    assert all(name.startswith("tables_cell_integral") for name in filenames)
+    assert sorted(p.basename for p in tmpdir.listdir()) == sorted(filenames + ["Tables.c", "Tables.h"])
+
+
+def test_write_code_chunks_failure(tmpdir):
+    tmpdir.join("Failing.h").write("// Old header")
+    tmpdir.join("Failing.c").write("// Old source")
+
+    def chunks():
+        yield "// New header", "// New source", {}
+        raise RuntimeError("Code generation failed")
+
+    # The files written earlier are left unchanged
+    with pytest.raises(RuntimeError):
+        write_code_chunks(chunks(), "Failing", {"output_dir": str(tmpdir)})
+    assert tmpdir.join("Failing.h").read() == "// Old header"
+    assert tmpdir.join("Failing.c").read() == "// Old source"
+    assert sorted(p.basename for p in tmpdir.listdir()) == ["Failing.c", "Failing.h"]
+
+
+def test_compile_binary_tables(tmpdir, monkeypatch):
+    element = ufl.FiniteElement("Lagrange", ufl.triangle, 2)
+    u, v = ufl.TrialFunction(element), ufl.TestFunction(element)
+    f = ufl.Coefficient(element)
+    a = f * u * v * ufl.dx
+
+    # The binary files are returned with the code, not written to file
+    monkeypatch.chdir(tmpdir)
+    code_h, code_c, binary_files = compile_ufl_objects([a], prefix="Tables", parameters={"binary_tables": True})
+    assert len(binary_files) == 1
+    assert all(".incbin \\\"{}\\\"".format(filename) in code_c for filename in binary_files)
+    assert tmpdir.listdir() == []
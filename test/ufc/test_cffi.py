@@ -8,8 +8,14 @@
 import numpy as np
 import pytest
 import cffi
+import fcntl
+import sys
 
+import ffc.classname
 import ffc.codegeneration.jit
+import ffc.compiler
+import ffc.parameters
+from ffc.fiatinterface import create_element
 import ufl
 
 
@@ -98,6 +104,43 @@ def test_evaluate_reference_basis_quad(quadrilateral_element):
         print('X=', X, 'vals = ', vals, np.sum(vals))
 
 
+@pytest.mark.parametrize("element", [ufl.FiniteElement("Q", ufl.quadrilateral, 3),
+                                     ufl.FiniteElement("DQ", ufl.hexahedron, 2),
+                                     ufl.FiniteElement("DQ", ufl.hexahedron, 0),
+                                     ufl.VectorElement("Q", ufl.hexahedron, 2)])
+def test_evaluate_reference_basis_tensor_product(element):
+    compiled_elements, module = ffc.codegeneration.jit.compile_elements([element])
+    compiled_e = compiled_elements[0][0]
+    fiat_element = create_element(element)
+    space_dim = fiat_element.space_dimension()
+    value_size = element.reference_value_size()
+    tdim = element.cell().topological_dimension()
+
+    X = np.random.random((5, tdim))
+    X_ptr = module.ffi.cast("const double *", module.ffi.from_buffer(X))
+    vals = np.zeros((5, space_dim, value_size))
+    compiled_e.evaluate_reference_basis(module.ffi.cast("double *", module.ffi.from_buffer(vals)), 5, X_ptr)
+    derivs = np.zeros((5, space_dim, tdim, value_size))
+    compiled_e.evaluate_reference_basis_derivatives(
+        module.ffi.cast("double *", module.ffi.from_buffer(derivs)), 1, 5, X_ptr)
+
+    tables = fiat_element.tabulate(1, X)
+    for d in range(tdim):
+        derivatives = tuple(int(i == d) for i in range(tdim))
+        table = tables[derivatives].reshape(space_dim, value_size, 5).transpose(2, 0, 1)
+        assert np.allclose(derivs[:, :, d, :], table)
+    table = tables[(0, ) * tdim].reshape(space_dim, value_size, 5).transpose(2, 0, 1)
+    assert np.allclose(vals, table)
+
+
+def test_evaluate_reference_basis_constant_tensor_product():
+    # Degree 0 factors do not depend on the FIAT reference coordinates
+    element = ufl.FiniteElement("DQ", ufl.hexahedron, 0)
+    code_h, code_c, _ = ffc.compiler.compile_ufl_objects(
+        [element], prefix="JIT", parameters=ffc.parameters.validate_parameters(None))
+    assert "const double Y[" not in code_c
+
+
 def test_cmap():
     cell = ufl.triangle
     element = ufl.VectorElement("Lagrange", cell, 1)
@@ -327,3 +370,317 @@ def test_subdomains():
     ids = np.zeros(form3.num_exterior_facet_integrals, dtype=np.int32)
     form3.get_exterior_facet_integral_ids(ffi.cast('int *', ids.ctypes.data))
     assert ids[0] == 0 and ids[1] == 210
+
+
+def test_compile_forms_parallel(tmpdir):
+    cell = ufl.triangle
+    element = ufl.FiniteElement("Lagrange", cell, 1)
+    u, v = ufl.TrialFunction(element), ufl.TestFunction(element)
+    a = ufl.inner(u, v) * ufl.dx
+    L = ufl.conj(v) * ufl.dx
+    forms = [a, L, a]
+    compiled = ffc.codegeneration.jit.compile_forms_parallel(
+        forms, parameters={'cache_dir': str(tmpdir)}, max_workers=2)
+
+    assert len(compiled) == len(forms)
+    for f, (compiled_forms, module) in zip(forms, compiled):
+        assert compiled_forms[0].rank == len(f.arguments())
+
+    # Equal forms share a module
+    assert compiled[0][1] is compiled[2][1]
+
+    ffi = cffi.FFI()
+    form0 = compiled[0][0][0].create_cell_integral(-1)
+    A = np.zeros((3, 3), dtype=np.float64)
+    w = np.array([], dtype=np.float64)
+    coords = np.array([0.0, 0.0, 1.0, 0.0, 0.0, 1.0], dtype=np.float64)
+    form0.tabulate_tensor(
+        ffi.cast('double *', A.ctypes.data), ffi.cast('double *', w.ctypes.data),
+        ffi.cast('double *', coords.ctypes.data), 0)
+    assert np.allclose(A, np.array([[2, 1, 1], [1, 2, 1], [1, 1, 2]]) / 24.0)
+
+
+def test_jit_lock(tmpdir):
+    cell = ufl.triangle
+    element = ufl.FiniteElement("Lagrange", cell, 1)
+    u, v = ufl.TrialFunction(element), ufl.TestFunction(element)
+    forms = [ufl.inner(u, v) * ufl.dx]
+    p = ffc.parameters.validate_parameters({'cache_dir': str(tmpdir), 'timeout': 0})
+    module_name = 'libffc_forms_' + ffc.classname.compute_signature(forms, '', p)
+    lock_name = tmpdir.join(module_name + ".c.lock")
+
+    # Lock held by a live process
+    with open(str(lock_name), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        with pytest.raises(TimeoutError):
+            ffc.codegeneration.jit.compile_forms(forms, parameters=p)
+
+    # Lock left behind by a builder that died
+    lock_name.write("999999")
+    compiled_forms, module = ffc.codegeneration.jit.compile_forms(forms, parameters=p)
+    assert compiled_forms[0].rank == 2
+    assert tmpdir.join(module_name + ".c.cached").check()
+    assert lock_name.read() == ""
+
+
+def test_jit_lock_released_on_error(tmpdir, monkeypatch):
+    cell = ufl.triangle
+    element = ufl.FiniteElement("Lagrange", cell, 1)
+    u, v = ufl.TrialFunction(element), ufl.TestFunction(element)
+    forms = [ufl.inner(u, v) * ufl.dx(degree=5)]
+    p = {'cache_dir': str(tmpdir), 'timeout': 0}
+
+    def fail(*args, **kwargs):
+        raise RuntimeError("Code generation failed")
+
+    with monkeypatch.context() as m:
+        m.setattr(ffc.compiler, "compile_ufl_objects", fail)
+        with pytest.raises(RuntimeError):
+            ffc.codegeneration.jit.compile_forms(forms, parameters=p)
+    assert not ffc.codegeneration.jit._build_locks
+
+    # A retry builds the module instead of waiting on the lock
+    compiled_forms, module = ffc.codegeneration.jit.compile_forms(forms, parameters=p)
+    assert compiled_forms[0].rank == 2
+
+
+def test_jit_module_cache(tmpdir):
+    cell = ufl.triangle
+    element = ufl.FiniteElement("Lagrange", cell, 2)
+    u, v = ufl.TrialFunction(element), ufl.TestFunction(element)
+    a = ufl.inner(u, v) * ufl.dx
+    L = ufl.conj(v) * ufl.dx
+    p = {'cache_dir': str(tmpdir), 'module_cache_size': 1}
+
+    sys_path = list(sys.path)
+    compiled_a, module_a = ffc.codegeneration.jit.compile_forms([a], parameters=p)
+    assert sys.path == sys_path
+
+    # Repeated requests are served from memory
+    compiled, module = ffc.codegeneration.jit.compile_forms([a], parameters=p)
+    assert module is module_a
+    assert compiled[0] is compiled_a[0]
+    assert sys.path == sys_path
+
+    # Least recently used module is evicted
+    ffc.codegeneration.jit.compile_forms([L], parameters=p)
+    compiled, module = ffc.codegeneration.jit.compile_forms([a], parameters=p)
+    assert module is module_a
+    assert compiled[0] is not compiled_a[0]
+    assert sys.path == sys_path
+
+
+def test_tabulate_tensor_batch():
+    cell = ufl.triangle
+    element = ufl.FiniteElement("Lagrange", cell, 2)
+    u, v = ufl.TrialFunction(element), ufl.TestFunction(element)
+    g = ufl.Coefficient(element)
+    a = g * ufl.inner(ufl.grad(u), ufl.grad(v)) * ufl.dx + g * ufl.inner(u, v) * ufl.ds
+    compiled_forms, module = ffc.codegeneration.jit.compile_forms(
+        [a], parameters={'cache_dir': './compile_cache'})
+    form0 = compiled_forms[0][0]
+
+    num_cells = 5
+    coords = np.tile([0.0, 0.0, 1.0, 0.0, 0.0, 1.0], (num_cells, 1))
+    coords += 0.1 * np.random.random(coords.shape)
+    w = np.random.random((num_cells, 6))
+    facets = np.arange(num_cells, dtype=np.int32) % 3
+
+    ffi = module.ffi
+    integrals = [(form0.create_cell_integral(-1), ()),
+                 (form0.create_exterior_facet_integral(-1), (facets, ))]
+    for integral, entities in integrals:
+        A = np.zeros((num_cells, 6, 6))
+        integral.tabulate_tensor_batch(
+            ffi.cast('double *', ffi.from_buffer(A)), ffi.cast('double *', ffi.from_buffer(w)),
+            ffi.cast('double *', ffi.from_buffer(coords)), num_cells,
+            *[ffi.cast('int *', ffi.from_buffer(e)) for e in entities], ffi.NULL)
+
+        # Compare with the element tensor of each cell
+        for c in range(num_cells):
+            A_cell = np.zeros((6, 6))
+            integral.tabulate_tensor(
+                ffi.cast('double *', ffi.from_buffer(A_cell)), ffi.cast('double *', ffi.from_buffer(w[c])),
+                ffi.cast('double *', ffi.from_buffer(coords[c])), *[int(e[c]) for e in entities], 0)
+            assert np.allclose(A[c], A_cell)
+            assert not np.allclose(A_cell, 0.0)
+
+
+@pytest.mark.parametrize("cell", [ufl.triangle, ufl.quadrilateral])
+def test_tabulate_tensor_simd(cell):
+    element = ufl.VectorElement("Lagrange", cell, 1)
+    v, du = ufl.TestFunction(element), ufl.TrialFunction(element)
+    u = ufl.Coefficient(element)
+    Id = ufl.Identity(cell.geometric_dimension())
+    F = ufl.variable(Id + ufl.grad(u))
+    C = F.T * F
+    psi = ufl.tr(C - Id)**2 + ufl.ln(ufl.det(F))**2
+    a = ufl.derivative(ufl.inner(ufl.diff(psi, F), ufl.grad(v)) * ufl.dx, u, du)
+    compiled_forms, module = ffc.codegeneration.jit.compile_forms(
+        [a], parameters={'cache_dir': './compile_cache', 'vectorize': True, 'simd_width': 4})
+    form0 = compiled_forms[0][0]
+    integral = form0.create_cell_integral(-1)
+    assert integral.simd_width == 4
+
+    num_vertices = 3 if cell == ufl.triangle else 4
+    A_size = (2 * num_vertices)**2
+    coords = np.array([0.0, 0.0, 1.0, 0.0, 0.0, 1.0, 1.0, 1.0][:2 * num_vertices])
+    coords = coords + 0.1 * np.random.random((4, coords.size))
+    w = 0.1 * np.random.random((4, 2 * num_vertices))
+    orientations = np.zeros(4, dtype=np.int32)
+
+    # Cells are stored in structure of arrays layout
+    ffi = module.ffi
+    A = np.zeros((A_size, 4))
+    w_soa = np.ascontiguousarray(w.T)
+    coords_soa = np.ascontiguousarray(coords.T)
+    integral.tabulate_tensor_simd(
+        ffi.cast('double *', ffi.from_buffer(A)), ffi.cast('double *', ffi.from_buffer(w_soa)),
+        ffi.cast('double *', ffi.from_buffer(coords_soa)), ffi.cast('int *', ffi.from_buffer(orientations)))
+
+    # Compare with the element tensor of each cell
+    for c in range(4):
+        A_cell = np.zeros(A_size)
+        integral.tabulate_tensor(
+            ffi.cast('double *', ffi.from_buffer(A_cell)), ffi.cast('double *', ffi.from_buffer(w[c])),
+            ffi.cast('double *', ffi.from_buffer(coords[c])), 0)
+        assert np.allclose(A[:, c], A_cell)
+        assert not np.allclose(A_cell, 0.0)
+
+
+@pytest.mark.parametrize("cell", [ufl.quadrilateral, ufl.hexahedron])
+def test_tensor_factorization(cell):
+    element = ufl.FiniteElement("Q", cell, 2)
+    u, v = ufl.TrialFunction(element), ufl.TestFunction(element)
+    g = ufl.Coefficient(ufl.FiniteElement("Q", cell, 1))
+    a = g * ufl.inner(ufl.grad(u), ufl.grad(v)) * ufl.dx + g * u * v * ufl.dx
+    L = g * ufl.inner(ufl.grad(g), ufl.grad(v)) * ufl.dx
+
+    gdim = cell.geometric_dimension()
+    num_vertices = 2**gdim
+    num_dofs = 3**gdim
+    coords = np.array([x[::-1] for x in np.ndindex(*(2, ) * gdim)], dtype=np.float64).flatten()
+    coords = coords + 0.1 * np.random.random(coords.size)
+    w = np.random.random(num_vertices)
+
+    tensors = []
+    for enable in (False, True):
+        compiled_forms, module = ffc.codegeneration.jit.compile_forms(
+            [a, L], parameters={'cache_dir': './compile_cache', 'enable_tensor_factorization': enable})
+        ffi = module.ffi
+        for form, A_size in zip(compiled_forms, (num_dofs**2, num_dofs)):
+            integral = form[0].create_cell_integral(-1)
+            A = np.zeros(A_size)
+            integral.tabulate_tensor(
+                ffi.cast('double *', ffi.from_buffer(A)), ffi.cast('double *', ffi.from_buffer(w)),
+                ffi.cast('double *', ffi.from_buffer(coords)), 0)
+            tensors.append(A)
+
+    A0, b0, A1, b1 = tensors
+    assert np.allclose(A0, A1)
+    assert np.allclose(b0, b1)
+    assert not np.allclose(A0, 0.0)
+
+
+def test_binary_tables():
+    element = ufl.FiniteElement("Lagrange", ufl.triangle, 3)
+    u, v = ufl.TrialFunction(element), ufl.TestFunction(element)
+    f = ufl.Coefficient(element)
+    a = f * ufl.inner(ufl.grad(u), ufl.grad(v)) * ufl.dx + f * u * v * ufl.ds
+
+    coords = np.array([0.0, 0.0, 2.0, 0.1, 0.3, 1.5], dtype=np.float64)
+    w = np.random.random(10)
+
+    tensors = []
+    for binary_tables in (False, True):
+        compiled_forms, module = ffc.codegeneration.jit.compile_forms(
+            [a], parameters={'cache_dir': './compile_cache', 'binary_tables': binary_tables,
+                             'vectorize': True})
+        ffi = module.ffi
+        form = compiled_forms[0][0]
+        A = np.zeros((2, 100))
+        form.create_cell_integral(-1).tabulate_tensor(
+            ffi.cast('double *', A[0].ctypes.data), ffi.cast('double *', w.ctypes.data),
+            ffi.cast('double *', coords.ctypes.data), 0)
+        form.create_exterior_facet_integral(-1).tabulate_tensor(
+            ffi.cast('double *', A[1].ctypes.data), ffi.cast('double *', w.ctypes.data),
+            ffi.cast('double *', coords.ctypes.data), 1, 0)
+        tensors.append(A)
+
+    assert not np.allclose(tensors[0], 0.0)
+    assert np.allclose(tensors[0], tensors[1])
+
+
+@pytest.mark.parametrize("deduplicate_kernels", [False, True])
+def test_binary_tables_multiple_integrals(deduplicate_kernels):
+    element = ufl.FiniteElement("CR", ufl.triangle, 1)
+    u, v = ufl.TrialFunction(element), ufl.TestFunction(element)
+    f = ufl.Coefficient(element)
+    # Same table names with different types or, for the same number of
+    # quadrature points, different values in several integrals
+    a = (f * u * v * ufl.dx(1, degree=2) + f * u * v * ufl.dx(2, degree=1, scheme="vertex")
+         + u * v * ufl.ds(1) + u.dx(0) * v * ufl.ds(2))
+
+    coords = np.array([0.0, 0.0, 2.0, 0.1, 0.3, 1.5], dtype=np.float64)
+    w = np.random.random(3)
+
+    tensors = []
+    for binary_tables in (False, True):
+        compiled_forms, module = ffc.codegeneration.jit.compile_forms(
+            [a], parameters={'cache_dir': './compile_cache', 'binary_tables': binary_tables,
+                             'deduplicate_kernels': deduplicate_kernels})
+        ffi = module.ffi
+        form = compiled_forms[0][0]
+        A = np.zeros((4, 9))
+        for i, subdomain_id in enumerate((1, 2)):
+            form.create_cell_integral(subdomain_id).tabulate_tensor(
+                ffi.cast('double *', A[i].ctypes.data), ffi.cast('double *', w.ctypes.data),
+                ffi.cast('double *', coords.ctypes.data), 0)
+            form.create_exterior_facet_integral(subdomain_id).tabulate_tensor(
+                ffi.cast('double *', A[2 + i].ctypes.data), ffi.cast('double *', w.ctypes.data),
+                ffi.cast('double *', coords.ctypes.data), 1, 0)
+        tensors.append(A)
+
+    A0, A1 = tensors
+    assert not np.allclose(A0[0], A0[1])
+    assert not np.allclose(A0[2], 0.0)
+    assert not np.allclose(A0[3], 0.0)
+    assert np.allclose(A0, A1)
+
+
+def test_deduplicate_kernels():
+    element = ufl.FiniteElement("Lagrange", ufl.triangle, 2)
+    u, v = ufl.TrialFunction(element), ufl.TestFunction(element)
+    a = ufl.inner(ufl.grad(u), ufl.grad(v)) * (ufl.dx(1) + ufl.dx(2)) + u * v * ufl.dx(3)
+
+    # The kernels of the integral on subdomain 2 are not generated
+    code_h, code_c, _ = ffc.compiler.compile_ufl_objects(
+        [a], prefix="Dedup", parameters={'deduplicate_kernels': True})
+    assert code_c.count("void tabulate_tensor_dedup_cell_integral") == 2
+    assert "return create_dedup_cell_integral_0_1();" in code_c
+
+    coords = np.array([0.0, 0.0, 2.0, 0.1, 0.3, 1.5], dtype=np.float64)
+    w = np.zeros(0)
+
+    for deduplicate_kernels in (False, True):
+        compiled_forms, module = ffc.codegeneration.jit.compile_forms(
+            [a], parameters={'cache_dir': './compile_cache', 'deduplicate_kernels': deduplicate_kernels})
+        ffi = module.ffi
+        form = compiled_forms[0][0]
+        ids = np.zeros(form.num_cell_integrals, dtype=np.int32)
+        form.get_cell_integral_ids(ffi.cast('int *', ids.ctypes.data))
+        assert ids.tolist() == [1, 2, 3]
+
+        A = np.zeros((3, 36))
+        kernels = []
+        for i, subdomain_id in enumerate(ids):
+            integral = form.create_cell_integral(subdomain_id)
+            integral.tabulate_tensor(
+                ffi.cast('double *', A[i].ctypes.data), ffi.cast('double *', w.ctypes.data),
+                ffi.cast('double *', coords.ctypes.data), 0)
+            kernels.append(int(ffi.cast('uintptr_t', integral.tabulate_tensor)))
+
+        assert np.allclose(A[0], A[1])
+        assert not np.allclose(A[0], A[2])
+        assert (kernels[0] == kernels[1]) == deduplicate_kernels
+        assert kernels[0] != kernels[2]